@@ -5,6 +5,35 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Deployment profile
+------------------
+Serve it with an ASGI server (not part of requirements.txt), one event loop
+per worker process, for example::
+
+    uvicorn mysite.asgi:application --workers 4 --timeout-keep-alive 30
+
+- survey_detail, survey_analysis, survey_analysis_data and survey_chart are
+  async views and every middleware in MIDDLEWARE runs in async mode, so the
+  whole request runs in the worker's event loop, which also waits on slow
+  clients (a POST body trickling in, a response read slowly).
+- Their database and cache work still runs in a thread, as Django's ORM is
+  synchronous. Django gives each request one thread for its sync_to_async
+  calls (sessions, authentication and the ORM), busy only during those calls.
+- survey_analysis_events streams the live analysis (see survey.live) and
+  only streams under ASGI. Its request thread stays idle, but allocated,
+  until the stream ends after LIVE_ANALYSIS_STREAM_SECONDS.
+- Charts are rendered and invitation emails sent on the bounded executors of
+  survey.executors. SURVEY_EXECUTORS sizes them; SURVEY_CHART_THREADS sets the
+  number of chart threads per worker.
+- The other views are sync and hold a thread for the whole request, as they
+  do under WSGI.
+- Keep CONN_MAX_AGE at 0, its default: a request's queries run in a thread of
+  its own, which a persistent connection would outlive.
+- Django 4.2 reads a streamed response with a sync iterator into memory
+  before sending it over ASGI. The CSV/JSON export (survey:survey-export) is
+  one, so serve large exports with ``manage.py export_responses`` or from a
+  WSGI worker.
 """
 
 import os
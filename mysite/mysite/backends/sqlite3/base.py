@@ -0,0 +1,51 @@
+"""
+SQLite backend with connection pragmas and an immediate transaction mode.
+
+Two extra OPTIONS keys are read, the rest go to sqlite3.connect() as usual:
+
+- "pragmas": {name: value} run on every new connection, e.g. journal_mode
+  WAL so readers don't block the writer, a busy_timeout, synchronous NORMAL
+  (safe under WAL, one fsync per checkpoint instead of per commit), and the
+  page cache and mmap sizes.
+- "transaction_mode": "IMMEDIATE" opens transactions with BEGIN IMMEDIATE.
+  A deferred transaction that reads and then writes can't wait for the
+  write lock: SQLite fails it at once with "database is locked", whatever
+  the busy timeout. Taking the lock up front makes writers queue instead.
+
+Without either key it behaves exactly like django.db.backends.sqlite3.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+TRANSACTION_MODES = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        options = self.settings_dict["OPTIONS"]
+        self.pragmas = dict(options.get("pragmas", {}))
+        self.transaction_mode = options.get("transaction_mode")
+        if self.transaction_mode and self.transaction_mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"settings.DATABASES transaction_mode must be one of {', '.join(TRANSACTION_MODES)}")
+        for name in self.pragmas:
+            if not name.isidentifier():
+                raise ImproperlyConfigured(f"Invalid SQLite pragma name: {name!r}")
+
+        params = super().get_connection_params()
+        params.pop("pragmas", None)
+        params.pop("transaction_mode", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f"BEGIN {self.transaction_mode.upper()}")
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,170 @@
+"""
+Read replica routing.
+
+When REPLICA_DATABASE names a database alias, reads of the survey app's
+models made by the read-only views in REPLICA_VIEWS (the survey list,
+results, analysis and exports) go to that alias. Everything else reads from
+and writes to the primary, including sessions and users, so logging in never
+depends on the replica having caught up.
+
+A POST sets a short-lived cookie that keeps the client's reads on the
+primary for REPLICA_STICKY_SECONDS, so respondents see their own submission
+on the results page straight away. The cookie holds no data; a client that
+forges it only forgoes the replica.
+
+The replica is a copy of the primary's SQLite file kept in sync by
+``manage.py sync_replica`` (see sync_replica() below), which stands in for
+real replication.
+"""
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.transaction import TransactionManagementError
+
+
+STICKY_COOKIE = "primary_reads"
+
+REPLICA_APPS = {"survey"}
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+def replica_alias():
+    return getattr(settings, "REPLICA_DATABASE", None)
+
+
+@contextmanager
+def reading_from_replica():
+    """
+    Route the enclosed block's survey reads to the replica, if one is configured.
+    """
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias and _use_replica.get() and model._meta.app_label in REPLICA_APPS:
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary, so its rows relate to the primary's
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != replica_alias()
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _use_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context into the threads running the
+        # request's queries, so the router sees what process_view decided
+        token = _use_replica.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.finish(request, response)
+
+    def finish(self, request, response):
+        if not replica_alias():
+            return response
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                STICKY_COOKIE, "1", max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite="Lax")
+        elif response.streaming and not response.is_async and getattr(request, "reads_from_replica", False):
+            # Streamed rows are read while the response is sent, after this returns
+            response.streaming_content = self.stream_from_replica(response.streaming_content)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.reads_from_replica = (
+            replica_alias() is not None
+            and request.method in SAFE_METHODS
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+            and STICKY_COOKIE not in request.COOKIES)
+        if request.reads_from_replica:
+            _use_replica.set(True)
+
+    def stream_from_replica(self, content):
+        _use_replica.set(True)
+        try:
+            yield from content
+        finally:
+            _use_replica.set(False)
+
+
+def _generation_key(alias):
+    return f"replica:{alias}:generation"
+
+
+def replica_generation(alias):
+    """
+    A token that changes whenever the replica is synced. Results computed
+    from the replica are cached under it (see survey.analysis_cache), so a
+    result computed before the replica caught up with a change isn't served
+    after it has.
+    """
+    generation = cache.get(_generation_key(alias))
+    if generation is None:
+        cache.add(_generation_key(alias), uuid.uuid4().hex, timeout=None)
+        generation = cache.get(_generation_key(alias))
+    return generation
+
+
+def sync_replica(alias, path=None):
+    """
+    Copy the primary database into the replica's SQLite file (or ``path``)
+    with SQLite's online backup API, in one step so the copy is a single
+    consistent snapshot. Under WAL the primary's writers carry on meanwhile;
+    the replica's readers wait for the copy (up to their busy timeout) and
+    then see all of it.
+    """
+    if path is None:
+        path = connections[alias].settings_dict["NAME"]
+    source = connections[DEFAULT_DB_ALIAS]
+    if source.in_atomic_block:
+        # The backup would wait for the transaction to end, forever
+        raise TransactionManagementError("The replica can't be synced inside a transaction.")
+    source.ensure_connection()
+    # Readers of the replica hold it until their query ends
+    target = sqlite3.connect(path, timeout=30)
+    try:
+        source.connection.backup(target)
+    finally:
+        target.close()
+    cache.set(_generation_key(alias), uuid.uuid4().hex, timeout=None)
@@ -44,6 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the session and user lookups count against the view's budget
+    "survey.middleware.QueryBudgetMiddleware",
+    "mysite.routers.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -73,18 +76,72 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "mysite.wsgi.application"
 
+# The ASGI deployment profile, documented in mysite/asgi.py
+ASGI_APPLICATION = "mysite.asgi.application"
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# mysite.backends.sqlite3 applies the pragmas to every new connection and opens
+# transactions with BEGIN IMMEDIATE, so concurrent writers wait for the lock
+# (up to busy_timeout ms) instead of failing with "database is locked"
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        "ENGINE": "mysite.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "transaction_mode": "IMMEDIATE",
+            "pragmas": {
+                "journal_mode": "WAL",
+                "busy_timeout": 20000,
+                "synchronous": "NORMAL",
+                # Negative sizes are in KiB: a 64 MiB page cache per connection
+                "cache_size": -64000,
+                "mmap_size": 256 * 1024 * 1024,
+                "temp_store": "MEMORY",
+            },
+        },
     }
 }
 
 
+# Optional read replica: set SURVEY_REPLICA_NAME to the path of a copy of the
+# database, kept in sync by `manage.py sync_replica`. mysite.routers sends the
+# survey reads of REPLICA_VIEWS there, except for clients that posted within
+# the last REPLICA_STICKY_SECONDS, who keep reading their own writes from the primary
+REPLICA_DATABASE = None
+
+if os.environ.get("SURVEY_REPLICA_NAME"):
+    DATABASES["replica"] = {
+        "ENGINE": "mysite.backends.sqlite3",
+        "NAME": os.environ["SURVEY_REPLICA_NAME"],
+        "OPTIONS": {
+            "pragmas": {
+                **{name: value for name, value in DATABASES["default"]["OPTIONS"]["pragmas"].items()
+                   if name != "journal_mode"},
+                "query_only": 1,
+            },
+        },
+        # Tests read the primary through this alias
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_DATABASE = "replica"
+
+DATABASE_ROUTERS = ["mysite.routers.ReplicaRouter"]
+
+REPLICA_VIEWS = [
+    "survey:survey",
+    "survey:results-page",
+    "survey:results-more",
+    "survey:survey-analysis",
+    "survey:survey-analysis-data",
+    "survey:survey-export",
+    "survey:survey-export-matrix",
+]
+
+REPLICA_STICKY_SECONDS = 10
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -132,6 +189,93 @@ MEDIA_URL = 'media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Rendered analysis charts, evicted least-recently-used first past the size bound
+CHART_CACHE_DIR = os.path.join(MEDIA_ROOT, 'charts')
+
+CHART_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# How stale a process's estimate of the chart cache's size may get before it
+# scans the directory again, to count what other processes wrote
+CHART_CACHE_SCAN_SECONDS = 60
+
+# Cached .npz response matrices, one file per survey version
+EXPORT_CACHE_DIR = os.path.join(MEDIA_ROOT, 'exports')
+
+# "direct" writes survey responses during the request; "queued" appends them to a
+# pending table that `manage.py drain_submissions` writes in large batches
+SURVEY_SUBMISSION_MODE = os.environ.get('SURVEY_SUBMISSION_MODE', 'direct')
+
+# Invitation emails: one message per recipient over a shared connection, sent
+# from a background thread or by `manage.py send_invitations`
+DEFAULT_FROM_EMAIL = 'noreply@example.com'
+
+SURVEY_BASE_URL = 'http://127.0.0.1:8000'
+
+SURVEY_EMAIL_BATCH_SIZE = 100
+
+# Messages per second; 0 for no limit
+SURVEY_EMAIL_RATE = 10
+
+# Worker threads of the bounded executors (survey.executors) that charts are
+# rendered and invitation emails sent on
+SURVEY_EXECUTORS = {
+    'charts': int(os.environ.get('SURVEY_CHART_THREADS', 2)),
+    'mail': 1,
+}
+
+# Computed survey analyses, cached under per-survey versions that survey.signals
+# bumps when responses or questions change
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.cache'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
+ANALYSIS_CACHE_TIMEOUT = 60 * 60
+
+# Log the analysis cache hit rate to "survey.cache" every this many lookups
+ANALYSIS_CACHE_LOG_EVERY = 100
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'survey': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+# Live analysis events (survey.live): how often a survey's analysis is checked for
+# changes made by other processes, and how long a stream lasts before the browser
+# reconnects. Streams need the ASGI profile (see mysite/asgi.py); under WSGI each
+# request gets a single event and the browser polls
+LIVE_ANALYSIS_CHECK_SECONDS = 5
+
+LIVE_ANALYSIS_KEEPALIVE_SECONDS = 15
+
+LIVE_ANALYSIS_STREAM_SECONDS = 5 * 60
+
+# Query budgets per URL name; requests running more queries are logged to
+# the "survey.queries" logger and fail survey.tests.QueryBudgetTests
+QUERY_BUDGET_DEFAULT = 8
+
+QUERY_BUDGETS = {
+    'survey:create_survey': 10,
+    'survey:delete-survey': 13,
+    # Includes building the survey definition, which later requests read from the cache
+    'survey:survey-detail': 11,
+    'survey:edit-question': 13,
+    'survey:delete-question': 14,
+    'survey:survey-export-matrix': 11,
+    'survey:delete-analysis': 12,
+    'survey:delete-response': 13,
+    'admin:survey_answer_change': 10,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
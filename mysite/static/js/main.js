@@ -1 +1,149 @@
-console.log('This is JS from your About page.')
\ No newline at end of file
+// Analysis charts, drawn in the browser from the survey analysis JSON so the
+// server doesn't have to render images for interactive views, and redrawn as
+// the analysis events of a live survey arrive.
+(function () {
+    const SVG_NS = "http://www.w3.org/2000/svg";
+    const COLORS = ["blue", "orange", "green", "red", "purple", "brown", "pink", "gray", "olive", "cyan"];
+
+    function svgElement(name, attributes, text) {
+        const element = document.createElementNS(SVG_NS, name);
+        for (const [key, value] of Object.entries(attributes)) {
+            element.setAttribute(key, value);
+        }
+        if (text !== undefined) {
+            element.textContent = text;
+        }
+        return element;
+    }
+
+    function emptyChart(container) {
+        container.replaceChildren(document.createTextNode("No scored answers yet."));
+    }
+
+    // Pie chart of the dimension averages, labelled with their share in percent
+    function drawPie(container, pairs) {
+        const total = pairs.reduce((sum, [, value]) => sum + value, 0);
+        if (!total) {
+            return emptyChart(container);
+        }
+        const size = 420, radius = 140, cx = size / 2, cy = size / 2;
+        const svg = svgElement("svg", {width: size, height: size, viewBox: `0 0 ${size} ${size}`, role: "img"});
+        svg.appendChild(svgElement("title", {}, "Analysis by Dimensions"));
+
+        let angle = -Math.PI / 2;
+        pairs.forEach(([label, value], index) => {
+            const share = value / total;
+            const end = angle + share * 2 * Math.PI;
+            const color = COLORS[index % COLORS.length];
+            if (share >= 1) {
+                svg.appendChild(svgElement("circle", {cx, cy, r: radius, fill: color}));
+            } else {
+                const large = share > 0.5 ? 1 : 0;
+                const path = [
+                    `M ${cx} ${cy}`,
+                    `L ${cx + radius * Math.cos(angle)} ${cy + radius * Math.sin(angle)}`,
+                    `A ${radius} ${radius} 0 ${large} 1 ${cx + radius * Math.cos(end)} ${cy + radius * Math.sin(end)}`,
+                    "Z",
+                ].join(" ");
+                svg.appendChild(svgElement("path", {d: path, fill: color, stroke: "white"}));
+            }
+
+            const middle = (angle + end) / 2;
+            svg.appendChild(svgElement("text", {
+                x: cx + radius * 0.6 * Math.cos(middle), y: cy + radius * 0.6 * Math.sin(middle),
+                "text-anchor": "middle", "font-size": 12, fill: "white",
+            }, `${(share * 100).toFixed(1)}%`));
+            svg.appendChild(svgElement("text", {
+                x: cx + (radius + 20) * Math.cos(middle), y: cy + (radius + 20) * Math.sin(middle),
+                "text-anchor": Math.cos(middle) < 0 ? "end" : "start", "font-size": 12,
+            }, label));
+            angle = end;
+        });
+        container.replaceChildren(svg);
+    }
+
+    // Bar chart of the area averages
+    function drawBars(container, pairs) {
+        if (!pairs.length) {
+            return emptyChart(container);
+        }
+        const width = 560, height = 420, left = 40, bottom = 140, top = 20;
+        const plotHeight = height - top - bottom;
+        const max = Math.max(...pairs.map(([, value]) => value));
+        const slot = (width - left) / pairs.length;
+        const svg = svgElement("svg", {width, height, viewBox: `0 0 ${width} ${height}`, role: "img"});
+        svg.appendChild(svgElement("title", {}, "Analysis by Areas"));
+        svg.appendChild(svgElement("line", {x1: left, y1: top, x2: left, y2: top + plotHeight, stroke: "black"}));
+        svg.appendChild(svgElement("line", {x1: left, y1: top + plotHeight, x2: width, y2: top + plotHeight, stroke: "black"}));
+        svg.appendChild(svgElement("text", {
+            x: 12, y: top + plotHeight / 2, "font-size": 12, "text-anchor": "middle",
+            transform: `rotate(-90 12 ${top + plotHeight / 2})`,
+        }, "Average Score"));
+
+        pairs.forEach(([label, value], index) => {
+            const barHeight = max ? (value / max) * plotHeight : 0;
+            const x = left + index * slot + slot * 0.1;
+            const y = top + plotHeight - barHeight;
+            const bar = svgElement("rect", {x, y, width: slot * 0.8, height: barHeight, fill: COLORS[index % COLORS.length]});
+            bar.appendChild(svgElement("title", {}, `${label}: ${value.toFixed(2)}`));
+            svg.appendChild(bar);
+            svg.appendChild(svgElement("text", {x: x + slot * 0.4, y: y - 4, "font-size": 11, "text-anchor": "middle"}, value.toFixed(2)));
+
+            const labelX = x + slot * 0.4, labelY = top + plotHeight + 12;
+            svg.appendChild(svgElement("text", {
+                x: labelX, y: labelY, "font-size": 10, "text-anchor": "end",
+                transform: `rotate(-75 ${labelX} ${labelY})`,
+            }, label));
+        });
+        container.replaceChildren(svg);
+    }
+
+    function drawAnalysis(root, data) {
+        const dimensions = root.querySelector('[data-chart="dimensions"]');
+        const areas = root.querySelector('[data-chart="areas"]');
+        if (dimensions) {
+            drawPie(dimensions, data.dimension_summary);
+        }
+        if (areas) {
+            drawBars(areas, data.area_summary);
+        }
+        document.querySelectorAll("[data-analysis-count]").forEach((element) => {
+            element.textContent = data.response_count;
+        });
+    }
+
+    document.addEventListener("DOMContentLoaded", () => {
+        document.querySelectorAll("[data-analysis-url]").forEach((root) => {
+            // Followed live when possible: the stream starts with the current analysis
+            if (root.dataset.analysisEvents && window.EventSource) {
+                const events = new EventSource(root.dataset.analysisEvents);
+                events.addEventListener("analysis", (event) => drawAnalysis(root, JSON.parse(event.data)));
+                return;
+            }
+            fetch(root.dataset.analysisUrl, {headers: {Accept: "application/json"}, credentials: "same-origin"})
+                .then((response) => response.json())
+                .then((data) => drawAnalysis(root, data));
+        });
+    });
+})();
+
+// "Load more" on the results page: fetch the next keyset page as an HTML
+// fragment and append it to the list.
+document.addEventListener("click", (event) => {
+    const link = event.target.closest("[data-load-more]");
+    if (!link) {
+        return;
+    }
+    event.preventDefault();
+    const query = new URL(link.href).search;
+    fetch(link.dataset.loadMore + query, {headers: {Accept: "application/json"}, credentials: "same-origin"})
+        .then((response) => response.json())
+        .then((data) => {
+            document.querySelector("[data-results-list]").insertAdjacentHTML("beforeend", data.html);
+            if (data.next_query) {
+                link.href = "?" + data.next_query;
+            } else {
+                link.remove();
+            }
+        });
+});
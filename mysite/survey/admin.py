@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Survey, Question, UserAnswer, Answer
+from . import definitions
+from .models import Survey, SurveyInvitation, Question, UserAnswer, Answer, ScoreRollup, PendingSubmission
+from .rollups import rebuild_rollups
 
 
 @admin.register(Survey)
@@ -7,18 +9,92 @@ class SurveyAdmin(admin.ModelAdmin):
     list_display = ('name', 'created_at', 'is_editable')
     prepopulated_fields = {"slug": ("name",)}
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and "slug" in form.changed_data:
+            # The post_save signal only invalidates the definition under the new slug
+            definitions.invalidate_on_commit(form.initial["slug"])
+
+
+@admin.register(SurveyInvitation)
+class SurveyInvitationAdmin(admin.ModelAdmin):
+    list_display = ('email', 'survey', 'status', 'sent_at', 'created_at')
+    list_filter = ('survey', 'status')
+    search_fields = ('email',)
+
+    # Invitations send no post_delete signal (see signals.py)
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        definitions.invalidate_on_commit(obj.survey.slug)
+
+    def delete_queryset(self, request, queryset):
+        slugs = set(queryset.values_list("survey__slug", flat=True))
+        super().delete_queryset(request, queryset)
+        for slug in slugs:
+            definitions.invalidate_on_commit(slug)
+
+
+class RollupsRebuildingAdmin(admin.ModelAdmin):
+    """
+    Rebuilds the rollups of the surveys whose answers an edit or delete
+    changed. Answers are deleted in bulk, without signals (see signals.py),
+    and the admin edits scores without going through Question.remap_answers.
+    """
+    survey_path = None
+
+    def surveys(self, queryset):
+        return Survey.objects.filter(pk__in=queryset.values(self.survey_path))
+
+    def save_model(self, request, obj, form, change):
+        surveys = list(self.surveys(self.model.objects.filter(pk=obj.pk))) if change else []
+        super().save_model(request, obj, form, change)
+        for survey in {*surveys, *self.surveys(self.model.objects.filter(pk=obj.pk))}:
+            rebuild_rollups(survey)
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, self.model.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        surveys = list(self.surveys(queryset))
+        super().delete_queryset(request, queryset)
+        for survey in surveys:
+            rebuild_rollups(survey)
+
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(RollupsRebuildingAdmin):
     list_display = ('label', 'survey', 'field_type', 'order', 'is_required')
     list_filter = ('survey', 'field_type')
+    survey_path = 'survey'
 
 
 @admin.register(UserAnswer)
 class UserAnswerAdmin(admin.ModelAdmin):
-    list_display = ('survey', 'user', 'created_at')
+    list_display = ('survey', 'user', 'submitted_at', 'created_at')
+    list_select_related = ('survey', 'user')
 
 
 @admin.register(Answer)
-class AnswerAdmin(admin.ModelAdmin):
-    list_display = ('question', 'value', 'user_answer')
+class AnswerAdmin(RollupsRebuildingAdmin):
+    list_display = ('question', 'display_value', 'user_answer')
+    list_select_related = ('question__survey', 'user_answer__survey')
+    raw_id_fields = ('user_answer',)
+    survey_path = 'question__survey'
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Question labels include their survey's name
+        if db_field.name == 'question':
+            kwargs['queryset'] = Question.objects.select_related('survey')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+@admin.register(ScoreRollup)
+class ScoreRollupAdmin(admin.ModelAdmin):
+    list_display = ('survey', 'kind', 'key', 'total', 'count')
+    list_filter = ('survey', 'kind')
+
+
+@admin.register(PendingSubmission)
+class PendingSubmissionAdmin(admin.ModelAdmin):
+    list_display = ('survey', 'user', 'created_at')
+    list_select_related = ('survey', 'user')
@@ -0,0 +1,95 @@
+"""
+Cache of the computed analysis of a survey.
+
+analysis_data() results are stored in the Django cache under keys that embed
+a per-survey version token. Instead of deleting entries when responses or
+questions change, signals (see signals.py) bump the version once the change
+commits, so every view of the survey (all respondents, one selected user, a
+respondent's own answers) misses at once and the old entries simply expire.
+
+Hits and misses are counted per process and the hit rate is logged to the
+"survey.cache" logger every ANALYSIS_CACHE_LOG_EVERY lookups.
+"""
+import hashlib
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, router
+
+from mysite.routers import replica_generation
+
+from .models import ScoreRollup
+
+
+logger = logging.getLogger("survey.cache")
+
+TIMEOUT = 60 * 60
+
+_stats_lock = threading.Lock()
+STATS = {"hits": 0, "misses": 0}
+
+
+def _version_key(survey_id):
+    return f"survey:{survey_id}:analysis-version"
+
+
+def analysis_version(survey_id):
+    """
+    Return the survey's current version. A version lost from the cache is
+    replaced by a new one, so entries cached under it are never read again.
+    """
+    version = cache.get(_version_key(survey_id))
+    if version is None:
+        cache.add(_version_key(survey_id), uuid.uuid4().hex, timeout=None)
+        version = cache.get(_version_key(survey_id))
+    return version
+
+
+def bump(survey_id):
+    """
+    Invalidate every cached analysis of the survey and return its new
+    version. Versions are random rather than incremented, so two processes
+    bumping at once can't both land on the same next version.
+    """
+    version = uuid.uuid4().hex
+    cache.set(_version_key(survey_id), version, timeout=None)
+    return version
+
+
+def analysis_key(survey_id, variant):
+    digest = hashlib.sha256(variant.encode("utf-8")).hexdigest()[:32]
+    version = analysis_version(survey_id)
+    alias = router.db_for_read(ScoreRollup)
+    if alias != DEFAULT_DB_ALIAS:
+        # Computed from a replica that may not have caught up with the change yet
+        version = f"{version}:{alias}:{replica_generation(alias)}"
+    return f"survey:{survey_id}:analysis:{version}:{digest}"
+
+
+def get_or_compute(survey, variant, compute):
+    """
+    Return the cached analysis of the survey for ``variant`` (which names
+    what was computed, such as "all" or "user:<username>"), calling
+    compute() and caching its result on a miss.
+    """
+    key = analysis_key(survey.pk, variant)
+    data = cache.get(key)
+    hit = data is not None
+    if not hit:
+        data = compute()
+        cache.set(key, data, getattr(settings, "ANALYSIS_CACHE_TIMEOUT", TIMEOUT))
+    record(hit, survey, variant)
+    return data
+
+
+def record(hit, survey, variant):
+    with _stats_lock:
+        STATS["hits" if hit else "misses"] += 1
+        lookups = STATS["hits"] + STATS["misses"]
+        hits = STATS["hits"]
+    logger.debug("Analysis cache %s for survey %s (%s)", "hit" if hit else "miss", survey.pk, variant)
+    if lookups % getattr(settings, "ANALYSIS_CACHE_LOG_EVERY", 100) == 0:
+        logger.info("Analysis cache hit rate %.1f%% over %d lookups", 100 * hits / lookups, lookups)
@@ -0,0 +1,169 @@
+"""
+Analysis views. Kept apart from survey.views, and free of module-level chart
+imports, so that loading the URLconf never imports matplotlib or numpy.
+
+The views are async. They read the survey with the async ORM, then do the
+cache lookups and, on a miss, the analysis queries in a single
+sync_to_async call rather than one thread switch per query, which is what
+the async ORM would cost. Charts are rendered on the charts executor (see
+executors.py).
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.shortcuts import render
+from django.http import HttpResponse, Http404, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+
+from . import analysis_cache, chart_cache, executors, live
+from .decorators import async_login_required
+from .models import Survey, UserAnswer, Answer
+from .rollups import rollup_summaries, summarize
+
+
+######################################################################################
+
+async def get_survey(slug):
+    # The creator is compared with the user on every request
+    try:
+        return await Survey.objects.select_related('created_by').aget(slug=slug)
+    except Survey.DoesNotExist:
+        raise Http404("No survey found.")
+
+
+def sees_all_responses(user, survey):
+    return user.is_superuser or survey.created_by == user
+
+
+def analysis_data(request, survey):
+    """
+    Return the summaries, response count and respondent list that the
+    analysis page and its JSON endpoint share, from the analysis cache when
+    possible.
+    """
+    user_filter = request.GET.get('user')
+    can_see_all = sees_all_responses(request.user, survey)
+
+    if can_see_all:
+        variant = f"user:{user_filter}" if user_filter else "all"
+    else:
+        variant = f"own:{request.user.pk}"
+
+    data = analysis_cache.get_or_compute(
+        survey, variant, lambda: compute_analysis(survey, request.user, can_see_all, user_filter))
+    return {**data, 'selected_user': user_filter}
+
+
+def compute_analysis(survey, user, can_see_all, user_filter):
+    if can_see_all:
+        # Admins or survey creators can see all responses
+        if user_filter:
+            user_answers = UserAnswer.objects.filter(survey=survey, user__username=user_filter)
+        else:
+            user_answers = UserAnswer.objects.filter(survey=survey)
+    else:
+        # Regular users can see only their own responses
+        user_answers = UserAnswer.objects.filter(survey=survey, user=user)
+
+    if can_see_all and not user_filter:
+        # All respondents: read the precomputed rollups
+        dimension_summary, area_summary = rollup_summaries(survey)
+    else:
+        # A single respondent: average their scores by dimension and area in the database
+        dimension_summary, area_summary = summarize(Answer.objects.filter(user_answer__in=user_answers))
+
+    # Get a list of all users who completed the survey (only for admins or creators)
+    users = []
+    if can_see_all:
+        users = list(UserAnswer.objects.filter(survey=survey).values_list('user__username', flat=True).distinct())
+
+    return {
+        'dimension_summary': dimension_summary,
+        'area_summary': area_summary,
+        'response_count': user_answers.count(),
+        'users': users,
+    }
+
+
+def analysis_context(request, survey):
+    context = analysis_data(request, survey)
+
+    # Charts are drawn in the browser from survey_analysis_data. The cached PNGs
+    # are only a <noscript> fallback, rendered the first time one is requested.
+    context['dimension_chart'] = chart_cache.remember("dimensions", context['dimension_summary'])
+    context['area_chart'] = chart_cache.remember("areas", context['area_summary'])
+    context['survey'] = survey
+    # Only the analysis of all respondents is followed live
+    context['live'] = sees_all_responses(request.user, survey) and not context['selected_user']
+    return context
+
+
+@async_login_required
+async def survey_analysis(request, slug):
+    survey = await get_survey(slug)
+    context = await sync_to_async(analysis_context)(request, survey)
+    return render(request, 'survey/analysis.html', context)
+
+######################################################################################
+
+@async_login_required
+async def survey_analysis_data(request, slug):
+    survey = await get_survey(slug)
+    data = await sync_to_async(analysis_data)(request, survey)
+
+    # JSON objects don't guarantee key order, so send the summaries as pairs
+    data['dimension_summary'] = list(data['dimension_summary'].items())
+    data['area_summary'] = list(data['area_summary'].items())
+    return JsonResponse(data)
+
+######################################################################################
+
+@async_login_required
+async def survey_analysis_events(request, slug):
+    """
+    Server-Sent Events stream of the analysis of all respondents, updated as
+    responses are submitted (see live.py).
+    """
+    survey = await get_survey(slug)
+    if not sees_all_responses(request.user, survey):
+        return HttpResponseForbidden("You are not allowed to follow this analysis.")
+
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be held for the whole stream: send the current
+        # analysis and let the browser reconnect for the next one
+        data = await sync_to_async(analysis_data)(request, survey)
+        body = live.retry() + live.encode(data['dimension_summary'], data['area_summary'], data['response_count'])
+        return HttpResponse(body, content_type="text/event-stream")
+
+    response = StreamingHttpResponse(live.stream(survey.pk), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stops proxies such as nginx from buffering the events
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+######################################################################################
+
+def chart_headers(response, key):
+    # The key is a hash of the chart's content, so the response never changes
+    response["Cache-Control"] = "private, max-age=31536000, immutable"
+    response["ETag"] = f'"{key}"'
+    return response
+
+
+@async_login_required
+async def survey_chart(request, key):
+    # A browser revalidating a chart it has already got needs no PNG at all
+    if chart_cache.KEY_PATTERN.fullmatch(key):
+        not_modified = get_conditional_response(request, etag=f'"{key}"')
+        if not_modified is not None:
+            return chart_headers(not_modified, key)
+
+    # Imported here so matplotlib is only loaded by workers that actually render charts
+    from . import charts
+
+    png = await executors.run(executors.CHARTS, chart_cache.get_or_render, key, charts.render)
+    if png is None:
+        raise Http404("Unknown chart.")
+    return chart_headers(HttpResponse(png, content_type="image/png"), key)
+
+######################################################################################
+
@@ -0,0 +1,69 @@
+"""
+Helpers shared by the benchmark management commands.
+"""
+import math
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test import override_settings
+
+
+@contextmanager
+def scratch_database(alias="default", options=None):
+    """
+    Run the enclosed block against a freshly migrated, file-backed copy of the
+    database (like the test runner does), so benchmarks never touch real data
+    and see the same locking behaviour as the on-disk database. The cache is
+    swapped for an empty in-memory one too, so entries cached for the real
+    database's surveys are never served for the scratch ones.
+
+    ``options`` replaces the database's OPTIONS while the block runs.
+    """
+    connection = connections[alias]
+    test_settings = connection.settings_dict["TEST"]
+    directory = tempfile.mkdtemp(prefix="survey-bench-")
+    previous_test_name = test_settings["NAME"]
+    previous_options = connection.settings_dict["OPTIONS"]
+    test_settings["NAME"] = os.path.join(directory, "bench.sqlite3")
+    if options is not None:
+        connection.close()
+        connection.settings_dict["OPTIONS"] = options
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    caches = override_settings(CACHES={"default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": directory}})
+    try:
+        with caches:
+            yield connection.settings_dict["NAME"]
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        connection.settings_dict["OPTIONS"] = previous_options
+        test_settings["NAME"] = previous_test_name
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def timer():
+    """
+    Yield a dict whose "seconds" key holds the elapsed time once the block exits.
+    """
+    result = {}
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - started
+
+
+def percentile(samples, percent):
+    """
+    Nearest-rank percentile of a list of samples.
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
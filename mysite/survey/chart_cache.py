@@ -0,0 +1,171 @@
+"""
+Content-addressed, size-bounded cache of the analysis charts.
+
+A chart is identified by a hash of its type and the summary data it plots, so
+an unchanged survey always maps to the same URL and is rendered at most once.
+The analysis page only records the chart spec (a few bytes of JSON); the PNG is
+rendered on the first request for it. Specs and PNGs are evicted
+least-recently-used first once the cache directory grows past
+CHART_CACHE_MAX_BYTES. Each process keeps an estimate of the directory's size,
+adding what it writes, and only scans the directory to evict when the estimate
+crosses the bound or CHART_CACHE_SCAN_SECONDS have passed since its last scan,
+which catches what other processes wrote.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+
+KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+SCAN_SECONDS = 60
+
+# Cache directory -> [estimated bytes, monotonic time of the last scan]
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+def cache_dir():
+    path = Path(getattr(settings, "CHART_CACHE_DIR", Path(settings.MEDIA_ROOT) / "charts"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def max_bytes():
+    return getattr(settings, "CHART_CACHE_MAX_BYTES", 50 * 1024 * 1024)
+
+
+def chart_key(kind, summary):
+    """
+    Hash of the chart type and its (ordered) summary data.
+    """
+    payload = json.dumps([kind, list(summary.items())], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def scan_seconds():
+    return getattr(settings, "CHART_CACHE_SCAN_SECONDS", SCAN_SECONDS)
+
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as tmp:
+        tmp.write(data)
+    os.replace(tmp_path, path)
+    _wrote(path.parent, len(data))
+
+
+def _wrote(directory, size):
+    """
+    Add a written file to the directory's estimated size and evict if it is
+    over the bound or due for a scan. A single caller scans at a time.
+    """
+    now = time.monotonic()
+    with _usage_lock:
+        usage = _usage.setdefault(directory, [0, None])
+        usage[0] += size
+        scanned = usage[1]
+        if scanned is not None and usage[0] <= max_bytes() and now - scanned < scan_seconds():
+            return
+        usage[1], written = now, usage[0]
+    remaining = evict()
+    with _usage_lock:
+        # Keep what was written while the scan ran
+        usage[0] = remaining + usage[0] - written
+
+
+def remember(kind, summary):
+    """
+    Record the spec of a chart and return its key. Nothing is rendered here.
+    """
+    key = chart_key(kind, summary)
+    directory = cache_dir()
+    spec_path = directory / f"{key}.json"
+    if not (directory / f"{key}.png").exists() and not spec_path.exists():
+        spec = json.dumps({"kind": kind, "summary": list(summary.items())})
+        # Specs of charts nobody requests count towards the bound too
+        _write_atomic(spec_path, spec.encode("utf-8"))
+    return key
+
+
+def load_spec(key):
+    """
+    Return (kind, summary) for a remembered chart, or None if unknown.
+    """
+    if not KEY_PATTERN.fullmatch(key):
+        return None
+    try:
+        spec = json.loads((cache_dir() / f"{key}.json").read_text())
+    except FileNotFoundError:
+        return None
+    return spec["kind"], dict(spec["summary"])
+
+
+def get_png(key):
+    """
+    Return the cached PNG bytes for a key, or None on a miss. Hits refresh the
+    file's mtime, which is what eviction orders by.
+    """
+    if not KEY_PATTERN.fullmatch(key):
+        return None
+    path = cache_dir() / f"{key}.png"
+    try:
+        data = path.read_bytes()
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return data
+
+
+def store_png(key, data):
+    _write_atomic(cache_dir() / f"{key}.png", data)
+
+
+def get_or_render(key, render):
+    """
+    Return the PNG for a key, rendering it with render(kind, summary) on a
+    miss. Returns None if the key was never remembered.
+    """
+    data = get_png(key)
+    if data is not None:
+        return data
+    spec = load_spec(key)
+    if spec is None:
+        return None
+    data = render(*spec)
+    store_png(key, data)
+    return data
+
+
+def evict():
+    """
+    Delete the least recently used charts (PNG and spec together) until the
+    cache fits its bound, and return the size of what is left.
+    """
+    entries = {}
+    for path in cache_dir().iterdir():
+        if path.suffix not in (".png", ".json"):
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        mtime, size, paths = entries.get(path.stem, (0, 0, []))
+        entries[path.stem] = (max(mtime, stat.st_mtime), size + stat.st_size, paths + [path])
+
+    total = sum(size for _, size, _ in entries.values())
+    limit = max_bytes()
+    for _, size, paths in sorted(entries.values()):
+        if total <= limit:
+            break
+        for path in paths:
+            path.unlink(missing_ok=True)
+        total -= size
+    return total
@@ -0,0 +1,90 @@
+"""
+Rendering of the analysis charts.
+
+Every chart is drawn on its own Figure attached to a FigureCanvasAgg, so no
+pyplot global state is involved: concurrent requests can't draw on each other's
+figures, and a figure is garbage once render() returns.
+
+Set CHART_RENDER_PROCESSES to a positive number to render in a bounded pool of
+worker processes instead of the calling thread, keeping chart CPU off the GIL of
+the web workers.
+"""
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+AREA_COLORS = ['blue', 'orange', 'green', 'red', 'purple', 'brown', 'pink', 'gray', 'olive', 'cyan']
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def draw_dimensions(figure, summary):
+    # Pie chart for dimensions
+    axes = figure.subplots()
+    axes.pie(list(summary.values()), labels=list(summary.keys()), autopct='%1.1f%%')
+    axes.set_title("Analysis by Dimensions")
+
+
+def draw_areas(figure, summary):
+    # Bar chart for areas
+    axes = figure.subplots()
+    axes.bar(list(summary.keys()), list(summary.values()), color=AREA_COLORS[:len(summary)])
+    axes.set_title("Analysis by Areas")
+    axes.set_ylabel("Average Score")
+    axes.tick_params(axis="x", labelrotation=75, labelsize=10)
+    figure.tight_layout()
+
+
+CHARTS = {
+    "dimensions": (draw_dimensions, (7, 7)),
+    "areas": (draw_areas, (8, 8)),
+}
+
+
+def render_png(kind, summary):
+    """
+    Draw a chart in the current process and return its PNG bytes.
+    """
+    draw, figsize = CHARTS[kind]
+    figure = Figure(figsize=figsize)
+    canvas = FigureCanvasAgg(figure)
+    draw(figure, summary)
+
+    buf = io.BytesIO()
+    canvas.print_png(buf)
+    return buf.getvalue()
+
+
+def get_pool():
+    """
+    Return the shared render process pool, or None when rendering in-process.
+    """
+    global _pool
+    processes = getattr(settings, "CHART_RENDER_PROCESSES", 0)
+    if not processes:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked: the web worker may hold threads and locks
+            _pool = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def render(kind, summary):
+    """
+    Render a chart to PNG bytes, in the process pool if one is configured.
+    """
+    pool = get_pool()
+    if pool is None:
+        return render_png(kind, summary)
+    timeout = getattr(settings, "CHART_RENDER_TIMEOUT", 30)
+    return pool.submit(render_png, kind, dict(summary)).result(timeout=timeout)
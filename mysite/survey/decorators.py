@@ -0,0 +1,22 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+
+
+def async_login_required(view):
+    """
+    login_required for async views, which Django's own decorator can't wrap
+    before Django 5.0.
+
+    The user is loaded from the session in a thread, once, so the view and
+    its template can then read request.user and request.session without
+    touching the database from the event loop.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,189 @@
+"""
+Compiled survey definitions for the survey_detail hot path.
+
+Serving and validating a response needs the survey, its questions with their
+options parsed, and its invitation list, none of which change between
+responses. get_definition() builds them once into an immutable
+SurveyDefinition and keeps it in a per-process LRU, backed by the shared
+cache so other processes don't rebuild it either.
+
+The markup of the form's questions is the same for every respondent of a
+survey version too, so question_fields() renders it once per version and
+caches it the same way; survey_detail only renders the page around it.
+
+Each definition records the survey's definition version it was built under,
+a token in the shared cache that signals.py replaces once a change to the
+survey, its questions or its invitations commits. A definition whose token
+is no longer current is rebuilt, so in steady state a request costs one
+cache read and no queries. Async views use aget_definition() and
+aquestion_fields(), which read the version through the cache's async API
+and only build or render in a thread on a miss.
+"""
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Survey
+
+
+TIMEOUT = 24 * 60 * 60
+
+LRU_SIZE = 256
+
+
+@dataclass(frozen=True)
+class SurveyDefinition:
+    """
+    A survey, its ordered questions (with split_choices already parsed) and
+    the emails invited to it. Shared between requests: treat the survey and
+    questions as read-only.
+    """
+    survey: Survey
+    questions: tuple
+    invited_emails: frozenset
+    version: str
+
+    @property
+    def is_restricted(self):
+        return bool(self.invited_emails)
+
+    def is_invited(self, email):
+        return (email or "").lower() in self.invited_emails
+
+
+# Keyed by slug, so a request can check its definition before knowing the survey
+def _version_key(slug):
+    return f"survey-definition:{slug}:version"
+
+
+def definition_version(slug):
+    version = cache.get(_version_key(slug))
+    if version is None:
+        cache.add(_version_key(slug), uuid.uuid4().hex, timeout=None)
+        version = cache.get(_version_key(slug))
+    return version
+
+
+def bump(slug):
+    cache.set(_version_key(slug), uuid.uuid4().hex, timeout=None)
+
+
+def invalidate_on_commit(slug):
+    transaction.on_commit(lambda: bump(slug))
+
+
+def _definition_key(slug):
+    return f"survey-definition:{slug}"
+
+
+class LRU:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > getattr(settings, "SURVEY_DEFINITION_LRU_SIZE", LRU_SIZE):
+                self.entries.popitem(last=False)
+
+
+_local = LRU()
+
+_local_fields = LRU()
+
+
+def build(slug):
+    """
+    Read the survey with the given slug from the database and compile its
+    definition, or return None if there is no such survey.
+    """
+    # Read the version first: a change committing while the definition is
+    # read leaves it with an outdated version rather than outdated contents
+    version = definition_version(slug)
+    survey = Survey.objects.filter(slug=slug).first()
+    if survey is None:
+        return None
+    questions = tuple(survey.questions.order_by("order", "id"))
+    for question in questions:
+        question.survey = survey
+        question.split_choices
+    return SurveyDefinition(
+        survey=survey,
+        questions=questions,
+        invited_emails=frozenset(survey.invitations.values_list("email", flat=True)),
+        version=version)
+
+
+def get_definition(slug):
+    """
+    Return the current SurveyDefinition of the survey with the given slug, or
+    None if there is no such survey.
+    """
+    version = definition_version(slug)
+    definition = _local.get(slug)
+    if definition is not None and definition.version == version:
+        return definition
+
+    definition = cache.get(_definition_key(slug))
+    if definition is None or definition.version != version:
+        definition = build(slug)
+        if definition is None:
+            return None
+        cache.set(_definition_key(slug), definition, getattr(settings, "SURVEY_DEFINITION_CACHE_TIMEOUT", TIMEOUT))
+    _local.set(slug, definition)
+    return definition
+
+
+def question_fields(definition):
+    """
+    Return the rendered form fields of the definition's questions, rendering
+    them only once per survey version.
+    """
+    key = (definition.survey.slug, definition.version)
+    html = _local_fields.get(key)
+    if html is None:
+        shared_key = f"{_definition_key(definition.survey.slug)}:{definition.version}:fields"
+        html = cache.get(shared_key)
+        if html is None:
+            html = render_to_string("survey/question_fields.html", {"questions": definition.questions})
+            cache.set(shared_key, html, getattr(settings, "SURVEY_DEFINITION_CACHE_TIMEOUT", TIMEOUT))
+        _local_fields.set(key, html)
+    return mark_safe(html)
+
+
+async def aget_definition(slug):
+    """
+    get_definition() for async views.
+    """
+    version = await cache.aget(_version_key(slug))
+    definition = _local.get(slug)
+    if version is not None and definition is not None and definition.version == version:
+        return definition
+    return await sync_to_async(get_definition)(slug)
+
+
+async def aquestion_fields(definition):
+    """
+    question_fields() for async views.
+    """
+    html = _local_fields.get((definition.survey.slug, definition.version))
+    if html is not None:
+        return mark_safe(html)
+    return await sync_to_async(question_fields)(definition)
@@ -0,0 +1,53 @@
+"""
+Bounded thread pools for the blocking work that requests hand off: rendering
+charts with matplotlib and sending invitation emails.
+
+Each pool has a fixed number of workers (SURVEY_EXECUTORS, falling back to
+WORKERS), so a burst of chart requests or a large mailing can't grow a
+process's threads without bound; work beyond that waits in the pool's queue.
+Async views await it with run(), which leaves the event loop free to serve
+other requests meanwhile.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+CHARTS = "charts"
+MAIL = "mail"
+
+WORKERS = {
+    CHARTS: 2,
+    # One worker, so a process never runs two dispatches against the same queue
+    MAIL: 1,
+}
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(name):
+    with _lock:
+        if name not in _executors:
+            workers = getattr(settings, "SURVEY_EXECUTORS", {}).get(name, WORKERS[name])
+            _executors[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"survey-{name}")
+        return _executors[name]
+
+
+def submit(name, func, *args):
+    """
+    Start func(*args) on the named executor and return its Future.
+    """
+    return get_executor(name).submit(func, *args)
+
+
+async def run(name, func, *args):
+    """
+    Run func(*args) on the named executor and return its result, without
+    blocking the event loop while it runs.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(name), functools.partial(func, *args))
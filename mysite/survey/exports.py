@@ -0,0 +1,255 @@
+"""
+Export of survey responses, one row per UserAnswer and one column per
+Question.
+
+Responses are read in keyset-paginated chunks (see pagination.py) with the
+answers of each chunk fetched in a single query, so memory use is bounded by
+the chunk size no matter how many responses a survey has.
+"""
+import csv
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, time
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Answer, UserAnswer
+from .pagination import keyset_page
+
+
+CHUNK_SIZE = 1000
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class Echo:
+    """
+    File-like object whose write() returns the line instead of buffering it,
+    so csv.writer can feed a streaming response.
+    """
+    def write(self, value):
+        return value
+
+
+def iter_responses(survey, since=None, after=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield (user_answer, {question_id: value}) for the survey's responses in
+    the order they were stored, optionally only those stored after ``since``
+    or with an id above ``after``.
+
+    Incremental pulls should pass the last response_id they received as
+    ``after``: ids only grow, while a queued response is stored after
+    responses submitted later than it.
+    """
+    user_answers = UserAnswer.objects.filter(survey=survey).select_related("user")
+    if since is not None:
+        user_answers = user_answers.filter(created_at__gt=since)
+    if after is not None:
+        user_answers = user_answers.filter(id__gt=after)
+
+    questions = survey.questions.in_bulk()
+    cursor = None
+    while True:
+        page, cursor = keyset_page(user_answers, cursor, size=chunk_size, descending=False)
+        answers = {}
+        for question_id, user_answer_id, value, choice in (Answer.objects
+                .filter(user_answer__in=[user_answer.pk for user_answer in page])
+                .values_list("question_id", "user_answer_id", "value", "choice")):
+            question = questions.get(question_id)
+            if question is None:
+                continue  # deleted while the export was running
+            answers.setdefault(user_answer_id, {})[question_id] = (
+                question.decode(choice) if choice is not None else value)
+        for user_answer in page:
+            yield user_answer, answers.get(user_answer.pk, {})
+        if cursor is None:
+            break
+
+
+def export_rows(survey, since=None, after=None):
+    """
+    Yield the header and then one list of cells per response.
+    """
+    questions = list(survey.questions.all())
+    labels = [question.label for question in questions]
+    # Repeated labels get the question id appended so every column name is unique
+    yield ["response_id", "user", "submitted_at"] + [
+        label if labels.count(label) == 1 else f"{label} [{question.pk}]"
+        for label, question in zip(labels, questions)
+    ]
+    for user_answer, answers in iter_responses(survey, since, after):
+        yield [
+            user_answer.pk,
+            user_answer.user.username if user_answer.user else "",
+            user_answer.submitted_at.isoformat(),
+        ] + [answers.get(question.pk, "") for question in questions]
+
+
+def parse_since(value):
+    """
+    Parse the ``since`` parameter of an export: an ISO 8601 date or datetime,
+    read in the current time zone when it has none. Returns None if invalid.
+    """
+    try:
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            since = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        return None
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def parse_after(value):
+    """
+    Parse the ``after`` parameter of an export: the last response id already
+    exported. Returns None if invalid.
+    """
+    try:
+        after = int(value)
+    except ValueError:
+        return None
+    return after if after >= 0 else None
+
+
+def export_lines(survey, format="csv", since=None, after=None):
+    """
+    Yield the export as text lines in CSV or NDJSON (one JSON object per
+    response, keyed by the header) format.
+    """
+    rows = export_rows(survey, since, after)
+    if format == "csv":
+        writer = csv.writer(Echo())
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        header = next(rows)
+        for row in rows:
+            yield json.dumps(dict(zip(header, row))) + "\n"
+
+
+def survey_version(survey):
+    """
+    Short token that changes whenever the survey's questions or its set of
+    responses change, used to key cached exports.
+    """
+    questions = survey.questions.aggregate(count=Count("id"), updated=Max("updated_at"))
+    responses = UserAnswer.objects.filter(survey=survey).aggregate(count=Count("id"), last=Max("id"))
+    state = [survey.pk, questions["count"], str(questions["updated"]), responses["count"], responses["last"]]
+    return hashlib.sha256(json.dumps(state).encode("utf-8")).hexdigest()[:16]
+
+
+def build_response_matrix(survey, path, chunk_size=CHUNK_SIZE):
+    """
+    Write the survey's responses to ``path`` as a compressed .npz holding a
+    dense respondent x question ``scores`` matrix (uint64, 0 where a
+    question wasn't answered or is free text; the stored ordinal or
+    Multi-Select bitmask otherwise, both of which are never 0) plus the row
+    (response_ids, user_ids, submitted_at in UTC) and column (question_ids,
+    labels, field_types, dimensions, areas) metadata arrays. An integer
+    matrix keeps bitmasks of questions with more than 24 options exact,
+    which a float32 one would round.
+
+    The matrix is filled chunk by chunk in a disk-backed .npy next to
+    ``path`` and compressed from there, so memory use doesn't grow with the
+    number of responses (only the 24 bytes per row of row metadata do).
+    """
+    import numpy as np
+
+    questions = list(survey.questions.all())
+    question_ids = np.array([question.pk for question in questions], dtype=np.int64)
+    column_order = np.argsort(question_ids)
+
+    # Snapshot the responses so rows submitted during the export don't overflow the matrix
+    user_answers = UserAnswer.objects.filter(survey=survey)
+    last_id = user_answers.aggregate(last=Max("id"))["last"] or 0
+    user_answers = user_answers.filter(id__lte=last_id)
+    total = user_answers.count()
+
+    response_ids = np.zeros(total, dtype=np.int64)
+    user_ids = np.full(total, -1, dtype=np.int64)
+    submitted_at = np.zeros(total, dtype="datetime64[us]")
+
+    fd, scores_path = tempfile.mkstemp(dir=Path(path).parent, suffix=".tmp.npy")
+    os.close(fd)
+    try:
+        scores = np.lib.format.open_memmap(
+            scores_path, mode="w+", dtype=np.uint64, shape=(total, len(questions)))
+        offset = 0
+        cursor = None
+        while True:
+            page, cursor = keyset_page(user_answers, cursor, size=chunk_size, descending=False)
+            page = page[:total - offset]
+            if not page:
+                break
+            end = offset + len(page)
+            chunk_ids = np.array([user_answer.pk for user_answer in page], dtype=np.int64)
+            response_ids[offset:end] = chunk_ids
+            user_ids[offset:end] = [user_answer.user_id or -1 for user_answer in page]
+            submitted_at[offset:end] = [user_answer.submitted_at.replace(tzinfo=None) for user_answer in page]
+
+            rows = np.array(list(Answer.objects
+                                 .filter(user_answer__in=page, choice__isnull=False)
+                                 .values_list("user_answer_id", "question_id", "choice")),
+                            dtype=np.int64).reshape(-1, 3)
+
+            # Map ids to matrix positions with sorted lookups instead of a Python loop
+            chunk_order = np.argsort(chunk_ids)
+            row_index = chunk_order[np.searchsorted(chunk_ids, rows[:, 0], sorter=chunk_order)]
+            known = np.isin(rows[:, 1], question_ids)
+            column_index = column_order[np.searchsorted(question_ids, rows[known, 1], sorter=column_order)]
+            chunk = np.zeros((len(page), len(questions)), dtype=np.uint64)
+            chunk[row_index[known], column_index] = rows[known, 2]
+            scores[offset:end] = chunk
+
+            offset = end
+            if cursor is None:
+                break
+
+        # savez writes the matrix to the archive in buffered pieces, reading it back from disk
+        np.savez_compressed(
+            path,
+            scores=scores[:offset],
+            response_ids=response_ids[:offset],
+            user_ids=user_ids[:offset],
+            submitted_at=submitted_at[:offset],
+            question_ids=question_ids,
+            labels=np.array([question.label for question in questions], dtype=str),
+            field_types=np.array([question.field_type for question in questions], dtype=np.int8),
+            dimensions=np.array([question.dimension for question in questions], dtype=str),
+            areas=np.array([question.area for question in questions], dtype=str),
+        )
+        del scores
+    finally:
+        os.unlink(scores_path)
+
+
+def response_matrix_path(survey):
+    """
+    Return the path of the survey's .npz export for its current version,
+    building it (and dropping older versions) if it isn't cached yet.
+    """
+    directory = Path(getattr(settings, "EXPORT_CACHE_DIR", Path(settings.MEDIA_ROOT) / "exports"))
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{survey.slug}-{survey_version(survey)}.npz"
+    if not path.exists():
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp.npz")
+        os.close(fd)
+        build_response_matrix(survey, tmp_path)
+        os.replace(tmp_path, path)
+        for stale in directory.glob(f"{glob.escape(survey.slug)}-{'?' * 16}.npz"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+    return path
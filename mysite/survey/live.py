@@ -0,0 +1,236 @@
+"""
+Live analysis of a survey, pushed to its viewers as Server-Sent Events.
+
+Each process keeps one Channel per survey that someone is watching, holding
+the survey's rollup totals and response count. The channel loads them when
+its first viewer arrives, and from then on applies the deltas that
+save_submissions reports (see signals.py) once they commit, so a submission
+shows at once. Every change is encoded into a single event, and each viewer
+is woken to send the latest one, so a slow client skips intermediate states
+rather than queueing them.
+
+Every change to the survey's analysis bumps its version, including changes
+this process doesn't see as deltas (submissions saved by other processes,
+deleted responses, edited questions). The channel compares the version at
+most every LIVE_ANALYSIS_CHECK_SECONDS and reloads when it changed: the
+rollups are read at most that often, however many submissions or viewers
+there are.
+
+Each delta comes with the version its submissions bumped the survey to. A
+channel loaded at that version read them already and skips the delta.
+Otherwise its load may still have read them, as they commit before the
+version is bumped, so the delta is shown but the channel keeps its older
+version: the next check reloads, correcting a count the delta doubled.
+
+Streams end after LIVE_ANALYSIS_STREAM_SECONDS and the browser reconnects:
+Django 4.2 doesn't notice a client that went away until it writes to it,
+and not always then, so a stream's lifetime must be bounded.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import analysis_cache
+from .models import ScoreRollup, UserAnswer
+
+
+CHECK_SECONDS = 5
+
+KEEPALIVE_SECONDS = 15
+
+STREAM_SECONDS = 5 * 60
+
+_channels = {}
+_channels_lock = threading.Lock()
+
+
+def setting(name, default):
+    return getattr(settings, f"LIVE_ANALYSIS_{name}", default)
+
+
+def encode(dimension_summary, area_summary, response_count):
+    """
+    Encode an analysis as an "analysis" event, shaped like the analysis JSON.
+    """
+    data = json.dumps({
+        "dimension_summary": list(dimension_summary.items()),
+        "area_summary": list(area_summary.items()),
+        "response_count": response_count,
+    }, separators=(",", ":"))
+    return f"event: analysis\ndata: {data}\n\n".encode("utf-8")
+
+
+def retry():
+    """
+    The field telling the browser how long to wait before reconnecting.
+    """
+    return f"retry: {int(setting('CHECK_SECONDS', CHECK_SECONDS) * 1000)}\n\n".encode("utf-8")
+
+
+class Subscription:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+
+def _set_all(events):
+    for event in events:
+        event.set()
+
+
+class Channel:
+    def __init__(self, survey_id):
+        self.survey_id = survey_id
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.subscribers = set()
+        # (kind, key) -> [total, count], in rollup order
+        self.totals = None
+        self.response_count = 0
+        self.version = None
+        self.checked = 0.0
+        self.message = None
+
+    def load(self, force=False):
+        """
+        Read the survey's rollups and response count and publish them.
+        """
+        with self.load_lock:
+            if self.message is not None and not force:
+                return
+            # Read the version first, so a change committing meanwhile is reloaded later
+            version = analysis_cache.analysis_version(self.survey_id)
+            totals = {
+                (kind, key): [total, count]
+                for kind, key, total, count in ScoreRollup.objects.filter(survey_id=self.survey_id)
+                .order_by("id").values_list("kind", "key", "total", "count")
+            }
+            response_count = UserAnswer.objects.filter(survey_id=self.survey_id).count()
+            with self.lock:
+                self.totals, self.response_count, self.version = totals, response_count, version
+                self.publish()
+
+    def check_due(self):
+        """
+        Whether the caller should check() now: true at most once every
+        LIVE_ANALYSIS_CHECK_SECONDS, however many viewers ask.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if now - self.checked < setting("CHECK_SECONDS", CHECK_SECONDS):
+                return False
+            self.checked = now
+            return True
+
+    def check(self):
+        """
+        Reload if the survey's analysis version changed.
+        """
+        if analysis_cache.analysis_version(self.survey_id) != self.version:
+            self.load(force=True)
+
+    def apply(self, responses, totals, version):
+        """
+        Add committed submissions: their count and their rollup totals.
+        version is the analysis version they bumped the survey to, which
+        self.version is not moved to (see the module docstring).
+        """
+        with self.lock:
+            if self.totals is None or self.version == version:
+                # Not loaded yet, or loaded after they committed: the load includes them
+                return
+            self.response_count += responses
+            for row, (total, count) in totals.items():
+                current = self.totals.setdefault(row, [0, 0])
+                current[0] += total
+                current[1] += count
+            self.publish()
+
+    def publish(self):
+        # Called with self.lock held
+        summaries = {ScoreRollup.DIMENSION: {}, ScoreRollup.AREA: {}}
+        for (kind, key), (total, count) in self.totals.items():
+            if count > 0:
+                summaries[kind][key] = total / count
+        self.message = encode(summaries[ScoreRollup.DIMENSION], summaries[ScoreRollup.AREA], self.response_count)
+
+        by_loop = defaultdict(list)
+        for subscription in self.subscribers:
+            by_loop[subscription.loop].append(subscription.event)
+        for loop, events in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_set_all, events)
+            except RuntimeError:
+                # The loop was closed; its subscriptions go when their streams end
+                pass
+
+
+def subscribe(survey_id):
+    subscription = Subscription()
+    with _channels_lock:
+        channel = _channels.get(survey_id)
+        if channel is None:
+            channel = _channels[survey_id] = Channel(survey_id)
+        with channel.lock:
+            channel.subscribers.add(subscription)
+    return channel, subscription
+
+
+def unsubscribe(channel, subscription):
+    with _channels_lock:
+        with channel.lock:
+            channel.subscribers.discard(subscription)
+            if not channel.subscribers and _channels.get(channel.survey_id) is channel:
+                # Nobody is watching, so its deltas would go unchecked
+                del _channels[channel.survey_id]
+
+
+def publish_submissions(responses, totals, versions):
+    """
+    Apply committed submissions to the channels of the surveys they were
+    made to. responses maps survey ids to how many responses each received,
+    totals to the rollup totals they added and versions to the analysis
+    version they bumped it to.
+    """
+    for survey_id, count in responses.items():
+        channel = _channels.get(survey_id)
+        if channel is not None:
+            channel.apply(count, totals.get(survey_id, {}), versions[survey_id])
+
+
+async def stream(survey_id):
+    """
+    Yield the survey's analysis as events: the current one, then one per
+    change, with keep-alive comments in between.
+    """
+    channel, subscription = subscribe(survey_id)
+    try:
+        await sync_to_async(channel.load)()
+        # Anything published after this is signalled again
+        subscription.event.clear()
+        yield retry() + channel.message
+
+        now = time.monotonic()
+        ends, last_sent = now + setting("STREAM_SECONDS", STREAM_SECONDS), now
+        while now < ends:
+            try:
+                await asyncio.wait_for(subscription.event.wait(), setting("CHECK_SECONDS", CHECK_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+            now = time.monotonic()
+            if subscription.event.is_set():
+                subscription.event.clear()
+                last_sent = now
+                yield channel.message
+            elif now - last_sent >= setting("KEEPALIVE_SECONDS", KEEPALIVE_SECONDS):
+                last_sent = now
+                yield b": keep-alive\n\n"
+            if channel.check_due():
+                await sync_to_async(channel.check)()
+    finally:
+        unsubscribe(channel, subscription)
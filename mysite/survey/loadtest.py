@@ -0,0 +1,257 @@
+"""
+Concurrent load harness.
+
+Serves the project's WSGI application from a local threaded server and drives
+it with virtual users, each a thread with its own session cookie, that log
+in and then replay a weighted mix of scenarios:
+
+- browse: the survey list, a survey's form and the results page
+- submit: a survey's form, then posting a response to it
+- analysis: a survey's analysis page, its JSON data and the <noscript>
+  chart, whose first request renders it with matplotlib
+
+Every request is recorded under its URL name, so the report gives latency
+percentiles, throughput and error rate per view, with the SQLite write lock,
+session writes and chart rendering all contending as they would in
+production. Only the standard library is used on the client side.
+"""
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from html.parser import HTMLParser
+from http.cookiejar import CookieJar
+from socketserver import ThreadingMixIn
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.urls import reverse
+
+from .benchmarks import percentile
+
+
+SCENARIOS = ("browse", "submit", "analysis")
+
+CSRF_PATTERN = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+CHART_PATTERN = re.compile(r'src="([^"]+\.png)"')
+
+
+class SurveyFormParser(HTMLParser):
+    """
+    Collect the answerable fields of a survey form: {name: [choices]}, with
+    no choices for free text.
+    """
+    def __init__(self):
+        super().__init__()
+        self.fields = defaultdict(list)
+        self.select = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        name = attrs.get("name", "")
+        if tag == "input" and name.startswith("question_"):
+            self.fields[name].append(attrs.get("value", ""))
+        elif tag == "select" and name.startswith("question_"):
+            self.select = name
+            self.fields[name]
+        elif tag == "option" and self.select:
+            self.fields[self.select].append(attrs.get("value", ""))
+        elif tag == "textarea" and name.startswith("question_"):
+            self.fields[name]
+
+    def handle_endtag(self, tag):
+        if tag == "select":
+            self.select = None
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    # Virtual users connect in a burst when the run starts
+    request_queue_size = 128
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(host="127.0.0.1", port=0):
+    """
+    Serve mysite.wsgi from a background thread. Returns (server, base_url).
+    """
+    from mysite.wsgi import application
+
+    server = make_server(host, port, application, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, name="loadtest-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+class NoRedirect(HTTPRedirectHandler):
+    """
+    Report redirects as responses, so each URL is timed on its own.
+    """
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_examples = {}
+
+    def add(self, url_name, seconds, error=None):
+        with self.lock:
+            self.samples[url_name].append(seconds)
+            if error:
+                self.errors[url_name] += 1
+                self.error_examples.setdefault(url_name, error)
+
+    def report(self, duration):
+        views = {}
+        for url_name, samples in sorted(self.samples.items()):
+            views[url_name] = summarize(samples, self.errors[url_name], duration)
+            if url_name in self.error_examples:
+                views[url_name]["example_error"] = self.error_examples[url_name]
+        total = [sample for samples in self.samples.values() for sample in samples]
+        return {
+            "duration_seconds": duration,
+            "total": summarize(total, sum(self.errors.values()), duration),
+            "views": views,
+        }
+
+
+def summarize(samples, errors, duration):
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0,
+        "throughput_per_second": len(samples) / duration if duration else 0,
+        "p50_ms": percentile(samples, 50) * 1000 if samples else None,
+        "p95_ms": percentile(samples, 95) * 1000 if samples else None,
+        "p99_ms": percentile(samples, 99) * 1000 if samples else None,
+        "max_ms": max(samples) * 1000 if samples else None,
+    }
+
+
+class VirtualUser:
+    def __init__(self, base_url, recorder, username, password, surveys, rng, timeout=30):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.username = username
+        self.password = password
+        self.surveys = surveys
+        self.rng = rng
+        self.timeout = timeout
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), NoRedirect)
+
+    def request(self, url_name, path, data=None):
+        """
+        Fetch a path, or POST data to it, and record it under url_name (with
+        " POST" appended for posts). Returns the body, or None after a
+        redirect or an error (an error status, or a connection error).
+        """
+        body = urlencode(data, doseq=True).encode() if data is not None else None
+        request = Request(self.base_url + path, data=body)
+        started = time.perf_counter()
+        error = None
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                content = response.read().decode("utf-8", "replace")
+        except HTTPError as exc:
+            content = None
+            # Redirects are how most POSTs here succeed
+            if exc.code >= 400:
+                error = f"HTTP {exc.code}"
+            exc.close()
+        except (URLError, OSError) as exc:
+            content = None
+            error = f"{type(exc).__name__}: {exc}"
+        label = url_name if data is None else f"{url_name} POST"
+        self.recorder.add(label, time.perf_counter() - started, error)
+        return content if error is None else None
+
+    def login(self):
+        page = self.request("users:login", reverse("users:login"))
+        token = CSRF_PATTERN.search(page or "")
+        if token is None:
+            raise RuntimeError(f"No login form for {self.username}")
+        # A successful login redirects; the form coming back means it was rejected
+        if self.request("users:login", reverse("users:login"), {
+                "csrfmiddlewaretoken": token[1], "username": self.username, "password": self.password}):
+            raise RuntimeError(f"Login failed for {self.username}")
+
+    def browse(self, slug):
+        self.request("survey:survey", reverse("survey:survey"))
+        self.request("survey:survey-detail", reverse("survey:survey-detail", kwargs={"slug": slug}))
+        self.request("survey:results-page", reverse("survey:results-page"))
+
+    def submit(self, slug):
+        path = reverse("survey:survey-detail", kwargs={"slug": slug})
+        page = self.request("survey:survey-detail", path)
+        token = CSRF_PATTERN.search(page or "")
+        if token is None:
+            return
+        form = SurveyFormParser()
+        form.feed(page)
+        answers = {"csrfmiddlewaretoken": token[1]}
+        for name, choices in form.fields.items():
+            answers[name] = self.rng.choice(choices) if choices else "Load test comment."
+        self.request("survey:survey-detail", path, answers)
+
+    def analysis(self, slug):
+        page = self.request("survey:survey-analysis", reverse("survey:survey-analysis", kwargs={"slug": slug}))
+        self.request("survey:survey-analysis-data", reverse("survey:survey-analysis-data", kwargs={"slug": slug}))
+        for chart in CHART_PATTERN.findall(page or ""):
+            self.request("survey:survey-chart", chart)
+
+    def run(self, scenarios, weights, deadline, iterations):
+        self.login()
+        done = 0
+        while time.monotonic() < deadline and (iterations is None or done < iterations):
+            scenario = self.rng.choices(scenarios, weights=weights)[0]
+            getattr(self, scenario)(self.rng.choice(self.surveys))
+            done += 1
+
+
+def run_load(base_url, accounts, surveys, mix, duration, iterations=None, seed=None):
+    """
+    Run one virtual user per (username, password) in ``accounts`` against
+    ``base_url`` until ``duration`` seconds have passed (or each user ran
+    ``iterations`` scenarios), choosing scenarios by the ``mix`` weights and
+    surveys among the ``surveys`` slugs. Returns the report.
+    """
+    recorder = Recorder()
+    scenarios = [scenario for scenario in SCENARIOS if mix.get(scenario)]
+    weights = [mix[scenario] for scenario in scenarios]
+    master = random.Random(seed)
+    users = [
+        VirtualUser(base_url, recorder, username, password, surveys, random.Random(master.random()))
+        for username, password in accounts
+    ]
+
+    failures = []
+
+    def worker(user):
+        try:
+            user.run(scenarios, weights, deadline, iterations)
+        except Exception as exc:
+            failures.append(f"{user.username}: {exc}")
+
+    started = time.monotonic()
+    deadline = started + duration
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report = recorder.report(time.monotonic() - started)
+    report["virtual_users"] = len(users)
+    report["mix"] = dict(zip(scenarios, weights))
+    report["failed_users"] = failures
+    return report
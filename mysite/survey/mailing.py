@@ -0,0 +1,148 @@
+"""
+Dispatch of survey invitation emails.
+
+Every invitee gets their own message, so no recipient sees the others'
+addresses. Messages are sent over one mail connection that stays open for the
+whole run, in batches of SURVEY_EMAIL_BATCH_SIZE invitations, at no more than
+SURVEY_EMAIL_RATE messages per second. Each invitation records whether its
+email was sent or why it failed as soon as it is known, so a run that stops
+part way never sends an invitation twice.
+
+The send_survey_emails view only queues the invitations and hands the sending
+to the mail executor (see executors.py); `manage.py send_invitations` sends
+(or retries) them from the command line.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Count
+from django.urls import reverse
+from django.utils import timezone
+
+from . import executors
+from .models import SurveyInvitation
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+
+def survey_link(survey):
+    base_url = getattr(settings, "SURVEY_BASE_URL", "http://127.0.0.1:8000")
+    return base_url.rstrip("/") + reverse("survey:survey-detail", kwargs={"slug": survey.slug})
+
+
+def invitation_message(invitation, connection=None):
+    survey = invitation.survey
+    subject = f"Invitation to participate in the survey: {survey.name}"
+    body = (f"You are invited to participate in the survey '{survey.name}'.\n\n"
+            f"Click the link below to access the survey:\n{survey_link(survey)}")
+    return EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [invitation.email],
+                        connection=connection)
+
+
+def queue_invitations(survey, retry_failed=True):
+    """
+    Mark the survey's invitations that haven't been emailed yet (and, with
+    retry_failed, those whose email failed) as queued. Returns how many.
+    """
+    statuses = [SurveyInvitation.PENDING]
+    if retry_failed:
+        statuses.append(SurveyInvitation.FAILED)
+    return survey.invitations.filter(status__in=statuses).update(
+        status=SurveyInvitation.QUEUED, updated_at=timezone.now())
+
+
+def _claim(invitation):
+    """
+    Move one queued invitation to "sending". Returns False if another
+    dispatcher got to it first.
+    """
+    return bool(SurveyInvitation.objects
+                .filter(pk=invitation.pk, status=SurveyInvitation.QUEUED)
+                .update(status=SurveyInvitation.SENDING, updated_at=timezone.now()))
+
+
+def dispatch_queued(survey=None, batch_size=None, rate=None, connection=None):
+    """
+    Send the queued invitations, of one survey or of all of them, and return
+    (sent, failed) counts. batch_size and rate (messages per second, 0 for no
+    limit) default to SURVEY_EMAIL_BATCH_SIZE and SURVEY_EMAIL_RATE.
+    """
+    batch_size = batch_size or getattr(settings, "SURVEY_EMAIL_BATCH_SIZE", BATCH_SIZE)
+    if rate is None:
+        rate = getattr(settings, "SURVEY_EMAIL_RATE", 0)
+    interval = 1.0 / rate if rate else 0
+
+    queued = SurveyInvitation.objects.filter(status=SurveyInvitation.QUEUED)
+    if survey is not None:
+        queued = queued.filter(survey=survey)
+
+    sent = failed = 0
+    next_send = time.monotonic()
+    connection = connection or get_connection()
+    # Opening the connection up front keeps send_messages() from opening and
+    # closing one per call
+    with connection:
+        while True:
+            batch = list(queued.select_related("survey").order_by("id")[:batch_size])
+            if not batch:
+                break
+
+            for invitation in batch:
+                if not _claim(invitation):
+                    continue
+                if interval:
+                    time.sleep(max(0, next_send - time.monotonic()))
+                    next_send = max(next_send, time.monotonic()) + interval
+                try:
+                    connection.send_messages([invitation_message(invitation, connection)])
+                except Exception as exc:
+                    logger.warning("Invitation to %s failed: %s", invitation.email, exc)
+                    SurveyInvitation.objects.filter(pk=invitation.pk).update(
+                        status=SurveyInvitation.FAILED, last_error=str(exc) or repr(exc),
+                        updated_at=timezone.now())
+                    failed += 1
+                else:
+                    now = timezone.now()
+                    SurveyInvitation.objects.filter(pk=invitation.pk).update(
+                        status=SurveyInvitation.SENT, sent_at=now, last_error="", updated_at=now)
+                    sent += 1
+    return sent, failed
+
+
+def _dispatch_job(survey_id):
+    close_old_connections()
+    try:
+        sent, failed = dispatch_queued(survey=survey_id)
+        logger.info("Sent %d invitations for survey %s (%d failed)", sent, survey_id, failed)
+    except Exception:
+        logger.exception("Invitation dispatch for survey %s failed", survey_id)
+    finally:
+        # The worker thread outlives the request, so it must not keep connections open
+        connections.close_all()
+
+
+def send_invitations(survey):
+    """
+    Queue the survey's unsent invitations and send them on the mail executor
+    once the current transaction commits. Returns how many were queued.
+    """
+    queued = queue_invitations(survey)
+    if queued:
+        transaction.on_commit(lambda: executors.submit(executors.MAIL, _dispatch_job, survey.pk))
+    return queued
+
+
+def invitation_status(survey):
+    """
+    Return {status: count} over the survey's invitations.
+    """
+    counts = dict.fromkeys(dict(SurveyInvitation.STATUSES), 0)
+    for status, count in survey.invitations.values_list("status").annotate(count=Count("id")).order_by():
+        counts[status] = count
+    return counts
@@ -0,0 +1,61 @@
+import gc
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from survey import charts
+
+
+def rss_mb():
+    """
+    Current resident set size, falling back to the peak where /proc is missing.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def live_figures():
+    from matplotlib.figure import Figure
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, Figure))
+
+
+class Command(BaseCommand):
+    help = "Stress the chart renderer and report memory after every batch of renders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--renders", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=4,
+            help="Concurrent callers, as under a threaded WSGI server.")
+        parser.add_argument("--processes", type=int, default=0,
+            help="Render in a process pool of this size (CHART_RENDER_PROCESSES).")
+        parser.add_argument("--report-every", type=int, default=250)
+
+    def handle(self, *args, **options):
+        summaries = [
+            ("dimensions", {f"Dimension {i}": 1 + (i * 7 % 5) for i in range(6)}),
+            ("areas", {f"Area {i}": 1 + (i * 3 % 4) for i in range(10)}),
+        ]
+
+        with override_settings(CHART_RENDER_PROCESSES=options["processes"]):
+            charts.render(*summaries[0])  # warm up fonts and the pool
+            gc.collect()
+            self.stdout.write(f"{'renders':>8} {'rss MB':>8} {'figures':>8} {'renders/s':>10}")
+            self.stdout.write(f"{0:>8} {rss_mb():>8.1f} {live_figures():>8}")
+
+            done = 0
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+                while done < options["renders"]:
+                    batch = min(options["report_every"], options["renders"] - done)
+                    list(executor.map(lambda i: charts.render(*summaries[i % 2]), range(batch)))
+                    done += batch
+                    gc.collect()
+                    rate = done / (time.perf_counter() - started)
+                    self.stdout.write(f"{done:>8} {rss_mb():>8.1f} {live_figures():>8} {rate:>10.1f}")
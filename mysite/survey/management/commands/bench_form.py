@@ -0,0 +1,82 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import Client, RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from survey import definitions, synthetic
+from survey.benchmarks import percentile, scratch_database
+from survey.models import Survey, Question
+
+
+class Command(BaseCommand):
+    help = ("Time rendering a large survey form with its question fields rendered on every request "
+            "and pre-rendered once per survey version.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--questions", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def measure(self, render, repeat):
+        render()
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples), percentile(samples, 95)
+
+    def report(self, label, timing):
+        self.stdout.write(f"{label:<34} median {timing[0]:7.2f} ms  p95 {timing[1]:7.2f} ms")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            User = get_user_model()
+            admin = User.objects.create_superuser("admin", "admin@example.com", "bench")
+            respondent = User.objects.create_user("respondent", "respondent@example.com", "bench")
+            survey = Survey.objects.create(name="Benchmark", description="Form benchmark", created_by=admin,
+                                           published=True)
+            field_types = [field_type for field_type, _ in Question.FIELD_TYPES]
+            Question.objects.bulk_create([
+                Question(
+                    survey=survey, label=f"{synthetic.AREAS[i % len(synthetic.AREAS)]}: statement {i + 1}",
+                    field_type=field_types[i % len(field_types)],
+                    options="" if field_types[i % len(field_types)] == Question.TEXTAREA else ",".join(synthetic.SCALE),
+                    dimension=synthetic.DIMENSIONS[i % len(synthetic.DIMENSIONS)], order=i)
+                for i in range(options["questions"])
+            ])
+
+            definition = definitions.get_definition(survey.slug)
+            request = RequestFactory().get(reverse("survey:survey-detail", kwargs={"slug": survey.slug}))
+            request.user = respondent
+
+            def every_request():
+                fields = render_to_string("survey/question_fields.html", {"questions": definition.questions})
+                return render_to_string("survey/survey_detail.html",
+                                        {"survey": survey, "question_fields": fields}, request)
+
+            def pre_rendered():
+                return render_to_string("survey/survey_detail.html",
+                                        {"survey": survey, "question_fields": definitions.question_fields(definition)},
+                                        request)
+
+            self.stdout.write(f"survey of {options['questions']} questions, {options['repeat']} renders each")
+            live = self.measure(every_request, options["repeat"])
+            cached = self.measure(pre_rendered, options["repeat"])
+            self.report("template, fields every request", live)
+            self.report("template, fields pre-rendered", cached)
+            self.stdout.write(f"{'saved per request':<34} median {live[0] - cached[0]:7.2f} ms")
+
+            # The whole view, with the definition and fields cached
+            setup_test_environment()
+            try:
+                client = Client()
+                client.force_login(respondent)
+                url = reverse("survey:survey-detail", kwargs={"slug": survey.slug})
+                self.report("survey_detail GET", self.measure(lambda: client.get(url), options["repeat"]))
+            finally:
+                teardown_test_environment()
@@ -0,0 +1,89 @@
+import random
+import string
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils.text import slugify
+
+from survey.benchmarks import scratch_database, timer
+from survey.models import Survey, generate_unique_slug
+
+
+def legacy_unique_slug(name):
+    """
+    The original generate_unique_slug: one lookup per attempt, retrying with a
+    random suffix until nothing matches.
+    """
+    origin_slug = slugify(name)
+    unique_slug = origin_slug
+    numb = 1
+    while Survey.objects.filter(slug=unique_slug).first():
+        rnd_string = ''.join(random.choices(string.ascii_lowercase, k=5))
+        unique_slug = f'{origin_slug}-{rnd_string}-{numb}'
+        numb += 1
+    return unique_slug
+
+
+def create_legacy(name, user):
+    Survey.objects.create(name=name, slug=legacy_unique_slug(name), created_by=user)
+
+
+def create_current(name, user):
+    Survey.objects.create(name=name, created_by=user)
+
+
+class Command(BaseCommand):
+    help = "Create thousands of same-named surveys from concurrent threads with the old and new slug allocation."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--surveys", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--name", default="Leadership Survey")
+
+    def run(self, create, user, name, surveys, threads):
+        def worker(count):
+            outcomes = Counter()
+            try:
+                for _ in range(count):
+                    try:
+                        create(name, user)
+                        outcomes["created"] += 1
+                    except IntegrityError:
+                        outcomes["duplicate slug"] += 1
+                    except OperationalError:
+                        outcomes["database locked"] += 1
+            finally:
+                connections.close_all()
+            return outcomes
+
+        shares = [surveys // threads + (i < surveys % threads) for i in range(threads)]
+        with timer() as elapsed:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                outcomes = sum(pool.map(worker, shares), Counter())
+        return outcomes, elapsed["seconds"]
+
+    def handle(self, *args, **options):
+        name = options["name"]
+        with scratch_database():
+            user = get_user_model().objects.create_user("bench", "bench@example.com", "bench")
+            for label, create in (("legacy", create_legacy), ("current", create_current)):
+                Survey.objects.all().delete()
+                outcomes, seconds = self.run(create, user, name, options["surveys"], options["threads"])
+                slugs = Survey.objects.values_list("slug", flat=True)
+                self.stdout.write(
+                    f"{label:>8}: {outcomes['created']} of {options['surveys']} surveys in {seconds:.2f}s "
+                    f"({outcomes['created'] / seconds:.0f}/s) with {options['threads']} threads, "
+                    f"{outcomes['duplicate slug']} duplicate-slug errors, "
+                    f"{outcomes['database locked']} lock timeouts, "
+                    f"{len(set(slugs))} distinct slugs")
+
+                # Queries spent finding one more slug with every copy in place
+                allocate = legacy_unique_slug if create is create_legacy else (
+                    lambda name: generate_unique_slug(Survey, name, None))
+                with CaptureQueriesContext(connection) as queries:
+                    allocate(name)
+                self.stdout.write(f"{'':>8}  next slug with {len(slugs)} copies: {len(queries)} queries")
@@ -0,0 +1,128 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+
+from survey import synthetic
+from survey.benchmarks import percentile, scratch_database
+from survey.models import Survey, Answer, UserAnswer
+from survey.rollups import summarize
+from survey.submissions import save_submission
+
+
+class Command(BaseCommand):
+    help = ("Hammer a scratch database with concurrent submissions and analysis reads, once with "
+            "SQLite's stock settings and once with the configured pragmas, and compare throughput "
+            "and lock errors.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--duration", type=float, default=15,
+            help="Seconds to run each configuration for.")
+        parser.add_argument("--questions", type=int, default=30)
+        parser.add_argument("--responses", type=int, default=2000,
+            help="Responses seeded before the run, so reads have something to scan.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", "-o", default="bench_sqlite.json")
+
+    def stress(self, survey, respondents, options):
+        questions = list(survey.questions.select_related("survey"))
+        deadline = time.monotonic() + options["duration"]
+        lock = threading.Lock()
+        outcomes = Counter()
+        write_ms = []
+        weights = [1] * len(synthetic.SCALE)
+
+        def writer(rng):
+            try:
+                while time.monotonic() < deadline:
+                    answers = [(question, value) for question in questions
+                               if (value := synthetic.random_answer(question, rng, weights))]
+                    started = time.perf_counter()
+                    try:
+                        save_submission(survey, rng.choice(respondents), answers)
+                        result = "writes"
+                    except OperationalError:
+                        result = "write errors"
+                    with lock:
+                        outcomes[result] += 1
+                        if result == "writes":
+                            write_ms.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+
+        def reader(rng):
+            try:
+                while time.monotonic() < deadline:
+                    # The per-respondent analysis: a scan of the survey's answers
+                    user_answers = UserAnswer.objects.filter(survey=survey, user=rng.choice(respondents))
+                    try:
+                        summarize(Answer.objects.filter(user_answer__in=user_answers))
+                        user_answers.count()
+                        result = "reads"
+                    except OperationalError:
+                        result = "read errors"
+                    with lock:
+                        outcomes[result] += 1
+            finally:
+                connections.close_all()
+
+        master = random.Random(options["seed"])
+        threads = [threading.Thread(target=writer, args=(random.Random(master.random()),))
+                   for _ in range(options["writers"])]
+        threads += [threading.Thread(target=reader, args=(random.Random(master.random()),))
+                    for _ in range(options["readers"])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        return {
+            "seconds": elapsed,
+            "writes": outcomes["writes"],
+            "write_errors": outcomes["write errors"],
+            "reads": outcomes["reads"],
+            "read_errors": outcomes["read errors"],
+            "writes_per_second": outcomes["writes"] / elapsed,
+            "reads_per_second": outcomes["reads"] / elapsed,
+            "write_p50_ms": percentile(write_ms, 50) if write_ms else None,
+            "write_p95_ms": percentile(write_ms, 95) if write_ms else None,
+        }
+
+    def handle(self, *args, **options):
+        configurations = {
+            "stock": {},
+            "configured": connection.settings_dict["OPTIONS"],
+        }
+        report = {"writers": options["writers"], "readers": options["readers"], "runs": {}}
+        for label, database_options in configurations.items():
+            with scratch_database(options=database_options):
+                admin = synthetic.generate(
+                    users=50, surveys=1, questions=options["questions"], responses=options["responses"],
+                    restricted=0, seed=options["seed"])
+                survey = Survey.objects.get(created_by=admin)
+                respondents = list(get_user_model().objects.filter(username__startswith=f"{synthetic.PREFIX}-user-"))
+                journal_mode = connection.cursor().execute("PRAGMA journal_mode").fetchone()[0]
+                connection.close()
+                result = self.stress(survey, respondents, options)
+
+            result["options"] = database_options
+            result["journal_mode"] = journal_mode
+            report["runs"][label] = result
+            self.stdout.write(
+                f"{label:>10} ({journal_mode}): {result['writes_per_second']:6.1f} writes/s "
+                f"{result['reads_per_second']:6.1f} reads/s, {result['write_errors']} write and "
+                f"{result['read_errors']} read lock errors, write p50 {result['write_p50_ms'] or 0:.1f} ms "
+                f"p95 {result['write_p95_ms'] or 0:.1f} ms")
+
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(f"Report written to {options['output']}")
@@ -0,0 +1,77 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Run in a fresh interpreter so every sample is a cold start
+PROBE = """
+import json, os, sys, time
+started = time.perf_counter()
+import django
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", %(settings)r)
+django.setup()
+if %(eager)r:
+    import survey.charts
+from django.urls import resolve
+for path in %(paths)r:
+    resolve(path)
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "heavy": sorted(name for name in %(heavy)r if name in sys.modules),
+}))
+"""
+
+HEAVY_MODULES = ["matplotlib", "numpy"]
+
+PATHS = ["/survey/", "/survey/some-survey/", "/survey/some-survey/analysis/", "/survey/results/"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time a cold django.setup() plus URL resolution in fresh interpreters, "
+        "and fail if it pulls in matplotlib or numpy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=7)
+        parser.add_argument("--budget-ms", type=float, default=None,
+            help="Fail if the median startup time exceeds this many milliseconds.")
+        parser.add_argument("--compare-eager", action="store_true",
+            help="Also time a start that imports the chart module eagerly, as survey.views used to.")
+
+    def sample(self, eager):
+        code = PROBE % {
+            "settings": os.environ.get("DJANGO_SETTINGS_MODULE", "mysite.settings"),
+            "eager": eager,
+            "paths": PATHS,
+            "heavy": HEAVY_MODULES,
+        }
+        results = []
+        for _ in range(self.runs):
+            output = subprocess.run(
+                [sys.executable, "-c", code],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.splitlines()[-1]))
+        median_ms = statistics.median(result["seconds"] for result in results) * 1000
+        return median_ms, results[-1]["heavy"]
+
+    def handle(self, *args, **options):
+        self.runs = options["runs"]
+
+        median_ms, heavy = self.sample(eager=False)
+        self.stdout.write(f"lazy:  median {median_ms:.1f} ms over {self.runs} runs, heavy modules: {heavy or 'none'}")
+
+        if options["compare_eager"]:
+            eager_ms, _ = self.sample(eager=True)
+            self.stdout.write(f"eager: median {eager_ms:.1f} ms over {self.runs} runs")
+            self.stdout.write(f"saved: {eager_ms - median_ms:.1f} ms per worker start")
+
+        if heavy:
+            raise CommandError(f"Loading the URLconf imported {', '.join(heavy)}")
+        if options["budget_ms"] is not None and median_ms > options["budget_ms"]:
+            raise CommandError(f"Startup took {median_ms:.1f} ms, over the {options['budget_ms']:.1f} ms budget")
@@ -0,0 +1,72 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from survey.benchmarks import scratch_database, timer
+from survey.models import Survey, Question, UserAnswer, Answer, ScoreRollup
+from survey.rollups import score_totals
+from survey.signals import submissions_saved
+from survey.submissions import encode_answer, save_submission
+
+
+def legacy_submission(survey, user, answers):
+    """
+    The original survey_detail write path: one autocommitted INSERT per
+    answer and no surrounding transaction. It stores the same rows as
+    save_submission, keeps the rollups with one read and one UPDATE per
+    dimension and area, and invalidates the same caches, so both paths do
+    the same work.
+    """
+    user_answer = UserAnswer.objects.create(user=user, survey=survey)
+    submitted = []
+    for question, value in answers:
+        answer = encode_answer(question, value, user_answer)
+        answer.save()
+        submitted.append(answer)
+
+    totals = score_totals(submitted)
+    for (kind, key), (total, count) in totals.items():
+        rollup, _ = ScoreRollup.objects.get_or_create(survey=survey, kind=kind, key=key)
+        ScoreRollup.objects.filter(pk=rollup.pk).update(total=F("total") + total, count=F("count") + count)
+    submissions_saved.send(
+        sender=UserAnswer, survey_ids=[survey.id], responses=Counter([survey.id]), totals={survey.id: totals})
+    return user_answer
+
+
+class Command(BaseCommand):
+    help = "Compare submissions per second of the per-answer and the atomic bulk write paths."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--questions", type=int, default=60)
+        parser.add_argument("--submissions", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            user = get_user_model().objects.create_user("bench", "bench@example.com", "bench")
+            stored = []
+            for name, submit in (("per-answer", legacy_submission), ("atomic bulk", save_submission)):
+                # Each path writes to a survey of its own, compared below
+                survey = Survey.objects.create(name=f"Benchmark {name}", created_by=user)
+                questions = Question.objects.bulk_create([
+                    Question(
+                        survey=survey, label=f"Question {i}", field_type=Question.RADIO,
+                        options="1,2,3,4,5", dimension=f"Dimension {i % 6}", area=f"Area {i % 10}", order=i)
+                    for i in range(options["questions"])
+                ])
+                answers = [(question, str(1 + i % 5)) for i, question in enumerate(questions)]
+
+                with timer() as elapsed:
+                    for _ in range(options["submissions"]):
+                        submit(survey, user, answers)
+                rate = options["submissions"] / elapsed["seconds"]
+                self.stdout.write(
+                    f"{name:>12}: {options['submissions']} submissions of {options['questions']} answers "
+                    f"in {elapsed['seconds']:.2f}s ({rate:.1f} submissions/s)")
+                stored.append((
+                    Answer.objects.filter(question__survey=survey).count(),
+                    sorted(ScoreRollup.objects.filter(survey=survey).values_list("kind", "key", "total", "count"))))
+
+            if stored[0] != stored[1]:
+                raise CommandError("The two paths stored different answers or rollups.")
@@ -0,0 +1,123 @@
+import json
+import statistics
+import tempfile
+import time
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from survey import synthetic
+from survey.benchmarks import percentile, scratch_database, timer
+from survey.models import Survey
+
+
+def view_cases(admin, respondent, survey):
+    """
+    Return [(label, client user, method, url, POST data)] for the key views.
+    """
+    detail = reverse("survey:survey-detail", kwargs={"slug": survey.slug})
+    analysis = reverse("survey:survey-analysis", kwargs={"slug": survey.slug})
+    answers = {}
+    for question in survey.questions.all():
+        if question.field_type == question.TEXTAREA:
+            answers[f"question_{question.pk}"] = "Benchmark comment."
+        else:
+            answers[f"question_{question.pk}"] = question.split_choices[0]
+    return [
+        ("survey list (admin)", admin, "get", reverse("survey:survey"), None),
+        ("survey list (respondent)", respondent, "get", reverse("survey:survey"), None),
+        ("survey_detail GET", respondent, "get", detail, None),
+        ("survey_detail POST", respondent, "post", detail, answers),
+        ("survey_analysis (admin)", admin, "get", analysis, None),
+        ("survey_analysis (respondent)", respondent, "get", analysis, None),
+        ("results_page (admin)", admin, "get", reverse("survey:results-page"), None),
+        ("results_page (respondent)", respondent, "get", reverse("survey:results-page"), None),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Time the key views with the test client at several data scales and write a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", type=int, nargs="+", default=[1, 4, 10],
+            help="Each scale seeds 50 x scale users and max(2, scale) surveys of 100 x scale responses.")
+        parser.add_argument("--questions", type=int, default=30)
+        parser.add_argument("--repeat", type=int, default=20,
+            help="Timed requests per view and scale.")
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", "-o", default="bench_views.json")
+
+    def time_view(self, client, user, method, url, data, repeat, warmup):
+        client.force_login(user)
+        samples, queries, db_seconds = [], [], []
+        for run in range(warmup + repeat):
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data) if method == "post" else client.get(url)
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise RuntimeError(f"{method.upper()} {url} returned {response.status_code}")
+            if run >= warmup:
+                samples.append(elapsed * 1000)
+                queries.append(response.query_stats.count)
+                db_seconds.append(response.query_stats.db_seconds)
+        return {
+            "status": response.status_code,
+            "min_ms": min(samples),
+            "median_ms": statistics.median(samples),
+            "p95_ms": percentile(samples, 95),
+            "mean_ms": statistics.fmean(samples),
+            "queries": max(queries),
+            "db_ms": statistics.fmean(db_seconds) * 1000,
+        }
+
+    def run_scale(self, scale, options):
+        sizes = {
+            "users": 50 * scale,
+            "surveys": max(2, scale),
+            "questions": options["questions"],
+            "responses": 100 * scale,
+        }
+        with scratch_database():
+            with timer() as seeding:
+                admin = synthetic.generate(restricted=0, seed=options["seed"], **sizes)
+            respondent = get_user_model().objects.filter(username__startswith="synthetic-user-").first()
+            survey = Survey.objects.filter(created_by=admin).order_by("id").first()
+            self.stdout.write(f"scale {scale}: {sizes} seeded in {seeding['seconds']:.1f}s")
+
+            client = Client()
+            views = {}
+            for label, user, method, url, data in view_cases(admin, respondent, survey):
+                result = self.time_view(client, user, method, url, data, options["repeat"], options["warmup"])
+                views[label] = result
+                self.stdout.write(
+                    f"  {label:<30} median {result['median_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms  "
+                    f"{result['queries']:3d} queries  {result['db_ms']:6.1f} ms in db")
+        return {"scale": scale, **sizes, "seed_seconds": seeding["seconds"], "views": views}
+
+    def handle(self, *args, **options):
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "repeat": options["repeat"],
+            "scales": [],
+        }
+        # The test environment allows the test client's host and keeps emails in memory
+        setup_test_environment()
+        try:
+            with tempfile.TemporaryDirectory() as media, override_settings(CHART_CACHE_DIR=media):
+                for scale in options["scales"]:
+                    report["scales"].append(self.run_scale(scale, options))
+        finally:
+            teardown_test_environment()
+
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(f"Report written to {options['output']}")
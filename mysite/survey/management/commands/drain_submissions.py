@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from survey.submissions import drain_pending, queue_status
+
+
+class Command(BaseCommand):
+    help = "Write queued survey submissions to UserAnswer/Answer in batched transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500,
+            help="Submissions written per transaction.")
+        parser.add_argument("--loop", action="store_true",
+            help="Keep draining, polling an empty queue every --interval seconds.")
+        parser.add_argument("--interval", type=float, default=1.0)
+        parser.add_argument("--status", action="store_true",
+            help="Only print the queue depth and lag.")
+
+    def print_status(self):
+        status = queue_status()
+        self.stdout.write(f"depth: {status['depth']}  lag: {status['lag_seconds']:.1f}s")
+
+    def handle(self, *args, **options):
+        if options["status"]:
+            self.print_status()
+            return
+
+        while True:
+            drained = drain_pending(options["batch_size"])
+            if drained:
+                self.stdout.write(f"Wrote {drained} submissions")
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.print_status()
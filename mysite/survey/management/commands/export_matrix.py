@@ -0,0 +1,32 @@
+import shutil
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mysite.routers import reading_from_replica
+from survey import exports
+from survey.models import Survey
+
+
+class Command(BaseCommand):
+    help = "Build a survey's respondent x question score matrix as a compressed .npz file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("slug")
+        parser.add_argument("--output", "-o",
+            help="Copy the export here. Otherwise only the cached file's path is printed.")
+
+    def handle(self, *args, **options):
+        with reading_from_replica():
+            self.export(options)
+
+    def export(self, options):
+        try:
+            survey = Survey.objects.get(slug=options["slug"])
+        except Survey.DoesNotExist:
+            raise CommandError(f"Unknown survey: {options['slug']}")
+
+        path = exports.response_matrix_path(survey)
+        if options["output"]:
+            shutil.copyfile(path, options["output"])
+            path = options["output"]
+        self.stdout.write(str(path))
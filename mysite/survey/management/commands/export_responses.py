@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mysite.routers import reading_from_replica
+from survey import exports
+from survey.models import Survey
+
+
+class Command(BaseCommand):
+    help = "Stream a survey's responses as CSV or NDJSON, one row per response and one column per question."
+
+    def add_arguments(self, parser):
+        parser.add_argument("slug")
+        parser.add_argument("--format", choices=sorted(exports.FORMATS), default="csv")
+        parser.add_argument("--since",
+            help="Only export responses stored after this ISO 8601 date or datetime.")
+        parser.add_argument("--after", type=int,
+            help="Only export responses with a response_id above this one. Use the last id of "
+                 "the previous export for incremental pulls.")
+        parser.add_argument("--output", "-o",
+            help="File to write to. Defaults to standard output.")
+
+    def handle(self, *args, **options):
+        with reading_from_replica():
+            self.export(options)
+
+    def export(self, options):
+        try:
+            survey = Survey.objects.get(slug=options["slug"])
+        except Survey.DoesNotExist:
+            raise CommandError(f"Unknown survey: {options['slug']}")
+
+        since = None
+        if options["since"]:
+            since = exports.parse_since(options["since"])
+            if since is None:
+                raise CommandError(f"Invalid --since value: {options['since']}")
+        if options["after"] is not None and options["after"] < 0:
+            raise CommandError(f"Invalid --after value: {options['after']}")
+
+        output = open(options["output"], "w", newline="") if options["output"] else sys.stdout
+        try:
+            for line in exports.export_lines(survey, options["format"], since, options["after"]):
+                output.write(line)
+        finally:
+            if options["output"]:
+                output.close()
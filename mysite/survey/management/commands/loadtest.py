@@ -0,0 +1,101 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from survey import loadtest, synthetic
+from survey.benchmarks import scratch_database
+from survey.models import Survey
+
+
+def parse_mix(value):
+    """
+    Parse "browse=5,submit=2,analysis=3" into {scenario: weight}.
+    """
+    mix = {}
+    for part in value.split(","):
+        scenario, _, weight = part.partition("=")
+        if scenario.strip() not in loadtest.SCENARIOS:
+            raise CommandError(f"Unknown scenario '{scenario}', expected one of {', '.join(loadtest.SCENARIOS)}")
+        try:
+            mix[scenario.strip()] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Invalid weight in --mix: {part}")
+    return mix
+
+
+class Command(BaseCommand):
+    help = ("Replay a mix of browse, submit and analysis traffic from concurrent virtual users against "
+            "mysite.wsgi served locally, and report latency percentiles, throughput and errors per URL name.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=8,
+            help="Concurrent virtual users, each with its own session.")
+        parser.add_argument("--admins", type=int, default=1,
+            help="How many of the virtual users log in as the survey admin.")
+        parser.add_argument("--duration", type=float, default=30,
+            help="Seconds to run for.")
+        parser.add_argument("--iterations", type=int,
+            help="Stop each virtual user after this many scenarios instead.")
+        parser.add_argument("--mix", type=parse_mix, default=parse_mix("browse=5,submit=2,analysis=3"))
+        parser.add_argument("--scale", type=int, default=1,
+            help="Seed 50 x scale users and max(2, scale) surveys of 100 x scale responses.")
+        parser.add_argument("--questions", type=int, default=30)
+        parser.add_argument("--url",
+            help="Load an already running server instead of a scratch one. Its database must hold "
+                 "data from seed_data with the default prefix and password.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", "-o", default="bench_loadtest.json")
+
+    def accounts(self, options):
+        admin = (f"{synthetic.PREFIX}-admin", synthetic.PASSWORD)
+        respondents = [(f"{synthetic.PREFIX}-user-{i}", synthetic.PASSWORD)
+                       for i in range(options["users"] - min(options["admins"], options["users"]))]
+        return [admin] * min(options["admins"], options["users"]) + respondents
+
+    def run(self, base_url, surveys, options):
+        self.stdout.write(f"{options['users']} virtual users against {base_url} for "
+                          f"{options['iterations'] or 'unlimited'} scenarios / {options['duration']:.0f}s")
+        return loadtest.run_load(
+            base_url, self.accounts(options), surveys, options["mix"],
+            options["duration"], options["iterations"], options["seed"])
+
+    def handle(self, *args, **options):
+        if options["url"]:
+            surveys = list(Survey.objects.filter(created_by__username=f"{synthetic.PREFIX}-admin")
+                           .values_list("slug", flat=True))
+            if not surveys:
+                raise CommandError("No seeded surveys found; run seed_data first.")
+            report = self.run(options["url"].rstrip("/"), surveys, options)
+        else:
+            scale = options["scale"]
+            with scratch_database(), tempfile.TemporaryDirectory() as media, override_settings(
+                    ALLOWED_HOSTS=["127.0.0.1", "localhost"], CHART_CACHE_DIR=media, EXPORT_CACHE_DIR=media,
+                    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"):
+                admin = synthetic.generate(
+                    users=max(options["users"], 50 * scale), surveys=max(2, scale),
+                    questions=options["questions"], responses=100 * scale, restricted=0, seed=options["seed"])
+                surveys = list(Survey.objects.filter(created_by=admin).values_list("slug", flat=True))
+                server, base_url = loadtest.start_server()
+                try:
+                    report = self.run(base_url, surveys, options)
+                finally:
+                    server.shutdown()
+                    server.server_close()
+
+        self.stdout.write(f"{'url name':<34} {'requests':>8} {'errors':>7} {'req/s':>7} "
+                          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for url_name, stats in list(report["views"].items()) + [("total", report["total"])]:
+            self.stdout.write(
+                f"{url_name:<34} {stats['requests']:>8} {stats['errors']:>7} {stats['throughput_per_second']:>7.1f} "
+                f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+        for url_name, stats in report["views"].items():
+            if "example_error" in stats:
+                self.stdout.write(f"  {url_name}: {stats['example_error']}")
+        for failure in report["failed_users"]:
+            self.stderr.write(f"Virtual user stopped: {failure}")
+
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(f"Report written to {options['output']}")
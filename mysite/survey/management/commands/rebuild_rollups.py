@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from survey.models import Survey
+from survey.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the dimension/area score rollups from the stored answers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "slugs", nargs="*",
+            help="Slugs of the surveys to rebuild. Rebuilds every survey when omitted.")
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.all()
+        if options["slugs"]:
+            surveys = surveys.filter(slug__in=options["slugs"])
+            missing = set(options["slugs"]) - set(surveys.values_list("slug", flat=True))
+            if missing:
+                raise CommandError(f"Unknown survey(s): {', '.join(sorted(missing))}")
+
+        for survey in surveys:
+            rebuild_rollups(survey)
+            self.stdout.write(f"Rebuilt rollups for {survey.slug}")
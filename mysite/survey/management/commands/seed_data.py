@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from survey import synthetic
+from survey.benchmarks import timer
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users, surveys and responses with bulk inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--surveys", type=int, default=5)
+        parser.add_argument("--questions", type=int, default=20,
+            help="Questions per survey, cycling through every field type.")
+        parser.add_argument("--responses", type=int, default=200,
+            help="Responses per survey.")
+        parser.add_argument("--restricted", type=float, default=0.2,
+            help="Share of the surveys limited to invited users.")
+        parser.add_argument("--days", type=int, default=90,
+            help="Spread the responses over this many past days.")
+        parser.add_argument("--prefix", default=synthetic.PREFIX,
+            help="Prefix of the generated usernames and survey slugs.")
+        parser.add_argument("--seed", type=int, help="Random seed, for reproducible data.")
+        parser.add_argument("--flush", action="store_true",
+            help="First delete the data previously generated with this prefix.")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if options["flush"]:
+            deleted, _ = synthetic.flush(prefix)
+            self.stdout.write(f"Deleted {deleted} objects")
+        elif get_user_model().objects.filter(username__startswith=f"{prefix}-").exists():
+            raise CommandError(f"Data with prefix '{prefix}' already exists; use --flush or another --prefix.")
+
+        with timer() as elapsed, transaction.atomic():
+            admin = synthetic.generate(
+                users=options["users"], surveys=options["surveys"], questions=options["questions"],
+                responses=options["responses"], prefix=prefix, restricted=options["restricted"],
+                days=options["days"], seed=options["seed"])
+
+        answers = options["surveys"] * options["responses"] * options["questions"]
+        self.stdout.write(
+            f"Created {options['users']} users, {options['surveys']} surveys of {options['questions']} questions "
+            f"and {options['surveys'] * options['responses']} responses (up to {answers} answers) "
+            f"in {elapsed['seconds']:.1f}s. Log in as {admin.username} / {synthetic.PASSWORD}.")
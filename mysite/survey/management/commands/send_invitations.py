@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from survey import mailing
+from survey.models import Survey, SurveyInvitation
+
+
+class Command(BaseCommand):
+    help = "Send queued survey invitation emails, one message per recipient over a single connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument("slugs", nargs="*",
+            help="Surveys to send. Defaults to every survey with invitations.")
+        parser.add_argument("--queue", action="store_true",
+            help="First queue the surveys' unsent and failed invitations.")
+        parser.add_argument("--requeue-stuck", action="store_true",
+            help="Queue again invitations left in 'sending' by an interrupted dispatch.")
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument("--rate", type=float,
+            help="Maximum messages per second, 0 for no limit.")
+        parser.add_argument("--status", action="store_true",
+            help="Only print the invitation counts per status.")
+
+    def handle(self, *args, **options):
+        surveys = Survey.objects.filter(invitations__isnull=False).distinct()
+        if options["slugs"]:
+            surveys = Survey.objects.filter(slug__in=options["slugs"])
+            missing = set(options["slugs"]) - set(surveys.values_list("slug", flat=True))
+            if missing:
+                raise CommandError(f"Unknown survey(s): {', '.join(sorted(missing))}")
+
+        if options["status"]:
+            for survey in surveys:
+                counts = mailing.invitation_status(survey)
+                self.stdout.write(f"{survey.slug}: " + "  ".join(f"{status}: {count}" for status, count in counts.items()))
+            return
+
+        if options["requeue_stuck"]:
+            stuck = SurveyInvitation.objects.filter(status=SurveyInvitation.SENDING, survey__in=surveys)
+            self.stdout.write(f"Requeued {stuck.update(status=SurveyInvitation.QUEUED)} stuck invitations")
+
+        if options["queue"]:
+            for survey in surveys:
+                mailing.queue_invitations(survey)
+
+        sent = failed = 0
+        for survey in surveys:
+            survey_sent, survey_failed = mailing.dispatch_queued(
+                survey, batch_size=options["batch_size"], rate=options["rate"])
+            sent += survey_sent
+            failed += survey_failed
+        self.stdout.write(f"Sent {sent} invitations, {failed} failed")
@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mysite.routers import sync_replica
+from survey.benchmarks import timer
+
+
+class Command(BaseCommand):
+    help = ("Copy the primary database into the read replica (REPLICA_DATABASE), once or every "
+            "--interval seconds, standing in for replication.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float,
+            help="Keep syncing, this many seconds apart.")
+
+    def handle(self, *args, **options):
+        alias = settings.REPLICA_DATABASE
+        if not alias:
+            raise CommandError("No replica configured; set SURVEY_REPLICA_NAME.")
+
+        while True:
+            with timer() as elapsed:
+                sync_replica(alias)
+            self.stdout.write(f"Synced {alias} in {elapsed['seconds'] * 1000:.0f} ms")
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,131 @@
+"""
+Per-view query budgets.
+
+QueryBudgetMiddleware counts the SQL queries each request runs and the time
+spent in them, across every configured database, and attributes them to the
+request's resolved URL name ("survey:results-page"). Requests that run more
+queries than the view's budget (QUERY_BUDGETS, falling back to
+QUERY_BUDGET_DEFAULT) are logged to the "survey.queries" logger.
+
+The numbers of a request are attached to its response as
+``response.query_stats``, and running totals per URL name are kept in
+``QUERY_STATS`` for tests and benchmarks.
+
+The middleware runs in both sync and async mode, so async views served over
+ASGI aren't pushed back through a thread by it.
+"""
+import logging
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse
+
+
+logger = logging.getLogger("survey.queries")
+
+# url name -> {"requests", "queries", "db_seconds", "max_queries"}
+QUERY_STATS = defaultdict(lambda: {"requests": 0, "queries": 0, "db_seconds": 0.0, "max_queries": 0})
+
+
+def query_budget(url_name):
+    budgets = getattr(settings, "QUERY_BUDGETS", {})
+    return budgets.get(url_name, getattr(settings, "QUERY_BUDGET_DEFAULT", None))
+
+
+def reset_query_stats():
+    QUERY_STATS.clear()
+
+
+class QueryCounter:
+    """
+    Database execute wrapper that counts queries and their cumulative time.
+    """
+    def __init__(self):
+        self.count = 0
+        self.db_seconds = 0.0
+        self.url_name = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.db_seconds += time.perf_counter() - started
+
+    def counting(self):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    def as_dict(self):
+        return {"url_name": self.url_name, "queries": self.count, "db_seconds": self.db_seconds}
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        with counter.counting():
+            response = self.get_response(request)
+        return self.finish(request, response, counter)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        # Connections are per thread, and an async request's queries run in its
+        # sync_to_async thread rather than in the event loop's
+        counting = await sync_to_async(counter.counting)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(counting.close)()
+        return self.finish(request, response, counter)
+
+    def finish(self, request, response, counter):
+        match = request.resolver_match
+        counter.url_name = match.view_name if match else None
+        response.query_stats = counter
+
+        if response.streaming and not response.is_async and not isinstance(response, FileResponse):
+            # Streamed rows are read while the response is sent, after this returns
+            response.streaming_content = self.count_streaming(response.streaming_content, counter, request)
+        else:
+            self.record(counter, request)
+        return response
+
+    def count_streaming(self, content, counter, request):
+        try:
+            with counter.counting():
+                yield from content
+        finally:
+            self.record(counter, request)
+
+    def record(self, counter, request):
+        if counter.url_name is None:
+            return
+        stats = QUERY_STATS[counter.url_name]
+        stats["requests"] += 1
+        stats["queries"] += counter.count
+        stats["db_seconds"] += counter.db_seconds
+        stats["max_queries"] = max(stats["max_queries"], counter.count)
+
+        budget = query_budget(counter.url_name)
+        if budget is not None and counter.count > budget:
+            logger.warning(
+                "%s %s (%s) ran %d queries, over its budget of %d (%.1f ms in the database)",
+                request.method, request.path, counter.url_name, counter.count, budget,
+                counter.db_seconds * 1000)
@@ -0,0 +1,101 @@
+# Generated by Django 4.2 on 2026-10-18 08:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_rollups(apps, schema_editor):
+    Answer = apps.get_model("survey", "Answer")
+    ScoreRollup = apps.get_model("survey", "ScoreRollup")
+
+    totals = {}
+    for answer in Answer.objects.select_related("question").iterator():
+        question = answer.question
+        choices = [choice.strip() for choice in question.options.split(",")] if question.options else []
+        value = answer.value.strip()
+        if value not in choices:
+            continue
+        score = choices.index(value) + 1
+        for kind, key in (("dimension", question.dimension), ("area", question.area)):
+            if key:
+                total = totals.setdefault((question.survey_id, kind, key), [0, 0])
+                total[0] += score
+                total[1] += 1
+
+    ScoreRollup.objects.bulk_create([
+        ScoreRollup(survey_id=survey_id, kind=kind, key=key, total=total, count=count)
+        for (survey_id, kind, key), (total, count) in totals.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey", "0006_survey_password_survey_recipient_emails"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScoreRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("dimension", "Dimension"), ("area", "Area")],
+                        help_text="Whether the rollup groups by dimension or by area.",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        help_text="The dimension or area name.", max_length=200
+                    ),
+                ),
+                (
+                    "total",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="Running sum of the scores given in this dimension/area.",
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Number of scored answers in this dimension/area.",
+                    ),
+                ),
+                (
+                    "survey",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="score_rollups",
+                        to="survey.survey",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Score Rollup",
+                "verbose_name_plural": "Score Rollups",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="scorerollup",
+            constraint=models.UniqueConstraint(
+                fields=("survey", "kind", "key"), name="unique_score_rollup"
+            ),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey", "0007_scorerollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="answer",
+            name="score",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                help_text="1-based position of the value among the question's choices, if it is one of them.",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def backfill_scores(apps, schema_editor):
+    Question = apps.get_model("survey", "Question")
+    Answer = apps.get_model("survey", "Answer")
+
+    # One UPDATE per choice instead of loading every answer row
+    for question in Question.objects.exclude(options="").only("id", "options"):
+        choices = [choice.strip() for choice in question.options.split(",")]
+        for position, choice in enumerate(choices, start=1):
+            Answer.objects.filter(question=question, value=choice, score__isnull=True).update(score=position)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey", "0008_answer_score"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2 on 2026-10-18 08:52
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+RADIO, SELECT, MULTI_SELECT = 1, 2, 3
+
+
+def encode_choice_answers(apps, schema_editor):
+    Question = apps.get_model("survey", "Question")
+    Answer = apps.get_model("survey", "Answer")
+
+    # Radio/Select: the backfilled score already is the ordinal, only the text goes
+    Answer.objects.filter(
+        question__field_type__in=[RADIO, SELECT], choice__isnull=False).update(value="")
+    Answer.objects.exclude(question__field_type__in=[RADIO, SELECT]).update(choice=None)
+
+    # Multi-Select: one UPDATE per distinct stored value
+    for question in Question.objects.filter(field_type=MULTI_SELECT).exclude(options="").only("id", "options"):
+        choices = [choice.strip() for choice in question.options.split(",")]
+        answers = Answer.objects.filter(question=question)
+        for value in list(answers.values_list("value", flat=True).distinct()):
+            parts = [part.strip() for part in value.split(",")]
+            if not all(part in choices for part in parts):
+                continue
+            mask = 0
+            for part in parts:
+                mask |= 1 << choices.index(part)
+            answers.filter(value=value).update(choice=mask, value="")
+
+    # Multi-Select answers are no longer scored, so rebuild the rollups
+    ScoreRollup = apps.get_model("survey", "ScoreRollup")
+    ScoreRollup.objects.all().delete()
+    scored = Answer.objects.filter(question__field_type__in=[RADIO, SELECT], choice__isnull=False)
+    for kind, field in (("dimension", "question__dimension"), ("area", "question__area")):
+        rows = (scored.exclude(**{field: ""})
+                .values("question__survey", field)
+                .annotate(total=Sum("choice"), count=Count("id"))
+                .order_by())
+        ScoreRollup.objects.bulk_create([
+            ScoreRollup(survey_id=row["question__survey"], kind=kind, key=row[field],
+                        total=row["total"], count=row["count"])
+            for row in rows
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey", "0010_pendingsubmission"),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name="answer",
+            old_name="score",
+            new_name="choice",
+        ),
+        migrations.AlterField(
+            model_name="answer",
+            name="choice",
+            field=models.PositiveBigIntegerField(
+                blank=True,
+                help_text="1-based option ordinal for 'Radio'/'Select', bitmask of the ticked options for 'Multi-Select'.",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="answer",
+            name="value",
+            field=models.TextField(
+                blank=True,
+                help_text="The free text provided by the user. Empty when the answer is stored in 'choice'.",
+            ),
+        ),
+        migrations.RunPython(encode_choice_answers, migrations.RunPython.noop),
+    ]
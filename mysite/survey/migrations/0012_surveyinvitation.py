@@ -0,0 +1,83 @@
+# Generated by Django 4.2 on 2026-10-18 08:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_recipient_emails(apps, schema_editor):
+    Survey = apps.get_model("survey", "Survey")
+    SurveyInvitation = apps.get_model("survey", "SurveyInvitation")
+
+    for survey in Survey.objects.exclude(recipient_emails="").only("id", "recipient_emails").iterator():
+        emails = dict.fromkeys(
+            email.strip().lower() for email in survey.recipient_emails.split(",") if email.strip())
+        SurveyInvitation.objects.bulk_create(
+            [SurveyInvitation(survey_id=survey.id, email=email) for email in emails],
+            batch_size=1000)
+
+
+def restore_recipient_emails(apps, schema_editor):
+    Survey = apps.get_model("survey", "Survey")
+    SurveyInvitation = apps.get_model("survey", "SurveyInvitation")
+
+    for survey in Survey.objects.filter(invitations__isnull=False).distinct():
+        survey.recipient_emails = ",".join(
+            SurveyInvitation.objects.filter(survey=survey).order_by("id").values_list("email", flat=True))
+        survey.save(update_fields=["recipient_emails"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey", "0011_answer_choice"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SurveyInvitation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "email",
+                    models.EmailField(
+                        db_index=True,
+                        help_text="Lowercased email address allowed to access the survey.",
+                        max_length=254,
+                    ),
+                ),
+                (
+                    "survey",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="invitations",
+                        to="survey.survey",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Survey Invitation",
+                "verbose_name_plural": "Survey Invitations",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="surveyinvitation",
+            constraint=models.UniqueConstraint(
+                fields=("survey", "email"), name="unique_survey_invitation"
+            ),
+        ),
+        migrations.RunPython(copy_recipient_emails, restore_recipient_emails),
+        migrations.RemoveField(
+            model_name="survey",
+            name="recipient_emails",
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey", "0012_surveyinvitation"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="useranswer",
+            index=models.Index(
+                fields=["created_at", "id"], name="useranswer_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="useranswer",
+            index=models.Index(
+                fields=["survey", "created_at", "id"],
+                name="useranswer_survey_created_idx",
+            ),
+        ),
+    ]
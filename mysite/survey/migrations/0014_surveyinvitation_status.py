@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey", "0013_useranswer_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="surveyinvitation",
+            name="last_error",
+            field=models.TextField(
+                blank=True, help_text="Error of the last failed delivery attempt."
+            ),
+        ),
+        migrations.AddField(
+            model_name="surveyinvitation",
+            name="sent_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the invitation email was accepted by the mail server.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="surveyinvitation",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("queued", "Queued"),
+                    ("sending", "Sending"),
+                    ("sent", "Sent"),
+                    ("failed", "Failed"),
+                ],
+                db_index=True,
+                default="pending",
+                help_text="Delivery state of the invitation email.",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-18 11:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def copy_created_at(apps, schema_editor):
+    UserAnswer = apps.get_model("survey", "UserAnswer")
+    # Until now queued responses were backdated, so created_at held the submission time
+    UserAnswer.objects.update(submitted_at=models.F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("survey", "0014_surveyinvitation_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="useranswer",
+            name="submitted_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="useranswer",
+            name="submitted_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                help_text="When the answers were submitted. Queued submissions are stored (created_at) later.",
+            ),
+        ),
+    ]
@@ -1,30 +1,61 @@
 import random
-import string
-from django.db import models
+import re
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db.models.functions import Length
+from django.utils import timezone
 from django.utils.text import slugify
-from django.core.mail import send_mail
 
 
 # Utility function for generating unique slugs
-def generate_unique_slug(klass, field, id, identifier='slug'):
+def generate_unique_slug(klass, field, id, identifier='slug', spread=1, source='name'):
     """
-    Generate a unique slug for the given model class.
+    Generate a unique slug for the given model class: the slugified field, or
+    if that is taken, the slug with a numeric suffix past the highest one in
+    use ("name-2", "name-3", ...). The highest copy is found with a single
+    query however many there are. Slugs that are simply their row's slugified
+    ``source`` field ("Leadership 2024" -> "leadership-2024") end in a number
+    but aren't copies, and are only stepped over. A spread above 1 picks the
+    suffix at random among the next ``spread`` numbers, so concurrent callers
+    retrying after a clash stop choosing the same one.
     """
-    origin_slug = slugify(field)
-    unique_slug = origin_slug
-    numb = 1
-    mapping = {identifier: unique_slug}
-    obj = klass.objects.filter(**mapping).first()
-    while obj:
-        if obj.id == id:
-            break
-        rnd_string = ''.join(random.choices(string.ascii_lowercase, k=5))
-        unique_slug = f'{origin_slug}-{rnd_string}-{numb}'
-        mapping[identifier] = unique_slug
-        numb += 1
-        obj = klass.objects.filter(**mapping).first()
-    return unique_slug
+    origin_slug = slugify(field) or klass._meta.model_name
+    copy = re.compile(rf"{re.escape(origin_slug)}-([0-9]+)")
+    taken = klass.objects.filter(
+        Q(**{identifier: origin_slug}) | Q(**{f"{identifier}__startswith": f"{origin_slug}-"}))
+    if id is not None:
+        taken = taken.exclude(id=id)
+    # The bare slug first, then longest first and greatest, which puts the
+    # highest numbered copy ahead of every other copy
+    rows = (taken.order_by(models.Case(models.When(**{identifier: origin_slug}, then=0), default=1),
+                           Length(identifier).desc(), f"-{identifier}")
+            .values_list(identifier, source).iterator(chunk_size=100))
+    if next(rows, (None, None))[0] != origin_slug:
+        # Numbered slugs only count as copies once the bare slug is taken
+        return origin_slug
+
+    highest, originals = 1, set()
+    for slug, value in rows:
+        match = copy.fullmatch(slug)
+        if not match:
+            continue  # merely shares the prefix
+        if slugify(value) == slug:
+            originals.add(int(match[1]))
+            continue
+        highest = int(match[1])
+        break
+    number = highest + random.randint(1, spread)
+    while number in originals:
+        number += 1
+    return f'{origin_slug}-{number}'
+
+
+def normalize_emails(emails):
+    """
+    Strip, lowercase and de-duplicate a list of email addresses, keeping order.
+    """
+    return list(dict.fromkeys(email.strip().lower() for email in emails if email.strip()))
 
 
 # Base model with created_at and updated_at timestamps
@@ -36,6 +67,19 @@ class BaseModel(models.Model):
         abstract = True
 
 
+class SurveyQuerySet(models.QuerySet):
+    def with_invitation_flags(self, email):
+        """
+        Annotate each survey with ``is_restricted`` (it has invitations) and
+        ``is_invited`` (``email`` is among them), as two indexed EXISTS
+        subqueries.
+        """
+        invitations = SurveyInvitation.objects.filter(survey=models.OuterRef("pk"))
+        return self.annotate(
+            is_restricted=models.Exists(invitations),
+            is_invited=models.Exists(invitations.filter(email=(email or "").lower())))
+
+
 class Survey(BaseModel):
     name = models.CharField(
         max_length=200,
@@ -69,15 +113,15 @@ class Survey(BaseModel):
         help_text="The user who created the survey.",
         default=1)
     
-    recipient_emails = models.TextField(
-        blank=True, 
-        help_text="Comma-separated list of email addresses that are allowed to access this survey.")
-    
     password = models.CharField(
         max_length=10,
         blank=True,
         help_text="Optional: Password to access the survey.")
 
+    objects = SurveyQuerySet.as_manager()
+
+    SLUG_ATTEMPTS = 10
+
     class Meta:
         verbose_name = "Survey"
         verbose_name_plural = "Surveys"
@@ -86,30 +130,113 @@ class Survey(BaseModel):
         return self.name
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = generate_unique_slug(Survey, self.name, self.id)
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+        for attempt in range(self.SLUG_ATTEMPTS):
+            self.slug = generate_unique_slug(Survey, self.name, self.id, spread=2 ** attempt)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # A concurrent save took the slug between the lookup and the insert
+                self.slug = ""
+                if attempt == self.SLUG_ATTEMPTS - 1:
+                    raise
 
     
 
+    @property
+    def recipient_emails(self):
+        return list(self.invitations.order_by("id").values_list("email", flat=True))
+
+    def set_recipient_emails(self, emails):
+        """
+        Replace the survey's invitations with the given email addresses.
+        """
+        from . import definitions
+        emails = normalize_emails(emails)
+        self.invitations.exclude(email__in=emails).delete()
+        SurveyInvitation.objects.bulk_create(
+            [SurveyInvitation(survey=self, email=email) for email in emails],
+            ignore_conflicts=True)
+        # bulk_create sends no post_save
+        definitions.invalidate_on_commit(self.slug)
+
     def send_survey_emails(self):
-        if not self.recipient_emails:
-            return
-        email_list = [email.strip() for email in self.recipient_emails.split(',')]
-        survey_link = f"http://127.0.0.1:8000/survey/{self.slug}/"
-        subject = f"Invitation to participate in the survey: {self.name}"
-        message = f"You are invited to participate in the survey '{self.name}'.\n\nClick the link below to access the survey:\n{survey_link}"
-        send_mail(subject, message, 'noreply@example.com', email_list)
+        """
+        Queue an invitation email to every recipient not yet emailed and send
+        them in the background (see mailing.py). Returns how many were queued.
+        """
+        from . import mailing
+        return mailing.send_invitations(self)
+
+
+
+class SurveyInvitation(BaseModel):
+    PENDING = "pending"
+    QUEUED = "queued"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (QUEUED, "Queued"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
+
+    survey = models.ForeignKey(
+        Survey,
+        related_name="invitations",
+        on_delete=models.CASCADE)
 
+    email = models.EmailField(
+        db_index=True,
+        help_text="Lowercased email address allowed to access the survey.")
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUSES,
+        default=PENDING,
+        db_index=True,
+        help_text="Delivery state of the invitation email.")
+
+    sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the invitation email was accepted by the mail server.")
+
+    last_error = models.TextField(
+        blank=True,
+        help_text="Error of the last failed delivery attempt.")
+
+    class Meta:
+        verbose_name = "Survey Invitation"
+        verbose_name_plural = "Survey Invitations"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["survey", "email"],
+                name="unique_survey_invitation"),
+        ]
+
+    def __str__(self):
+        return f"{self.email} invited to {self.survey.name}"
 
 
 class Question(BaseModel):
+    RADIO = 1
+    SELECT = 2
+    MULTI_SELECT = 3
+    TEXTAREA = 4
     FIELD_TYPES = [
-        (1, "Radio"),
-        (2, "Select"),
-        (3, "Multi-Select"),
-        (4, "Textarea"),
+        (RADIO, "Radio"),
+        (SELECT, "Select"),
+        (MULTI_SELECT, "Multi-Select"),
+        (TEXTAREA, "Textarea"),
     ]
+    # Single-choice answers are stored as an ordinal, which doubles as their score
+    SCORED_TYPES = [RADIO, SELECT]
 
     survey = models.ForeignKey(
         Survey, 
@@ -155,9 +282,70 @@ class Question(BaseModel):
     
     @property
     def split_choices(self):
-        if self.options:
-            return [choice.strip() for choice in self.options.split(",")]
-        return []
+        # Parsed once per value of self.options
+        cached = self.__dict__.get("_split_choices")
+        if cached is None or cached[0] != self.options:
+            choices = [choice.strip() for choice in self.options.split(",")] if self.options else []
+            cached = self.__dict__["_split_choices"] = (self.options, choices)
+        return cached[1]
+
+    def encode(self, value):
+        """
+        Encode a submitted value as an integer: the 1-based ordinal of the
+        option for Radio/Select, a bitmask of the ticked options (bit 0 for
+        the first option) for Multi-Select. Returns None for Textarea answers
+        and for values that aren't among the options.
+        """
+        choices = self.split_choices
+        if self.field_type == self.MULTI_SELECT:
+            mask = 0
+            for part in value.split(","):
+                if part.strip() not in choices:
+                    return None
+                mask |= 1 << choices.index(part.strip())
+            return mask or None
+        if self.field_type in self.SCORED_TYPES and value.strip() in choices:
+            return choices.index(value.strip()) + 1
+        return None
+
+    def decode(self, choice):
+        """
+        Turn a value produced by encode() back into option text.
+        """
+        choices = self.split_choices
+        if self.field_type == self.MULTI_SELECT:
+            return ",".join(option for position, option in enumerate(choices) if choice & (1 << position))
+        return choices[choice - 1] if 0 < choice <= len(choices) else ""
+
+    def remap_answers(self, previous):
+        """
+        Re-encode the stored answers after the field type or options changed.
+        ``previous`` is an unsaved Question holding the old field_type and
+        options; options are matched by text. Answers left without any known
+        option fall back to their old text as value. The whole old -> new
+        mapping is built first and applied with a single UPDATE, so no row is
+        rewritten twice when one encoding's new value is another's old one.
+        """
+        remapped = {}
+        stored = self.answers.filter(choice__isnull=False).values_list("choice", flat=True).distinct()
+        for old in list(stored):
+            text = previous.decode(old)
+            if self.field_type == self.MULTI_SELECT:
+                text = ",".join(option for option in text.split(",") if option in self.split_choices)
+            new = self.encode(text) if text else None
+            if new != old:
+                remapped[old] = new
+        if not remapped:
+            return
+
+        self.answers.filter(choice__in=remapped).update(
+            choice=models.Case(
+                *(models.When(choice=old, then=models.Value(new)) for old, new in remapped.items()),
+                output_field=models.PositiveBigIntegerField()),
+            value=models.Case(
+                *(models.When(choice=old, then=models.Value("" if new else previous.decode(old)))
+                  for old, new in remapped.items()),
+                output_field=models.TextField()))
 
 
 class UserAnswer(BaseModel):
@@ -170,9 +358,18 @@ class UserAnswer(BaseModel):
         on_delete=models.CASCADE,
         help_text="The user who submitted this answer.")
 
+    submitted_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="When the answers were submitted. Queued submissions are stored (created_at) later.")
+
     class Meta:
         verbose_name = "User Answer"
         verbose_name_plural = "User Answers"
+        indexes = [
+            # Keyset pagination of the results page and exports
+            models.Index(fields=["created_at", "id"], name="useranswer_created_id_idx"),
+            models.Index(fields=["survey", "created_at", "id"], name="useranswer_survey_created_idx"),
+        ]
 
     def __str__(self):
         return f"Answers for {self.survey.name}"
@@ -185,7 +382,13 @@ class Answer(BaseModel):
         on_delete=models.CASCADE)
     
     value = models.TextField(
-        help_text="The value provided by the user for this question.")
+        blank=True,
+        help_text="The free text provided by the user. Empty when the answer is stored in 'choice'.")
+
+    choice = models.PositiveBigIntegerField(
+        blank=True,
+        null=True,
+        help_text="1-based option ordinal for 'Radio'/'Select', bitmask of the ticked options for 'Multi-Select'.")
     
     user_answer = models.ForeignKey(
         UserAnswer,
@@ -197,4 +400,82 @@ class Answer(BaseModel):
         verbose_name_plural = "Answers"
 
     def __str__(self):
-        return f"Answer to {self.question.label}: {self.value}"
+        return f"Answer to {self.question.label}: {self.display_value}"
+
+    @property
+    def display_value(self):
+        if self.choice is not None:
+            return self.question.decode(self.choice)
+        return self.value
+
+
+
+class ScoreRollup(BaseModel):
+    DIMENSION = "dimension"
+    AREA = "area"
+    KINDS = [
+        (DIMENSION, "Dimension"),
+        (AREA, "Area"),
+    ]
+
+    survey = models.ForeignKey(
+        Survey,
+        related_name="score_rollups",
+        on_delete=models.CASCADE)
+
+    kind = models.CharField(
+        max_length=20,
+        choices=KINDS,
+        help_text="Whether the rollup groups by dimension or by area.")
+
+    key = models.CharField(
+        max_length=200,
+        help_text="The dimension or area name.")
+
+    total = models.BigIntegerField(
+        default=0,
+        help_text="Running sum of the scores given in this dimension/area.")
+
+    count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of scored answers in this dimension/area.")
+
+    class Meta:
+        verbose_name = "Score Rollup"
+        verbose_name_plural = "Score Rollups"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["survey", "kind", "key"],
+                name="unique_score_rollup"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.key}: {self.total}/{self.count}"
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0
+
+
+class PendingSubmission(BaseModel):
+    survey = models.ForeignKey(
+        Survey,
+        related_name="pending_submissions",
+        on_delete=models.CASCADE)
+
+    user = models.ForeignKey(get_user_model(),
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        help_text="The user who submitted the answers.")
+
+    answers = models.JSONField(
+        default=list,
+        help_text="The submitted [question id, value] pairs, waiting to be written as Answers.")
+
+    class Meta:
+        verbose_name = "Pending Submission"
+        verbose_name_plural = "Pending Submissions"
+
+    def __str__(self):
+        return f"Pending answers for {self.survey.name}"
@@ -0,0 +1,50 @@
+"""
+Keyset (cursor) pagination on (created_at, id).
+
+Instead of OFFSET, each page continues strictly after the last row of the
+previous one, so fetching page 1000 costs the same index range scan as page 1.
+"""
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(obj):
+    return f"{obj.created_at.isoformat()}_{obj.pk}"
+
+
+def decode_cursor(cursor):
+    """
+    Return (created_at, id) for a cursor, or None if it is missing or invalid.
+    """
+    try:
+        created_at, pk = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, size=50, descending=True):
+    """
+    Return (rows, next_cursor) for the page after ``cursor``. next_cursor is
+    None on the last page.
+    """
+    if descending:
+        queryset = queryset.order_by("-created_at", "-id")
+    else:
+        queryset = queryset.order_by("created_at", "id")
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, pk = position
+        if descending:
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        else:
+            queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+
+    # One extra row tells whether there is a next page without a COUNT
+    rows = list(queryset[:size + 1])
+    if len(rows) > size:
+        rows = rows[:size]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
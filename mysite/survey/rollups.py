@@ -0,0 +1,162 @@
+from collections import defaultdict
+
+from django.db import connections, router, transaction
+from django.db.models import Avg, Count, Sum
+from django.utils import timezone
+
+from . import analysis_cache
+from .models import Question, Answer, ScoreRollup
+
+
+UPSERT_COLUMNS = ("survey_id", "kind", "key", "total", "count", "created_at", "updated_at")
+
+# Rows per INSERT, well within SQLite's limit on query parameters
+UPSERT_BATCH_SIZE = 100
+
+# Kind of rollup -> Answer lookup of the question field it groups by
+GROUPINGS = {
+    ScoreRollup.DIMENSION: "question__dimension",
+    ScoreRollup.AREA: "question__area",
+}
+
+
+def score_totals(answers):
+    """
+    Sum and count the scores of in-memory Answer objects per (kind, key).
+    Only single-choice answers are scored, by their option ordinal.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for answer in answers:
+        question = answer.question
+        if answer.choice is None or question.field_type not in Question.SCORED_TYPES:
+            continue
+        for kind, key in ((ScoreRollup.DIMENSION, question.dimension), (ScoreRollup.AREA, question.area)):
+            if key:
+                totals[(kind, key)][0] += answer.choice
+                totals[(kind, key)][1] += 1
+    return totals
+
+
+def scored(answers):
+    return answers.filter(question__field_type__in=Question.SCORED_TYPES, choice__isnull=False)
+
+
+def aggregate_totals(answers):
+    """
+    Sum and count the scores of an Answer queryset per (kind, key), with one
+    GROUP BY query per kind.
+    """
+    totals = {}
+    for kind, field in GROUPINGS.items():
+        rows = (scored(answers).exclude(**{field: ""})
+                .values(field)
+                .annotate(total=Sum("choice"), count=Count("id"))
+                .order_by())
+        for row in rows:
+            totals[(kind, row[field])] = [row["total"], row["count"]]
+    return totals
+
+
+def summarize(answers):
+    """
+    Average the scores of an Answer queryset into (dimension_summary,
+    area_summary) dictionaries, with one GROUP BY ... AVG() query per kind.
+    """
+    summaries = {}
+    for kind, field in GROUPINGS.items():
+        rows = (scored(answers).exclude(**{field: ""})
+                .values(field)
+                .annotate(average=Avg("choice"))
+                .order_by(field))
+        summaries[kind] = {row[field]: row["average"] for row in rows}
+    return summaries[ScoreRollup.DIMENSION], summaries[ScoreRollup.AREA]
+
+
+def _apply_totals(survey, totals, sign):
+    if not totals:
+        return
+    survey_id = getattr(survey, "pk", survey)
+    connection = connections[router.db_for_write(ScoreRollup)]
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    table, quote = _quote_names(connection)
+
+    with connection.cursor() as cursor:
+        if sign < 0:
+            # Subtracted answers were added before, so their rows exist
+            cursor.executemany(
+                f"UPDATE {table} SET {quote['total']} = {quote['total']} - %s, "
+                f"{quote['count']} = {quote['count']} - %s, {quote['updated_at']} = %s "
+                f"WHERE {quote['survey_id']} = %s AND {quote['kind']} = %s AND {quote['key']} = %s",
+                [(total, count, now, survey_id, kind, key) for (kind, key), (total, count) in totals.items()])
+            return
+
+        # Create missing rows and add to existing ones in one statement per
+        # batch, rather than a CASE per row that Django has to resolve and compile
+        rows = [(survey_id, kind, key, total, count, now, now) for (kind, key), (total, count) in totals.items()]
+        columns = ", ".join(quote[column] for column in UPSERT_COLUMNS)
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            values = ", ".join([f"({', '.join(['%s'] * len(UPSERT_COLUMNS))})"] * len(batch))
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {values} "
+                f"ON CONFLICT ({quote['survey_id']}, {quote['kind']}, {quote['key']}) DO UPDATE SET "
+                f"{quote['total']} = {table}.{quote['total']} + excluded.{quote['total']}, "
+                f"{quote['count']} = {table}.{quote['count']} + excluded.{quote['count']}, "
+                f"{quote['updated_at']} = excluded.{quote['updated_at']}",
+                [value for row in batch for value in row])
+
+
+def _quote_names(connection):
+    """
+    Return the quoted ScoreRollup table name and {column: quoted name}.
+    """
+    quote = connection.ops.quote_name
+    return quote(ScoreRollup._meta.db_table), {column: quote(column) for column in UPSERT_COLUMNS}
+
+
+def apply_answers(survey, answers):
+    """
+    Add freshly submitted Answer objects to the survey's rollups. Call inside
+    the transaction that writes the answers so the rollups never drift from
+    the Answer table. Returns the totals added, per (kind, key).
+    """
+    totals = score_totals(answers)
+    _apply_totals(survey, totals, sign=1)
+    return totals
+
+
+def remove_user_answers(survey, user_answers):
+    """
+    Subtract the answers of the given UserAnswer queryset from the rollups
+    of the survey (or survey id). Called by the pre_delete signal of
+    UserAnswer (see signals.py), while the answers still exist.
+    """
+    answers = Answer.objects.filter(user_answer__in=user_answers)
+    _apply_totals(survey, aggregate_totals(answers), sign=-1)
+
+
+def rebuild_rollups(survey):
+    """
+    Recompute the survey's rollups from scratch, e.g. after a question's
+    options, dimension or area changed.
+    """
+    with transaction.atomic():
+        totals = aggregate_totals(Answer.objects.filter(question__survey=survey))
+        ScoreRollup.objects.filter(survey=survey).delete()
+        ScoreRollup.objects.bulk_create([
+            ScoreRollup(survey=survey, kind=kind, key=key, total=total, count=count)
+            for (kind, key), (total, count) in totals.items()
+        ])
+        transaction.on_commit(lambda: analysis_cache.bump(survey.pk))
+
+
+def rollup_summaries(survey):
+    """
+    Read (dimension_summary, area_summary) for all respondents of the survey
+    from its rollups.
+    """
+    dimension_summary, area_summary = {}, {}
+    for rollup in ScoreRollup.objects.filter(survey=survey, count__gt=0).order_by("id"):
+        summary = dimension_summary if rollup.kind == ScoreRollup.DIMENSION else area_summary
+        summary[rollup.key] = rollup.average
+    return dimension_summary, area_summary
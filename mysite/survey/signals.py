@@ -0,0 +1,79 @@
+"""
+Invalidation of the cached analyses (see analysis_cache.py) and survey
+definitions (see definitions.py), and the feed of the live analysis (see
+live.py).
+
+A survey's analysis changes when responses are submitted or deleted and when
+its questions are edited or deleted. A deleted response's answers are
+subtracted from the rollups here, before they go, whatever deletes it: a
+view, the admin or a deleted user. Bulk-inserted submissions don't send
+post_save, so save_submissions sends submissions_saved instead. Its
+definition changes with the survey itself, its questions and its
+invitations. Versions are bumped only once the change commits: bumping
+earlier would let a request still reading the old rows cache them under the
+new version. Likewise, submissions reach the live analysis only once they
+commit, along with the version they were bumped to.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from . import analysis_cache, definitions, live
+from .models import Survey, SurveyInvitation, Question, UserAnswer
+from .rollups import remove_user_answers
+
+
+# Sent by save_submissions with the ids of the surveys that received responses,
+# how many each received (responses) and the rollup totals they added (totals)
+submissions_saved = Signal()
+
+
+def invalidate_on_commit(survey_id):
+    transaction.on_commit(lambda: analysis_cache.bump(survey_id))
+
+
+@receiver(submissions_saved)
+def submissions_saved_handler(sender, survey_ids, responses, totals, **kwargs):
+    def committed():
+        versions = {survey_id: analysis_cache.bump(survey_id) for survey_id in survey_ids}
+        live.publish_submissions(responses, totals, versions)
+    transaction.on_commit(committed)
+
+
+@receiver(pre_delete, sender=UserAnswer)
+def user_answer_deleting(sender, instance, origin=None, **kwargs):
+    # A deleted survey's rollups go with it
+    if isinstance(origin, Survey):
+        return
+    remove_user_answers(instance.survey_id, UserAnswer.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=UserAnswer)
+def user_answer_deleted(sender, instance, origin=None, **kwargs):
+    # Deleting a whole survey cascades here once per response; nothing is left to invalidate
+    if isinstance(origin, Survey):
+        return
+    invalidate_on_commit(instance.survey_id)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Survey):
+        return
+    invalidate_on_commit(instance.survey_id)
+    definitions.invalidate_on_commit(instance.survey.slug)
+
+
+@receiver(post_save, sender=Survey)
+@receiver(post_delete, sender=Survey)
+def survey_changed(sender, instance, **kwargs):
+    definitions.invalidate_on_commit(instance.slug)
+
+
+# Not post_delete: a receiver would stop invitations from being deleted in
+# bulk. Their bulk writes go through Survey.set_recipient_emails and the
+# admin, which invalidate the definition themselves.
+@receiver(post_save, sender=SurveyInvitation)
+def invitation_saved(sender, instance, **kwargs):
+    definitions.invalidate_on_commit(instance.survey.slug)
@@ -0,0 +1,162 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import Question, UserAnswer, Answer, PendingSubmission
+from .rollups import apply_answers
+from .signals import submissions_saved
+
+
+DIRECT = "direct"
+QUEUED = "queued"
+
+
+def submission_mode():
+    """
+    SURVEY_SUBMISSION_MODE: "direct" writes responses in the request,
+    "queued" appends them to PendingSubmission for drain_submissions.
+    """
+    return getattr(settings, "SURVEY_SUBMISSION_MODE", DIRECT)
+
+
+def collect_answers(questions, data):
+    """
+    Read the submitted value of every question from POST data and return
+    [(question, value)] for the questions that were answered. All the options
+    ticked on a Multi-Select question are kept, comma-joined like the
+    question's own options.
+    """
+    answers = []
+    for question in questions:
+        key = f"question_{question.id}"
+        if question.field_type == Question.MULTI_SELECT:
+            value = ",".join(choice.strip() for choice in data.getlist(key) if choice.strip())
+        else:
+            value = data.get(key)
+        if value:
+            answers.append((question, value))
+    return answers
+
+
+def encode_answer(question, value, user_answer):
+    """
+    Build the Answer for a submitted value, storing choices as integers and
+    keeping text only when it can't be encoded (Textarea answers).
+    """
+    choice = question.encode(value)
+    return Answer(
+        question=question,
+        value="" if choice is not None else value,
+        choice=choice,
+        user_answer=user_answer)
+
+
+def save_submissions(submissions):
+    """
+    Store several responses as one atomic unit. Each submission is a
+    (survey, user, [(question, value)], submitted_at) tuple; submitted_at may
+    be None for "now". Uses one bulk INSERT for the UserAnswers, one for all
+    of their answers, and one rollup update per survey.
+    """
+    submissions = list(submissions)
+    now = timezone.now()
+    with transaction.atomic():
+        # created_at stays the time of the insert, so it only grows with the id
+        user_answers = UserAnswer.objects.bulk_create([
+            UserAnswer(survey=survey, user=user, submitted_at=submitted_at or now)
+            for survey, user, _, submitted_at in submissions
+        ])
+
+        answer_objects = Answer.objects.bulk_create([
+            encode_answer(question, value, user_answer)
+            for user_answer, (_, _, answers, _) in zip(user_answers, submissions)
+            for question, value in answers
+        ])
+
+        by_survey = defaultdict(list)
+        for answer in answer_objects:
+            by_survey[answer.question.survey_id].append(answer)
+        surveys = {survey.id: survey for survey, _, _, _ in submissions}
+        totals = {survey_id: apply_answers(surveys[survey_id], answers) for survey_id, answers in by_survey.items()}
+        # bulk_create sends no post_save, so announce the new responses here
+        submissions_saved.send(
+            sender=UserAnswer, survey_ids=list(surveys),
+            responses=Counter(survey.id for survey, _, _, _ in submissions), totals=totals)
+    return user_answers
+
+
+def save_submission(survey, user, answers):
+    """
+    Store one response as a single atomic unit: the UserAnswer, one bulk
+    INSERT of its answers, and the matching rollup increments.
+    """
+    return save_submissions([(survey, user, answers, None)])[0]
+
+
+def enqueue_submission(survey, user, answers):
+    """
+    Append a validated response to the pending queue. A single small INSERT,
+    so the request returns without waiting on the bulk writes.
+    """
+    return PendingSubmission.objects.create(
+        survey=survey,
+        user=user,
+        answers=[[question.id, value] for question, value in answers])
+
+
+async def aenqueue_submission(survey, user, answers):
+    """
+    enqueue_submission() for async views.
+    """
+    return await PendingSubmission.objects.acreate(
+        survey=survey,
+        user=user,
+        answers=[[question.id, value] for question, value in answers])
+
+
+def drain_pending(batch_size=500):
+    """
+    Move up to batch_size pending submissions into UserAnswer/Answer in one
+    transaction and return how many were processed.
+
+    The queue rows are deleted in the same transaction that writes the
+    answers, and the batch is abandoned if another drainer already deleted
+    any of them, so every accepted submission is stored exactly once.
+    """
+    with transaction.atomic():
+        batch = list(PendingSubmission.objects
+                     .select_for_update(skip_locked=True)
+                     .select_related("survey", "user")
+                     .order_by("id")[:batch_size])
+        if not batch:
+            return 0
+
+        deleted, _ = PendingSubmission.objects.filter(pk__in=[pending.pk for pending in batch]).delete()
+        if deleted != len(batch):
+            transaction.set_rollback(True)
+            return 0
+
+        question_ids = {question_id for pending in batch for question_id, _ in pending.answers}
+        questions = Question.objects.in_bulk(question_ids)
+
+        # Answers to questions deleted since submission are dropped, as they would have cascaded
+        save_submissions([
+            (pending.survey, pending.user,
+             [(questions[question_id], value) for question_id, value in pending.answers if question_id in questions],
+             pending.created_at)
+            for pending in batch
+        ])
+    return len(batch)
+
+
+def queue_status():
+    """
+    Return the depth of the pending queue and the age in seconds of its
+    oldest entry.
+    """
+    stats = PendingSubmission.objects.aggregate(depth=Count("id"), oldest=Min("created_at"))
+    lag = (timezone.now() - stats["oldest"]).total_seconds() if stats["oldest"] else 0.0
+    return {"depth": stats["depth"], "lag_seconds": lag, "oldest": stats["oldest"]}
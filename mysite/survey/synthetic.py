@@ -0,0 +1,135 @@
+"""
+Synthetic survey data for load tests and benchmarks.
+
+Everything is inserted with bulk operations: users and surveys with
+bulk_create, responses through save_submissions (one INSERT for a batch of
+UserAnswers, one for their answers and one rollup update per survey), so
+half a million answers take under a minute on SQLite, a fraction of what
+per-object saves would.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from .models import Survey, SurveyInvitation, Question, normalize_emails
+from .submissions import save_submissions
+
+
+DIMENSIONS = ["Vision", "Execution", "People", "Communication", "Integrity", "Adaptability"]
+
+AREAS = [
+    "Strategy", "Decision Making", "Delegation", "Coaching", "Feedback",
+    "Collaboration", "Conflict", "Accountability", "Innovation", "Resilience",
+]
+
+SCALE = ["Never", "Rarely", "Sometimes", "Often", "Always"]
+
+COMMENTS = [
+    "Sets clear priorities for the team.",
+    "Could share decisions earlier.",
+    "Very approachable and supportive.",
+    "Meetings often run over time.",
+    "Gives useful, specific feedback.",
+    "",
+]
+
+PREFIX = "synthetic"
+
+PASSWORD = "synthetic"
+
+SUBMISSION_BATCH_SIZE = 500
+
+
+def generate(users=100, surveys=5, questions=20, responses=200, prefix=PREFIX,
+             restricted=0.2, days=90, seed=None):
+    """
+    Create ``users`` respondents (password "synthetic"), an admin owning
+    ``surveys`` published surveys of ``questions`` questions each, cycling
+    through every field type, dimension and area, and ``responses`` responses
+    per survey from randomly chosen respondents, spread over the last
+    ``days`` days. A ``restricted`` share of the surveys is limited to
+    invited users (all of the respondents). Returns the admin.
+    """
+    rng = random.Random(seed)
+    User = get_user_model()
+    password = make_password(PASSWORD)
+
+    admin = User.objects.create_superuser(f"{prefix}-admin", f"{prefix}-admin@example.com", PASSWORD)
+    User.objects.bulk_create([
+        User(username=f"{prefix}-user-{i}", email=f"{prefix}-user-{i}@example.com", password=password)
+        for i in range(users)
+    ])
+    # Not every backend sets primary keys on bulk-created objects, so read them back
+    respondents = list(User.objects.filter(username__startswith=f"{prefix}-user-").order_by("id"))
+
+    Survey.objects.bulk_create([
+        Survey(
+            name=f"Leadership Survey {i + 1}",
+            description="Synthetic leadership survey.",
+            slug=f"{prefix}-leadership-survey-{i + 1}",
+            published=True,
+            allow_multiple_submissions=True,
+            created_by=admin)
+        for i in range(surveys)
+    ])
+    survey_objects = list(Survey.objects.filter(created_by=admin).order_by("id"))
+
+    emails = normalize_emails([user.email for user in respondents])
+    SurveyInvitation.objects.bulk_create([
+        SurveyInvitation(survey=survey, email=email)
+        for survey in survey_objects[:round(len(survey_objects) * restricted)]
+        for email in emails
+    ])
+
+    field_types = [field_type for field_type, _ in Question.FIELD_TYPES]
+    Question.objects.bulk_create([
+        Question(
+            survey=survey,
+            label=f"{AREAS[i % len(AREAS)]}: statement {i + 1}",
+            field_type=field_types[i % len(field_types)],
+            options="" if field_types[i % len(field_types)] == Question.TEXTAREA else ",".join(SCALE),
+            dimension=DIMENSIONS[i % len(DIMENSIONS)],
+            area=AREAS[i % len(AREAS)],
+            order=i)
+        for survey in survey_objects
+        for i in range(questions)
+    ])
+
+    now = timezone.now()
+    for survey in survey_objects:
+        survey_questions = list(survey.questions.select_related("survey"))
+        # Each survey gets its own skew, so the analyses differ
+        weights = [rng.uniform(0.2, 1.0) for _ in SCALE]
+        submissions = [
+            (survey, rng.choice(respondents) if respondents else None,
+             [(question, value) for question in survey_questions
+              if (value := random_answer(question, rng, weights))],
+             now - timedelta(seconds=rng.uniform(0, days * 86400)))
+            for _ in range(responses)
+        ]
+        for start in range(0, len(submissions), SUBMISSION_BATCH_SIZE):
+            save_submissions(submissions[start:start + SUBMISSION_BATCH_SIZE])
+    return admin
+
+
+def random_answer(question, rng, weights):
+    """
+    A value as collect_answers would return it; empty when left unanswered.
+    """
+    if question.field_type == Question.TEXTAREA:
+        return rng.choice(COMMENTS)
+    choices = question.split_choices
+    if question.field_type == Question.MULTI_SELECT:
+        return ",".join(choice for choice in choices if rng.random() < 0.3)
+    return rng.choices(choices, weights=weights[:len(choices)])[0]
+
+
+def flush(prefix=PREFIX):
+    """
+    Delete the users generated with ``prefix`` and, through them, their
+    surveys and responses.
+    """
+    return get_user_model().objects.filter(username__startswith=f"{prefix}-").delete()
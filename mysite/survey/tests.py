@@ -1,3 +1,1383 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
+from urllib.parse import parse_qsl
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.backends import locmem
+from django.core.management import CommandError, call_command
+from django.core.servers.basehttp import WSGIServer
+from django.db import DatabaseError, IntegrityError, connection, connections, router as db_router, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.test import AsyncClient, LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.testcases import LiveServerThread
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+try:
+    import numpy
+except ImportError:  # only the .npz export needs it
+    numpy = None
+
+from mysite import routers
+from mysite.backends.sqlite3.base import DatabaseWrapper
+
+from . import analysis_cache, chart_cache, exports, live, loadtest, mailing, synthetic, urls
+from .middleware import QUERY_STATS, query_budget, reset_query_stats
+from .models import Survey, SurveyInvitation, Question, UserAnswer, Answer, PendingSubmission, generate_unique_slug
+from .rollups import rebuild_rollups, rollup_summaries
+from .pagination import keyset_page
+from .submissions import drain_pending, enqueue_submission, save_submission
+
+
+User = get_user_model()
+
+# Seeded data grows with each size: the query count of a view must not
+SIZES = (2, 5, 15)
+
+# Keeps the analyses cached by the tests out of the project's file cache
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def seed(size):
+    """
+    Create an admin, an invited respondent, ``size`` other respondents and
+    ``size`` surveys of ``size`` questions (cycling through every field
+    type), each answered by all respondents. Returns the objects the route
+    cases refer to.
+    """
+    admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+    respondent = User.objects.create_user("respondent", "respondent@example.com", "pw")
+    others = [User.objects.create_user(f"user{i}", f"user{i}@example.com", "pw") for i in range(size)]
+
+    surveys = []
+    for number in range(size):
+        survey = Survey.objects.create(
+            name=f"Leadership {number}", description="Seeded", created_by=admin, published=True)
+        survey.set_recipient_emails([respondent.email] + [user.email for user in others])
+        questions = Question.objects.bulk_create([
+            Question(
+                survey=survey, label=f"Question {i}", field_type=Question.FIELD_TYPES[i % 4][0],
+                options="Never,Sometimes,Often,Always", dimension=f"Dimension {i % 3}",
+                area=f"Area {i % 5}", order=i)
+            for i in range(size)
+        ])
+        for user in [respondent] + others:
+            save_submission(survey, user, [(question, "Often") for question in questions])
+        surveys.append(survey)
+
+    survey = surveys[0]
+    question = survey.questions.order_by("id").first()
+    return {
+        "admin": admin,
+        "respondent": respondent,
+        "survey": survey,
+        "question": question,
+        "response": UserAnswer.objects.filter(survey=survey, user=respondent).get(),
+        "answer": Answer.objects.filter(question=question).first(),
+    }
+
+
+def survey_args(data):
+    return {"slug": data["survey"].slug}
+
+
+def question_args(data):
+    return {"question_id": data["question"].pk}
+
+
+def cached_chart():
+    key = chart_cache.remember("dimensions", {"Dimension 0": 3.0})
+    chart_cache.store_png(key, b"\x89PNG")
+    return key
+
+
+def answer_data(data):
+    return {f"question_{question.pk}": "Often" for question in data["survey"].questions.all()}
+
+
+# (url name, method, user, reverse kwargs, POST data)
+ROUTES = [
+    ("survey:survey", "get", "admin", None, None),
+    ("survey:survey", "get", "respondent", None, None),
+    ("survey:create_survey", "get", "admin", None, None),
+    ("survey:create_survey", "post", "admin", None,
+     lambda data: {"name": "New", "description": "d", "emails": ["a@example.com", "b@example.com"]}),
+    ("survey:edit-survey", "get", "admin", survey_args, None),
+    ("survey:edit-survey", "post", "admin", survey_args,
+     lambda data: {"name": "Renamed", "description": "d", "emails": ["a@example.com"]}),
+    ("survey:delete-survey", "get", "admin", survey_args, None),
+    ("survey:delete-survey", "post", "admin", survey_args, lambda data: {}),
+    ("survey:send-survey-emails", "post", "admin", survey_args, lambda data: {}),
+    ("survey:results-page", "get", "admin", None, None),
+    ("survey:results-page", "get", "respondent", None, None),
+    ("survey:results-more", "get", "admin", None, None),
+    ("survey:submission-queue-status", "get", "admin", None, None),
+    ("survey:survey-chart", "get", "respondent", lambda data: {"key": cached_chart()}, None),
+    ("survey:survey-detail", "get", "respondent", survey_args, None),
+    ("survey:survey-detail", "post", "respondent", survey_args, answer_data),
+    ("survey:password-prompt", "get", "respondent", survey_args, None),
+    ("survey:password-prompt", "post", "respondent", survey_args, lambda data: {"survey_password": "wrong"}),
+    ("survey:add-question", "get", "admin", survey_args, None),
+    ("survey:add-question", "post", "admin", survey_args,
+     lambda data: {"label": "New", "field_type": Question.RADIO, "options": ["a", "b"],
+                   "dimension": "Dimension 0", "area": "Area 0"}),
+    ("survey:edit-question", "get", "admin", question_args, None),
+    ("survey:edit-question", "post", "admin", question_args,
+     lambda data: {"label": "Edited", "field_type": data["question"].field_type,
+                   "options[]": data["question"].split_choices, "dimension": "Dimension 9",
+                   "area": data["question"].area}),
+    ("survey:delete-question", "get", "admin", question_args, None),
+    ("survey:delete-question", "post", "admin", question_args, lambda data: {}),
+    ("survey:survey-analysis", "get", "admin", survey_args, None),
+    ("survey:survey-analysis", "get", "respondent", survey_args, None),
+    ("survey:survey-analysis-data", "get", "admin", survey_args, None),
+    ("survey:survey-analysis-events", "get", "admin", survey_args, None),
+    ("survey:survey-export", "get", "admin", survey_args, None),
+    ("survey:survey-export-matrix", "get", "admin", survey_args, None),
+    ("survey:delete-analysis", "post", "admin",
+     lambda data: {"slug": data["survey"].slug, "user_id": data["respondent"].pk}, lambda data: {}),
+    ("survey:delete-response", "post", "admin", lambda data: {"response_id": data["response"].pk}, lambda data: {}),
+    # Admin pages listing objects whose __str__ follows a foreign key
+    ("admin:survey_answer_changelist", "get", "admin", None, None),
+    ("admin:survey_answer_change", "get", "admin", lambda data: {"object_id": data["answer"].pk}, None),
+    ("admin:survey_useranswer_changelist", "get", "admin", None, None),
+    ("admin:survey_pendingsubmission_changelist", "get", "admin", None, None),
+]
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(
+            CHART_CACHE_DIR=f"{cls.media_root}/charts", EXPORT_CACHE_DIR=f"{cls.media_root}/exports"))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def request(self, data, name, method, user, args, post_data):
+        # Every request pays for the content type lookups the admin caches per process,
+        # and for building the analyses and survey definitions (rolled back surveys'
+        # ids and slugs are reused)
+        ContentType.objects.clear_cache()
+        cache.clear()
+        self.client.force_login(data[user])
+        url = reverse(name, kwargs=args(data) if args else None)
+        if method == "post":
+            response = self.client.post(url, post_data(data))
+        else:
+            response = self.client.get(url)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f"{method.upper()} {url}")
+        return response.query_stats
+
+    def measure(self, size):
+        """
+        Seed data of the given size and return the query count of every
+        route case, each run against the same data and rolled back after.
+        """
+        counts = {}
+        with transaction.atomic():
+            data = seed(size)
+            for case in ROUTES:
+                with transaction.atomic():
+                    counts[case[:3]] = self.request(data, *case).count
+                    transaction.set_rollback(True)
+            transaction.set_rollback(True)
+        return counts
+
+    def test_every_route_has_a_case(self):
+        names = {f"{urls.app_name}:{pattern.name}" for pattern in urls.urlpatterns}
+        self.assertEqual(names - {case[0] for case in ROUTES}, set())
+
+    def test_query_budgets(self):
+        counts = {size: self.measure(size) for size in SIZES}
+        for case, count in counts[SIZES[0]].items():
+            name, method, user = case
+            with self.subTest(name=name, method=method, user=user):
+                self.assertLessEqual(count, query_budget(name))
+                # A count that grows with the data is an N+1
+                self.assertEqual([counts[size][case] for size in SIZES], [count] * len(SIZES))
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    def setUp(self):
+        reset_query_stats()
+        self.user = User.objects.create_user("respondent", "respondent@example.com", "pw")
+        self.client.force_login(self.user)
+
+    def test_stats_are_attached_and_accumulated(self):
+        first = self.client.get(reverse("survey:survey")).query_stats
+        second = self.client.get(reverse("survey:survey")).query_stats
+        self.assertEqual(first.url_name, "survey:survey")
+        self.assertGreater(first.count, 0)
+        self.assertGreaterEqual(first.db_seconds, 0)
+        stats = QUERY_STATS["survey:survey"]
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["queries"], first.count + second.count)
+
+    def test_over_budget_requests_are_logged(self):
+        with override_settings(QUERY_BUDGETS={"survey:survey": 1}):
+            with self.assertLogs("survey.queries", "WARNING") as logs:
+                self.client.get(reverse("survey:survey"))
+        self.assertIn("survey:survey", logs.output[0])
+
+    def test_streamed_queries_are_counted(self):
+        survey = Survey.objects.create(name="Streamed", description="d", created_by=self.user)
+        response = self.client.get(reverse("survey:survey-export", kwargs={"slug": survey.slug}))
+        before = response.query_stats.count
+        b"".join(response.streaming_content)
+        self.assertGreater(response.query_stats.count, before)
+
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    def test_pragmas_and_transaction_mode(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        wrapper = DatabaseWrapper({**connection.settings_dict, "NAME": f"{directory}/pragmas.sqlite3"}, "pragmas")
+        self.addCleanup(wrapper.close)
+        pragmas = connection.settings_dict["OPTIONS"]["pragmas"]
+        with wrapper.cursor() as cursor:
+            self.assertEqual(cursor.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(cursor.execute("PRAGMA busy_timeout").fetchone()[0], pragmas["busy_timeout"])
+            self.assertEqual(cursor.execute("PRAGMA synchronous").fetchone()[0], 1)
+        # What atomic() does on SQLite
+        with CaptureQueriesContext(wrapper) as queries:
+            wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+            wrapper.rollback()
+            wrapper.set_autocommit(True)
+        self.assertEqual(queries[0]["sql"], "BEGIN IMMEDIATE")
+
+    def test_invalid_options(self):
+        for options in ({"transaction_mode": "LATER"}, {"pragmas": {"cache_size = 1; --": 1}}):
+            wrapper = DatabaseWrapper({**connection.settings_dict, "OPTIONS": options}, "invalid")
+            with self.subTest(options=options), self.assertRaises(ImproperlyConfigured):
+                wrapper.get_connection_params()
+
+
+@override_settings(REPLICA_DATABASE="replica", CACHES=LOCMEM_CACHES)
+class ReplicaRoutingTests(SimpleTestCase):
+    def route(self, method, path, cookies=None):
+        """
+        Pass a request through ReplicaMiddleware and return where the view
+        would read surveys and sessions from, and the response.
+        """
+        routed = {}
+
+        def view(request):
+            routed["survey"] = db_router.db_for_read(Survey)
+            routed["session"] = db_router.db_for_read(Session)
+            return HttpResponse()
+
+        def get_response(request):
+            return middleware.process_view(request, view, (), {}) or view(request)
+
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(path)
+        middleware = routers.ReplicaMiddleware(get_response)
+        return routed, middleware(request)
+
+    def test_read_views_use_the_replica(self):
+        routed, _ = self.route("get", reverse("survey:results-page"))
+        self.assertEqual(routed, {"survey": "replica", "session": "default"})
+        # Outside the request, reads go back to the primary
+        self.assertEqual(db_router.db_for_read(Survey), "default")
+
+    def test_other_views_and_posts_use_the_primary(self):
+        routed, _ = self.route("get", reverse("survey:survey-detail", kwargs={"slug": "s"}))
+        self.assertEqual(routed["survey"], "default")
+        routed, response = self.route("post", reverse("survey:results-page"))
+        self.assertEqual(routed["survey"], "default")
+        self.assertEqual(response.cookies[routers.STICKY_COOKIE]["max-age"], settings.REPLICA_STICKY_SECONDS)
+
+    def test_reads_stick_to_the_primary_after_a_post(self):
+        routed, _ = self.route("get", reverse("survey:results-page"), {routers.STICKY_COOKIE: "1"})
+        self.assertEqual(routed["survey"], "default")
+
+# The online backup waits for the test's transaction to end, so there must be none
+@override_settings(REPLICA_DATABASE="replica", CACHES=LOCMEM_CACHES)
+class ReplicaSyncTests(TransactionTestCase):
+    def test_sync_copies_the_database_and_expires_replica_analyses(self):
+        Survey.objects.create(name="Replicated", description="d", created_by=User.objects.create_user("owner"))
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with routers.reading_from_replica():
+            key = analysis_cache.analysis_key(1, "all")
+            self.assertEqual(key, analysis_cache.analysis_key(1, "all"))
+            routers.sync_replica("replica", path=f"{directory}/replica.sqlite3")
+            self.assertNotEqual(key, analysis_cache.analysis_key(1, "all"))
+        # Computed from the primary, the result isn't tied to the replica's syncs
+        self.assertNotIn(":replica:", analysis_cache.analysis_key(1, "all"))
+
+        with closing(sqlite3.connect(f"{directory}/replica.sqlite3")) as replica:
+            self.assertEqual(replica.execute("SELECT name FROM survey_survey").fetchall(), [("Replicated",)])
+
+
+class MigrationTests(TransactionTestCase):
+    """
+    Data migrations, run on rows created at the migration before them.
+    """
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("survey", target)])
+        return executor.loader.project_state([("survey", target)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_backfill_answer_scores(self):
+        apps = self.migrate("0008_answer_score")
+        Survey, Question = apps.get_model("survey", "Survey"), apps.get_model("survey", "Question")
+        UserAnswer, Answer = apps.get_model("survey", "UserAnswer"), apps.get_model("survey", "Answer")
+        owner = User.objects.create_user("owner")
+        survey = Survey.objects.create(name="Legacy", slug="legacy", description="d", created_by_id=owner.pk)
+        radio = Question.objects.create(survey=survey, label="Radio", field_type=1, options="Never, Sometimes,Often")
+        text = Question.objects.create(survey=survey, label="Text", field_type=4, options="")
+        response = UserAnswer.objects.create(survey=survey)
+        for question, value in [(radio, "Sometimes"), (radio, "Often"), (radio, "Unknown"), (text, "Often")]:
+            Answer.objects.create(question=question, user_answer=response, value=value)
+
+        Answer = self.migrate("0009_backfill_answer_scores").get_model("survey", "Answer")
+        self.assertEqual(list(Answer.objects.order_by("id").values_list("value", "score")),
+                         [("Sometimes", 2), ("Often", 3), ("Unknown", None), ("Often", None)])
+
+
+    def test_copy_recipient_emails(self):
+        apps = self.migrate("0011_answer_choice")
+        Survey = apps.get_model("survey", "Survey")
+        owner = User.objects.create_user("owner")
+        invited = Survey.objects.create(name="Invited", slug="invited", description="d", created_by_id=owner.pk,
+                                        recipient_emails=" A@example.com, a@example.com,,b@Example.com ")
+        Survey.objects.create(name="Open", slug="open", description="d", created_by_id=owner.pk)
+
+        SurveyInvitation = self.migrate("0012_surveyinvitation").get_model("survey", "SurveyInvitation")
+        self.assertEqual(list(SurveyInvitation.objects.order_by("id").values_list("survey_id", "email")),
+                         [(invited.pk, "a@example.com"), (invited.pk, "b@example.com")])
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AnalysisCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.respondent = User.objects.create_user("respondent", "respondent@example.com", "pw")
+        self.survey = Survey.objects.create(name="Cached", description="d", created_by=self.admin, published=True)
+        self.question = Question.objects.create(
+            survey=self.survey, label="Question", field_type=Question.RADIO,
+            options="Never,Sometimes,Often,Always", dimension="Vision", area="Strategy")
+        self.response = save_submission(self.survey, self.respondent, [(self.question, "Often")])
+        self.client.force_login(self.admin)
+        self.url = reverse("survey:survey-analysis-data", kwargs={"slug": self.survey.slug})
+
+    def test_repeat_loads_hit_the_cache(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        self.assertEqual(first.json(), second.json())
+        self.assertLess(second.query_stats.count, first.query_stats.count)
+        filtered = self.client.get(self.url, {"user": "respondent"})
+        self.assertEqual(filtered.json()["selected_user"], "respondent")
+        self.assertEqual(self.client.get(self.url).json()["selected_user"], None)
+
+    def assertInvalidated(self, change):
+        self.client.get(self.url)
+        version = analysis_cache.analysis_version(self.survey.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertNotEqual(analysis_cache.analysis_version(self.survey.pk), version)
+        return self.client.get(self.url).json()
+
+    def test_submission_invalidates(self):
+        data = self.assertInvalidated(
+            lambda: save_submission(self.survey, self.admin, [(self.question, "Always")]))
+        self.assertEqual(data["response_count"], 2)
+
+    def test_response_delete_invalidates(self):
+        data = self.assertInvalidated(self.response.delete)
+        self.assertEqual(data["response_count"], 0)
+
+    def test_question_edit_invalidates(self):
+        def edit():
+            self.question.dimension = "People"
+            self.question.save()
+            rebuild_rollups(self.survey)
+        data = self.assertInvalidated(edit)
+        self.assertEqual([label for label, _ in data["dimension_summary"]], ["People"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RollupDeletionTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.survey = Survey.objects.create(name="Deleted", description="d", created_by=self.admin)
+        self.question = Question.objects.create(
+            survey=self.survey, label="Question", field_type=Question.RADIO,
+            options="Never,Sometimes,Often,Always", dimension="Vision", area="Strategy")
+        self.users = [User.objects.create_user(f"user{i}", f"user{i}@example.com", "pw") for i in range(2)]
+        self.responses = [save_submission(self.survey, user, [(self.question, value)])
+                          for user, value in zip(self.users, ["Never", "Always"])]
+        self.client.force_login(self.admin)
+
+    def assertRollupsMatchAnswers(self, dimension_summary):
+        self.assertEqual(rollup_summaries(self.survey)[0], dimension_summary)
+        rebuild_rollups(self.survey)
+        self.assertEqual(rollup_summaries(self.survey)[0], dimension_summary)
+
+    def test_deleted_user(self):
+        self.users[1].delete()
+        self.assertRollupsMatchAnswers({"Vision": 1.0})
+
+    def test_admin_deletes_responses(self):
+        self.client.post(reverse("admin:survey_useranswer_changelist"), {
+            "action": "delete_selected", "_selected_action": [self.responses[0].pk], "post": "yes"})
+        self.assertRollupsMatchAnswers({"Vision": 4.0})
+
+    def test_admin_deletes_answer(self):
+        answer = self.responses[1].answers.get()
+        self.client.post(reverse("admin:survey_answer_delete", args=[answer.pk]), {"post": "yes"})
+        self.assertFalse(Answer.objects.filter(pk=answer.pk).exists())
+        self.assertRollupsMatchAnswers({"Vision": 1.0})
+
+    def test_admin_deletes_question(self):
+        self.client.post(reverse("admin:survey_question_delete", args=[self.question.pk]), {"post": "yes"})
+        self.assertRollupsMatchAnswers({})
+
+    def test_deleted_question(self):
+        self.client.post(reverse("survey:delete-question", kwargs={"question_id": self.question.pk}))
+        self.assertFalse(Answer.objects.exists())
+        self.assertRollupsMatchAnswers({})
+
+    def test_failed_rebuild_keeps_the_question(self):
+        with mock.patch("survey.views.rebuild_rollups", side_effect=DatabaseError("disk I/O error")):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse("survey:delete-question", kwargs={"question_id": self.question.pk}))
+        self.assertTrue(Question.objects.filter(pk=self.question.pk).exists())
+        self.assertRollupsMatchAnswers({"Vision": 2.5})
+
+    def test_deleted_survey(self):
+        self.survey.delete()
+        self.assertFalse(UserAnswer.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RemapAnswersTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.survey = Survey.objects.create(name="Remapped", description="d", created_by=self.admin)
+        self.client.force_login(self.admin)
+
+    def answer(self, question, *values):
+        for number, value in enumerate(values):
+            user = User.objects.create_user(f"user{question.pk}-{number}", f"user{number}@example.com", "pw")
+            save_submission(self.survey, user, [(question, value)])
+
+    def edit(self, question, field_type, options):
+        self.client.post(reverse("survey:edit-question", kwargs={"question_id": question.pk}), {
+            "label": question.label, "field_type": field_type, "options[]": options,
+            "dimension": question.dimension, "area": question.area})
+        question.refresh_from_db()
+        return [answer.display_value for answer in question.answers.order_by("id")]
+
+    def test_reordered_options(self):
+        question = Question.objects.create(
+            survey=self.survey, label="Order", field_type=Question.RADIO, options="A,B", dimension="Vision")
+        self.answer(question, "A", "B")
+        self.assertEqual(self.edit(question, Question.RADIO, ["B", "A"]), ["A", "B"])
+        self.assertEqual(list(question.answers.order_by("id").values_list("choice", flat=True)), [2, 1])
+        self.assertEqual(rollup_summaries(self.survey)[0], {"Vision": 1.5})
+
+    def test_field_type_change(self):
+        question = Question.objects.create(
+            survey=self.survey, label="Type", field_type=Question.SELECT, options="A,B,C,D")
+        self.answer(question, "A", "B", "C", "D")
+        # Select ordinals 1-4 become Multi-Select bitmasks 1, 2, 4 and 8
+        self.assertEqual(self.edit(question, Question.MULTI_SELECT, ["A", "B", "C", "D"]), ["A", "B", "C", "D"])
+        self.assertEqual(list(question.answers.order_by("id").values_list("choice", flat=True)), [1, 2, 4, 8])
+
+    def test_removed_option_keeps_its_text(self):
+        question = Question.objects.create(
+            survey=self.survey, label="Removed", field_type=Question.RADIO, options="A,B")
+        self.answer(question, "A", "B")
+        self.assertEqual(self.edit(question, Question.RADIO, ["B"]), ["A", "B"])
+        self.assertEqual(list(question.answers.order_by("id").values_list("choice", "value")), [(None, "A"), (1, "")])
+
+
+@mock.patch("survey.views.RESULTS_PAGE_SIZE", 2)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.surveys = [Survey.objects.create(name=name, description="d", created_by=self.admin)
+                        for name in ("First", "Second")]
+        self.client.force_login(self.admin)
+        # Five responses on 2024-01-01 at the very same time, three on each of the next two days
+        days = [timezone.make_aware(datetime(2024, 1, day, 12)) for day in (1, 2, 3)]
+        self.times = [days[0]] * 5 + [days[1]] * 3 + [days[2]] * 3
+        for number, created_at in enumerate(self.times):
+            user = User.objects.create_user(f"user{number}", f"user{number}@example.com", "pw")
+            response = UserAnswer.objects.create(survey=self.surveys[number % 2], user=user)
+            UserAnswer.objects.filter(pk=response.pk).update(created_at=created_at)
+
+    def pages(self, queryset, **kwargs):
+        rows, cursor = keyset_page(queryset, **kwargs)
+        pages = [rows]
+        while cursor:
+            rows, cursor = keyset_page(queryset, cursor, **kwargs)
+            pages.append(rows)
+        return pages
+
+    def test_ties_are_broken_by_id(self):
+        responses = UserAnswer.objects.filter(created_at=self.times[0])
+        ids = sorted(responses.values_list("id", flat=True))
+        for descending in (True, False):
+            pages = self.pages(responses, size=2, descending=descending)
+            self.assertEqual([len(rows) for rows in pages], [2, 2, 1])
+            self.assertEqual([row.pk for rows in pages for row in rows], ids[::-1] if descending else ids)
+
+    def test_invalid_cursors_start_over(self):
+        first, _ = keyset_page(UserAnswer.objects.all(), size=2)
+        for cursor in ("", "garbage", "2024-01-01_", "2024-13-01T00:00:00_5", "_5"):
+            self.assertEqual(keyset_page(UserAnswer.objects.all(), cursor, size=2)[0], first)
+            response = self.client.get(reverse("survey:results-page"), {"after": cursor})
+            self.assertEqual(list(response.context["responses"]), first)
+
+    def results(self, name="survey:results-page", **params):
+        """
+        Every row of the results, following the next page links from ``name``.
+        """
+        rows = []
+        while True:
+            response = self.client.get(reverse(name), params)
+            rows += response.context["responses"]
+            if name == "survey:results-more":
+                next_query = response.json()["next_query"]
+            else:
+                next_query = response.context["next_query"]
+            if not next_query:
+                return rows
+            params = dict(parse_qsl(next_query))
+
+    def test_filters(self):
+        everything = self.results()
+        self.assertEqual(len(everything), 11)
+        self.assertEqual(len(set(everything)), 11)
+        self.assertEqual(self.results(survey=self.surveys[1].slug),
+                         [row for row in everything if row.survey == self.surveys[1]])
+        self.assertEqual(self.results(since="2024-01-02"), everything[:6])
+        self.assertEqual(self.results(until="2024-01-02"), everything[3:])
+        self.assertEqual(self.results(survey=self.surveys[0].slug, since="2024-01-02", until="2024-01-02"),
+                         [row for row in everything[3:6] if row.survey == self.surveys[0]])
+
+    def test_more_matches_the_link_it_replaces(self):
+        page = self.client.get(reverse("survey:results-page"))
+        params = dict(parse_qsl(page.context["next_query"]))
+        link = self.client.get(reverse("survey:results-page"), params)
+        more = self.client.get(reverse("survey:results-more"), params)
+        self.assertEqual(list(more.context["responses"]), list(link.context["responses"]))
+        self.assertEqual(more.json()["next_query"], link.context["next_query"])
+        self.assertEqual(self.results("survey:results-more"), self.results())
+
+
+class SlugTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+
+    def create(self, name):
+        return Survey.objects.create(name=name, description="d", created_by=self.admin).slug
+
+    def test_next_free_number(self):
+        self.assertEqual([self.create("Leadership") for _ in range(3)],
+                         ["leadership", "leadership-2", "leadership-3"])
+        Survey.objects.filter(slug="leadership-2").delete()
+        # Past the highest copy, not into the gap
+        self.assertEqual(self.create("Leadership"), "leadership-4")
+
+    def test_prefix_only_matches(self):
+        self.create("Leadership")
+        self.assertEqual(self.create("Leadership Team"), "leadership-team")
+        self.assertEqual(self.create("Leadership"), "leadership-2")
+        self.assertEqual(self.create("Leadership 2024"), "leadership-2024")
+        self.assertEqual(self.create("Leadership"), "leadership-3")
+
+    def test_names_ending_in_a_number(self):
+        self.assertEqual(self.create("Leadership 2024"), "leadership-2024")
+        # The bare slug is free, so the number isn't a copy counter
+        self.assertEqual(self.create("Leadership"), "leadership")
+        self.assertEqual(self.create("Leadership 2024"), "leadership-2024-2")
+        self.assertEqual(self.create("Leadership 2"), "leadership-2")
+        # Copies step over the slugs of names ending in a number
+        self.assertEqual(self.create("Leadership"), "leadership-3")
+        self.assertEqual(self.create("Leadership"), "leadership-4")
+
+    def test_own_slug_is_free(self):
+        survey = Survey.objects.create(name="Leadership", description="d", created_by=self.admin)
+        self.assertEqual(generate_unique_slug(Survey, survey.name, survey.id), "leadership")
+
+    def test_empty_slugify(self):
+        self.assertEqual([self.create("!!!"), self.create("???")], ["survey", "survey-2"])
+
+    def test_retry_after_integrity_error(self):
+        self.create("Leadership")
+        calls = []
+
+        def clash_once(klass, field, id, spread=1):
+            calls.append(spread)
+            # The first lookup misses a concurrent save that took "leadership"
+            return "leadership" if len(calls) == 1 else generate_unique_slug(klass, field, id, spread=1)
+
+        with mock.patch("survey.models.generate_unique_slug", side_effect=clash_once):
+            self.assertEqual(self.create("Leadership"), "leadership-2")
+        self.assertEqual(calls, [1, 2])
+
+    def test_gives_up_after_repeated_clashes(self):
+        self.create("Leadership")
+        survey = Survey(name="Leadership", description="d", created_by=self.admin)
+        with mock.patch("survey.models.generate_unique_slug", return_value="leadership") as generate:
+            with self.assertRaises(IntegrityError):
+                survey.save()
+        self.assertEqual(generate.call_count, Survey.SLUG_ATTEMPTS)
+        self.assertEqual(Survey.objects.count(), 1)
+
+
+class SubmissionTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.survey = Survey.objects.create(name="Submitted", description="d", created_by=self.admin, published=True)
+        self.radio = Question.objects.create(
+            survey=self.survey, label="Radio", field_type=Question.RADIO, options="A,B,C", dimension="Vision")
+        self.multi = Question.objects.create(
+            survey=self.survey, label="Multi", field_type=Question.MULTI_SELECT, options="A,B,C,D")
+        self.client.force_login(self.admin)
+
+    def test_every_ticked_option_is_stored(self):
+        self.client.post(reverse("survey:survey-detail", kwargs={"slug": self.survey.slug}), {
+            f"question_{self.radio.pk}": "B", f"question_{self.multi.pk}": ["A", "C", "D"]})
+        answer = Answer.objects.get(question=self.multi)
+        self.assertEqual(answer.choice, 0b1101)
+        self.assertEqual(answer.display_value, "A,C,D")
+        self.assertEqual(Answer.objects.get(question=self.radio).choice, 2)
+
+    def test_failure_partway_stores_nothing(self):
+        # The response and its answers are inserted by the time the rollups fail
+        with mock.patch("survey.submissions.apply_answers", side_effect=DatabaseError("disk I/O error")):
+            with self.assertRaises(DatabaseError):
+                save_submission(self.survey, self.admin, [(self.radio, "B"), (self.multi, "A,C")])
+        self.assertFalse(UserAnswer.objects.exists())
+        self.assertFalse(Answer.objects.exists())
+        self.assertEqual(rollup_summaries(self.survey), ({}, {}))
+
+
+class FileDatabase:
+    """
+    A migrated SQLite database in a temporary file, used from threads that
+    each open their own connection to it, like separate processes would.
+    The test database is in memory, where connections can't wait for each
+    other's locks.
+    """
+    def __init__(self, test):
+        directory = tempfile.mkdtemp()
+        test.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.settings = {**connection.settings_dict, "NAME": os.path.join(directory, "db.sqlite3")}
+        # Cached content types belong to the test database
+        ContentType.objects.clear_cache()
+        test.addCleanup(ContentType.objects.clear_cache)
+        self.run(lambda: call_command("migrate", verbosity=0))
+
+    def start(self, func, *args):
+        """
+        Call func(*args) in a new thread and return the thread, whose
+        ``result`` is a list holding func's return value or exception.
+        """
+        def target():
+            connections["default"] = DatabaseWrapper(self.settings, "default")
+            try:
+                thread.result.append(func(*args))
+            except BaseException as exc:
+                thread.result.append(exc)
+            finally:
+                connections["default"].close()
+
+        thread = threading.Thread(target=target)
+        thread.result = []
+        thread.start()
+        return thread
+
+    def run(self, func, *args):
+        thread = self.start(func, *args)
+        thread.join()
+        if isinstance(thread.result[0], BaseException):
+            raise thread.result[0]
+        return thread.result[0]
+
+
+class DrainPendingTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.survey = Survey.objects.create(name="Queued", description="d", created_by=admin)
+        self.questions = [
+            Question.objects.create(
+                survey=self.survey, label=f"Question {number}", field_type=Question.RADIO,
+                options="Never,Sometimes,Often,Always", dimension=f"Dimension {number}", area="Area")
+            for number in range(2)
+        ]
+        self.users = [User.objects.create_user(f"user{i}", f"user{i}@example.com", "pw") for i in range(3)]
+        for user, value in zip(self.users, ["Never", "Often", "Always"]):
+            enqueue_submission(self.survey, user, [(question, value) for question in self.questions])
+
+    def test_drains_write_each_submission_once(self):
+        self.assertEqual(drain_pending(batch_size=2), 2)
+        self.assertEqual(drain_pending(batch_size=2), 1)
+        self.assertEqual(drain_pending(batch_size=2), 0)
+        self.assertFalse(PendingSubmission.objects.exists())
+        self.assertEqual(sorted(UserAnswer.objects.values_list("user__username", flat=True)),
+                         ["user0", "user1", "user2"])
+        self.assertEqual(Answer.objects.count(), 6)
+
+    def test_batch_taken_by_another_drainer_is_abandoned(self):
+        taken = PendingSubmission.objects.order_by("id").first()
+        delete = QuerySet.delete
+
+        def delete_after_another_drainer(queryset):
+            # The other drainer deletes (and stores) one of the batch's rows first
+            delete(PendingSubmission.objects.filter(pk=taken.pk))
+            return delete(queryset)
+
+        with mock.patch.object(QuerySet, "delete", autospec=True, side_effect=delete_after_another_drainer):
+            self.assertEqual(drain_pending(), 0)
+        self.assertFalse(UserAnswer.objects.exists())
+        # The simulated drainer's delete was rolled back with the batch, so all three are left
+        self.assertEqual(drain_pending(), 3)
+        self.assertEqual(UserAnswer.objects.count(), 3)
+
+    def test_concurrent_drains_store_each_submission_once(self):
+        database = FileDatabase(self)
+
+        def enqueue():
+            admin = User.objects.create_user("owner")
+            survey = Survey.objects.create(name="Queued", description="d", created_by=admin)
+            question = Question.objects.create(
+                survey=survey, label="Question", field_type=Question.RADIO, options="A,B", dimension="Vision")
+            for number in range(200):
+                enqueue_submission(survey, User.objects.create_user(f"user{number}"), [(question, "AB"[number % 2])])
+
+        def drain(start):
+            start.wait()
+            drained = 0
+            while True:
+                count = drain_pending(batch_size=7)
+                if not count and not PendingSubmission.objects.exists():
+                    return drained
+                drained += count
+
+        def stored():
+            return (list(UserAnswer.objects.values_list("user__username", flat=True)), Answer.objects.count(),
+                    rollup_summaries(Survey.objects.get())[0])
+
+        database.run(enqueue)
+        start = threading.Barrier(2)
+        drainers = [database.start(drain, start) for _ in range(2)]
+        for drainer in drainers:
+            drainer.join()
+        drained = [drainer.result[0] for drainer in drainers]
+        for result in drained:
+            if isinstance(result, BaseException):
+                raise result
+        self.assertEqual(sum(drained), 200)
+        usernames, answers, dimension_summary = database.run(stored)
+        self.assertEqual(sorted(usernames), sorted(f"user{number}" for number in range(200)))
+        self.assertEqual(answers, 200)
+        self.assertEqual(dimension_summary, {"Vision": 1.5})
+
+    def test_deleted_question_is_dropped(self):
+        self.questions[1].delete()
+        self.assertEqual(drain_pending(), 3)
+        self.assertEqual(list(Answer.objects.values_list("question", flat=True).distinct()), [self.questions[0].pk])
+
+    def test_responses_keep_their_submission_time(self):
+        queued_at = timezone.now() - timedelta(hours=1)
+        PendingSubmission.objects.filter(user=self.users[0]).update(created_at=queued_at)
+        drained_at = timezone.now()
+        drain_pending()
+        response = UserAnswer.objects.get(user=self.users[0])
+        self.assertEqual(response.submitted_at, queued_at)
+        # created_at is when it was stored, so incremental exports don't skip it
+        self.assertGreaterEqual(response.created_at, drained_at)
+        self.assertGreater(UserAnswer.objects.get(user=self.users[1]).submitted_at, queued_at)
+
+    def test_rollups_match_a_rebuild(self):
+        drain_pending(batch_size=2)
+        drain_pending(batch_size=2)
+        drained = rollup_summaries(self.survey)
+        self.assertEqual(drained[1], {"Area": (1 + 3 + 4) / 3})
+        rebuild_rollups(self.survey)
+        self.assertEqual(rollup_summaries(self.survey), drained)
+
+
+class Interrupted(BaseException):
+    pass
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    """
+    Outbox backend that fails the messages to given addresses, raising
+    ``error`` (a failed delivery by default).
+    """
+    def __init__(self, failing=(), error=OSError, **kwargs):
+        super().__init__(**kwargs)
+        self.failing, self.error = set(failing), error
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.failing.intersection(message.to):
+                raise self.error("Connection refused")
+        return super().send_messages(messages)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SurveyAccessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.user = User.objects.create_user("user", "User@Example.com", "pw")
+        self.restricted = Survey.objects.create(name="Restricted", description="d", created_by=admin, published=True)
+        self.restricted.set_recipient_emails(["other@example.com"])
+        Survey.objects.create(name="Published", description="d", created_by=admin, published=True)
+        Survey.objects.create(name="Draft", description="d", created_by=admin)
+        Survey.objects.create(name="Own", description="d", created_by=self.user)
+        self.client.force_login(self.user)
+
+    def listed(self):
+        return [survey.name for survey in self.client.get(reverse("survey:survey")).context["surveys"]]
+
+    def test_restricted_surveys_are_hidden(self):
+        self.assertEqual(sorted(self.listed()), ["Own", "Published"])
+
+    def test_invited_users_see_restricted_surveys(self):
+        self.restricted.set_recipient_emails(["other@example.com", "user@example.com"])
+        self.assertEqual(sorted(self.listed()), ["Own", "Published", "Restricted"])
+
+    def test_detail_refuses_users_who_are_not_invited(self):
+        url = reverse("survey:survey-detail", kwargs={"slug": self.restricted.slug})
+        self.assertRedirects(self.client.get(url), reverse("survey:survey"), fetch_redirect_response=False)
+
+        # The cached definition is replaced once the new invitations are committed
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restricted.set_recipient_emails(["user@example.com"])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+@override_settings(SURVEY_EMAIL_RATE=0, SURVEY_EMAIL_BATCH_SIZE=2)
+class MailingTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.survey = Survey.objects.create(name="Mailed", description="d", created_by=admin)
+        self.emails = ["a@example.com", "b@example.com", "c@example.com"]
+        self.survey.set_recipient_emails(self.emails)
+
+    def statuses(self):
+        return dict(self.survey.invitations.values_list("email", "status"))
+
+    def test_one_message_per_recipient(self):
+        mailing.queue_invitations(self.survey)
+        self.assertEqual(mailing.dispatch_queued(self.survey), (3, 0))
+        self.assertEqual(sorted(message.to for message in mail.outbox), [[email] for email in self.emails])
+        self.assertEqual(set(self.statuses().values()), {SurveyInvitation.SENT})
+
+    def test_failed_invitations(self):
+        mailing.queue_invitations(self.survey)
+        connection = FlakyEmailBackend(failing=["b@example.com"])
+        self.assertEqual(mailing.dispatch_queued(self.survey, connection=connection), (2, 1))
+        self.assertEqual(self.statuses()["b@example.com"], SurveyInvitation.FAILED)
+        self.assertEqual(self.survey.invitations.get(email="b@example.com").last_error, "Connection refused")
+
+        # A retry sends only the failed invitation
+        mailing.queue_invitations(self.survey)
+        self.assertEqual(mailing.dispatch_queued(self.survey), (1, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), self.emails)
+
+    def test_no_duplicates_across_runs(self):
+        mailing.queue_invitations(self.survey)
+        connection = FlakyEmailBackend(failing=["c@example.com"], error=Interrupted)
+        with self.assertRaises(Interrupted):
+            mailing.dispatch_queued(self.survey, batch_size=3, connection=connection)
+        # Each invitation was marked as soon as it was sent, not with the rest of its batch
+        self.assertEqual(self.statuses(), {
+            "a@example.com": SurveyInvitation.SENT, "b@example.com": SurveyInvitation.SENT,
+            "c@example.com": SurveyInvitation.SENDING})
+
+        mailing.queue_invitations(self.survey)
+        self.assertEqual(mailing.dispatch_queued(self.survey), (0, 0))
+        self.survey.set_recipient_emails(self.emails + ["d@example.com"])
+        mailing.queue_invitations(self.survey)
+        self.assertEqual(mailing.dispatch_queued(self.survey), (1, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ["a@example.com", "b@example.com", "d@example.com"])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.survey = Survey.objects.create(name="Exported", description="d", created_by=self.admin)
+        self.radio = Question.objects.create(
+            survey=self.survey, label="Radio", field_type=Question.RADIO, options="A,B,C")
+        self.multi = Question.objects.create(
+            survey=self.survey, label="Multi", field_type=Question.MULTI_SELECT, options="A,B,C,D")
+        self.text = Question.objects.create(survey=self.survey, label="Radio", field_type=Question.TEXTAREA)
+        self.first = save_submission(self.survey, self.admin, [(self.radio, "B"), (self.multi, "D,A")])
+
+    def rows(self, **kwargs):
+        return list(csv.reader("".join(exports.export_lines(self.survey, "csv", **kwargs)).splitlines()))
+
+    def test_csv(self):
+        self.assertEqual(self.rows(), [
+            ["response_id", "user", "submitted_at", f"Radio [{self.radio.pk}]", "Multi", f"Radio [{self.text.pk}]"],
+            [str(self.first.pk), "admin", self.first.submitted_at.isoformat(), "B", "A,D", ""],
+        ])
+
+    def test_ndjson(self):
+        anonymous = save_submission(self.survey, None, [(self.multi, "C"), (self.text, "Fine")])
+        self.assertEqual([json.loads(line) for line in exports.export_lines(self.survey, "ndjson")][1], {
+            "response_id": anonymous.pk, "user": "", "submitted_at": anonymous.submitted_at.isoformat(),
+            f"Radio [{self.radio.pk}]": "", "Multi": "C", f"Radio [{self.text.pk}]": "Fine"})
+
+    def test_incremental_pulls_include_queued_responses(self):
+        queued_user = User.objects.create_user("queued")
+        enqueue_submission(self.survey, queued_user, [(self.radio, "C")])
+        later = save_submission(self.survey, None, [(self.radio, "A")])
+        pulled_at = timezone.now()
+        self.assertEqual([row[0] for row in self.rows()[1:]], [str(self.first.pk), str(later.pk)])
+
+        # Stored after the pull although it was submitted before it
+        drain_pending()
+        queued = UserAnswer.objects.get(user=queued_user)
+        self.assertLess(queued.submitted_at, later.submitted_at)
+        self.assertEqual([row[0] for row in self.rows(after=later.pk)[1:]], [str(queued.pk)])
+        self.assertEqual([row[0] for row in self.rows(since=pulled_at)[1:]], [str(queued.pk)])
+
+    def test_invalid_after(self):
+        self.client.force_login(self.admin)
+        url = reverse("survey:survey-export", kwargs={"slug": self.survey.slug})
+        self.assertEqual(self.client.get(url, {"after": "x"}).status_code, 400)
+        self.assertEqual(exports.parse_after("-1"), None)
+
+    def test_command(self):
+        later = save_submission(self.survey, None, [(self.radio, "A")])
+        path = os.path.join(tempfile.mkdtemp(), "export.ndjson")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command("export_responses", self.survey.slug, format="ndjson", after=self.first.pk, output=path)
+        with open(path) as output:
+            self.assertEqual([json.loads(line)["response_id"] for line in output], [later.pk])
+
+        with self.assertRaisesMessage(CommandError, "Invalid --since value: soon"):
+            call_command("export_responses", self.survey.slug, since="soon")
+        with self.assertRaisesMessage(CommandError, "Unknown survey: missing"):
+            call_command("export_responses", "missing")
+
+
+@skipUnless(numpy, "numpy is not installed")
+class ResponseMatrixTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.survey = Survey.objects.create(name="Matrix", description="d", created_by=admin)
+        self.questions = [
+            Question.objects.create(survey=self.survey, label="Radio", field_type=Question.RADIO, options="A,B,C"),
+            Question.objects.create(survey=self.survey, label="Multi", field_type=Question.MULTI_SELECT, options="A,B,C"),
+            Question.objects.create(survey=self.survey, label="Text", field_type=Question.TEXTAREA),
+        ]
+        for number in range(5):
+            user = User.objects.create_user(f"user{number}", f"user{number}@example.com", "pw")
+            values = ["ABC"[number % 3], "A,C", "text"] if number % 2 else ["C"]
+            save_submission(self.survey, user, list(zip(self.questions, values)))
+
+    def build(self, chunk_size):
+        path = Path(self.directory) / f"{chunk_size}.npz"
+        exports.build_response_matrix(self.survey, path, chunk_size=chunk_size)
+        return numpy.load(path)
+
+    def test_chunks_fill_the_matrix(self):
+        expected = [[3, 0, 0], [2, 5, 0], [3, 0, 0], [1, 5, 0], [3, 0, 0]]
+        for chunk_size in (2, 1000):
+            numpy.testing.assert_array_equal(self.build(chunk_size)["scores"], expected)
+        # Only the archives are left in the export directory
+        self.assertEqual(sorted(path.name for path in Path(self.directory).iterdir()), ["1000.npz", "2.npz"])
+
+    def test_bitmasks_of_many_options_are_exact(self):
+        options = [f"Option {number}" for number in range(40)]
+        question = Question.objects.create(
+            survey=self.survey, label="Many", field_type=Question.MULTI_SELECT, options=",".join(options))
+        save_submission(self.survey, None, [(question, f"{options[0]},{options[39]}")])
+        scores = self.build(1000)["scores"]
+        self.assertEqual(scores.dtype, numpy.uint64)
+        self.assertEqual(int(scores[-1, -1]), 1 + 2 ** 39)
+        self.assertEqual(question.decode(int(scores[-1, -1])), f"{options[0]},{options[39]}")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SurveyDefinitionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.respondent = User.objects.create_user("respondent", "respondent@example.com", "pw")
+        self.survey = Survey.objects.create(name="Defined", description="d", created_by=self.admin, published=True)
+        self.question = Question.objects.create(
+            survey=self.survey, label="Original label", field_type=Question.RADIO,
+            options="Never,Sometimes,Often,Always", dimension="Vision", area="Strategy")
+        self.client.force_login(self.respondent)
+        self.url = reverse("survey:survey-detail", kwargs={"slug": self.survey.slug})
+
+    def test_steady_state_runs_no_definition_queries(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+            self.client.post(self.url, {f"question_{self.question.pk}": "Often"})
+        tables = ("survey_survey\"", "survey_question\"", "survey_surveyinvitation\"")
+        self.assertEqual([query["sql"] for query in queries if query["sql"].startswith("SELECT")
+                          and any(f'FROM "{table}' in query["sql"] for table in tables)], [])
+        self.assertEqual(Answer.objects.get().choice, 3)
+
+    def test_question_fields_are_rendered_once_per_version(self):
+        response = self.client.get(self.url)
+        self.assertTemplateUsed(response, "survey/question_fields.html")
+        response = self.client.get(self.url)
+        self.assertTemplateNotUsed(response, "survey/question_fields.html")
+        self.assertContains(response, 'name="csrfmiddlewaretoken"')
+        self.assertContains(response, f'name="question_{self.question.pk}" value="Often"')
+
+    def test_changes_are_served_after_commit(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.label = "Edited label"
+            self.question.save()
+        self.assertContains(self.client.get(self.url), "Edited label")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.survey.set_recipient_emails(["someone-else@example.com"])
+        self.assertRedirects(self.client.get(self.url), reverse("survey:survey"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.survey.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ChartCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.enterContext(override_settings(CHART_CACHE_DIR=self.media_root, CHART_CACHE_MAX_BYTES=1000))
+
+    def test_unrendered_specs_are_evicted(self):
+        keys = []
+        for number in range(100):
+            keys.append(chart_cache.remember("dimensions", {f"Dimension {number}": 3.0}))
+            os.utime(Path(self.media_root) / f"{keys[-1]}.json", (number, number))
+        self.assertLessEqual(sum(path.stat().st_size for path in Path(self.media_root).iterdir()), 1000)
+        self.assertIsNone(chart_cache.load_spec(keys[0]))
+        self.assertEqual(chart_cache.load_spec(keys[-1]), ("dimensions", {"Dimension 99": 3.0}))
+
+    def test_scans_only_past_the_bound(self):
+        with mock.patch.object(chart_cache, "evict", wraps=chart_cache.evict) as evict:
+            keys = [chart_cache.remember("dimensions", {f"Dimension {number}": 3.0}) for number in range(5)]
+            # The first write has no estimate to go by
+            self.assertEqual(evict.call_count, 1)
+            chart_cache.store_png(keys[0], b"\x89PNG" + b"\0" * 1000)
+            self.assertEqual(evict.call_count, 2)
+
+    @override_settings(CHART_CACHE_SCAN_SECONDS=0)
+    def test_scans_once_the_estimate_is_stale(self):
+        with mock.patch.object(chart_cache, "evict", wraps=chart_cache.evict) as evict:
+            for number in range(3):
+                chart_cache.remember("dimensions", {f"Dimension {number}": 3.0})
+        self.assertEqual(evict.call_count, 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.enterContext(override_settings(CHART_CACHE_DIR=self.media_root))
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.survey = Survey.objects.create(name="Async", description="d", created_by=self.admin, published=True)
+        self.question = Question.objects.create(
+            survey=self.survey, label="Question", field_type=Question.RADIO,
+            options="Never,Sometimes,Often,Always", dimension="Vision", area="Strategy")
+        self.async_client.force_login(self.admin)
+        self.url = reverse("survey:survey-detail", kwargs={"slug": self.survey.slug})
+
+    async def test_submission_is_analysed(self):
+        response = await self.async_client.get(self.url)
+        self.assertContains(response, f'name="question_{self.question.pk}"')
+        # Counted by the middleware in async mode
+        self.assertGreater(response.query_stats.count, 0)
+
+        response = await self.async_client.post(self.url, {f"question_{self.question.pk}": "Often"})
+        analysis_url = reverse("survey:survey-analysis", kwargs={"slug": self.survey.slug})
+        self.assertRedirects(response, analysis_url, fetch_redirect_response=False)
+        self.assertContains(await self.async_client.get(analysis_url), "data-analysis-count>1<")
+        data = (await self.async_client.get(
+            reverse("survey:survey-analysis-data", kwargs={"slug": self.survey.slug}))).json()
+        self.assertEqual(data["dimension_summary"], [["Vision", 3.0]])
+
+    @override_settings(SURVEY_SUBMISSION_MODE="queued")
+    async def test_queued_submission(self):
+        await self.async_client.post(self.url, {f"question_{self.question.pk}": "Often"})
+        self.assertEqual(await PendingSubmission.objects.acount(), 1)
+        self.assertEqual(await UserAnswer.objects.acount(), 0)
+
+    async def test_anonymous_users_are_sent_to_login(self):
+        for url in (self.url, reverse("survey:survey-analysis", kwargs={"slug": self.survey.slug})):
+            response = await AsyncClient().get(url)
+            self.assertRedirects(response, f"{settings.LOGIN_URL}?next={url}", fetch_redirect_response=False)
+
+    async def test_unknown_survey(self):
+        response = await self.async_client.get(reverse("survey:survey-analysis", kwargs={"slug": "missing"}))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_repeat_chart_requests_render_nothing(self):
+        from . import charts
+
+        key = chart_cache.remember("dimensions", {"Vision": 3.0})
+        url = reverse("survey:survey-chart", kwargs={"key": key})
+        with mock.patch.object(charts, "render", wraps=charts.render) as render:
+            first = await self.async_client.get(url)
+            second = await self.async_client.get(url)
+            revalidated = await self.async_client.get(url, headers={"If-None-Match": first["ETag"]})
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(second.content, first.content)
+        for response in (first, second, revalidated):
+            self.assertEqual(response["Cache-Control"], "private, max-age=31536000, immutable")
+            self.assertEqual(response["ETag"], f'"{key}"')
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b"")
+
+    async def test_other_etags_get_the_chart(self):
+        key = chart_cache.remember("dimensions", {"Vision": 3.0})
+        response = await self.async_client.get(
+            reverse("survey:survey-chart", kwargs={"key": key}), headers={"If-None-Match": '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+    async def test_chart_is_rendered_on_the_executor(self):
+        key = chart_cache.remember("dimensions", {"Vision": 3.0})
+        response = await self.async_client.get(reverse("survey:survey-chart", kwargs={"key": key}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b"\x89PNG"))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LIVE_ANALYSIS_CHECK_SECONDS=0.05)
+class LiveAnalysisTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Streams the test client left open would keep rolled back surveys' channels
+        live._channels.clear()
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.respondent = User.objects.create_user("respondent", "respondent@example.com", "pw")
+        self.survey = Survey.objects.create(name="Live", description="d", created_by=self.admin, published=True)
+        self.question = Question.objects.create(
+            survey=self.survey, label="Question", field_type=Question.RADIO,
+            options="Never,Sometimes,Often,Always", dimension="Vision", area="Strategy")
+        self.async_client.force_login(self.admin)
+        self.url = reverse("survey:survey-analysis-events", kwargs={"slug": self.survey.slug})
+
+    def submit(self, user, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            return save_submission(self.survey, user, [(self.question, value)])
+
+    async def open_stream(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return response.streaming_content
+
+    async def next_event(self, content):
+        # Skips keep-alive comments
+        while True:
+            chunk = await asyncio.wait_for(anext(content), 5)
+            if b"event: analysis" in chunk:
+                return json.loads(chunk.split(b"data: ", 1)[1])
+
+    async def test_submissions_are_pushed_to_every_viewer(self):
+        viewers = [await self.open_stream(), await self.open_stream()]
+        for content in viewers:
+            self.assertEqual(await self.next_event(content), {
+                "dimension_summary": [], "area_summary": [], "response_count": 0})
+        channel = live._channels[self.survey.pk]
+        self.assertEqual(len(channel.subscribers), 2)
+
+        await sync_to_async(self.submit)(self.respondent, "Often")
+        await sync_to_async(self.submit)(self.admin, "Always")
+        for content in viewers:
+            data = await self.next_event(content)
+            if data["response_count"] == 1:
+                data = await self.next_event(content)
+            self.assertEqual(data, {
+                "dimension_summary": [["Vision", 3.5]], "area_summary": [["Strategy", 3.5]], "response_count": 2})
+
+    def summary(self, channel):
+        return json.loads(channel.message.split(b"data: ", 1)[1])
+
+    def watch(self):
+        channel = live._channels[self.survey.pk] = live.Channel(self.survey.pk)
+        channel.load()
+        return channel
+
+    def test_delta_read_by_an_earlier_load_is_corrected(self):
+        channel = self.watch()
+        with self.captureOnCommitCallbacks() as callbacks:
+            save_submission(self.survey, self.respondent, [(self.question, "Often")])
+        # A viewer loads after the commit, before the version is bumped
+        channel.load(force=True)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.summary(channel)["response_count"], 2)
+        # The load's version is behind the submission's, so the check reloads
+        channel.check()
+        self.assertEqual(self.summary(channel), {
+            "dimension_summary": [["Vision", 3.0]], "area_summary": [["Strategy", 3.0]], "response_count": 1})
+
+    def test_delta_read_by_a_later_load_is_skipped(self):
+        channel = self.watch()
+        bump = analysis_cache.bump
+
+        def bump_then_load(survey_id):
+            version = bump(survey_id)
+            # A viewer loads between the bump and the delta
+            channel.load(force=True)
+            return version
+
+        with mock.patch.object(analysis_cache, "bump", side_effect=bump_then_load):
+            self.submit(self.respondent, "Often")
+        self.assertEqual(self.summary(channel)["response_count"], 1)
+        self.assertEqual(channel.version, analysis_cache.analysis_version(self.survey.pk))
+
+    @override_settings(LIVE_ANALYSIS_STREAM_SECONDS=0.2)
+    async def test_streams_end_and_unsubscribe(self):
+        content = await self.open_stream()
+        await self.next_event(content)
+        self.assertIn(self.survey.pk, live._channels)
+        with self.assertRaises(StopAsyncIteration):
+            while True:
+                await asyncio.wait_for(anext(content), 5)
+        self.assertNotIn(self.survey.pk, live._channels)
+
+    async def test_changes_without_deltas_are_reloaded(self):
+        response = await sync_to_async(self.submit)(self.respondent, "Often")
+        content = await self.open_stream()
+        self.assertEqual((await self.next_event(content))["response_count"], 1)
+
+        def delete():
+            with self.captureOnCommitCallbacks(execute=True):
+                response.delete()
+        await sync_to_async(delete)()
+        self.assertEqual(await self.next_event(content), {
+            "dimension_summary": [], "area_summary": [], "response_count": 0})
+
+    def test_wsgi_gets_one_event(self):
+        self.submit(self.respondent, "Often")
+        self.client.force_login(self.admin)
+        response = self.client.get(self.url)
+        self.assertTrue(response.content.startswith(b"retry: 50\n\n"))
+        self.assertIn(b'"response_count":1', response.content)
+
+    def test_only_analyses_of_all_respondents_are_live(self):
+        analysis_url = reverse("survey:survey-analysis", kwargs={"slug": self.survey.slug})
+        self.client.force_login(self.admin)
+        self.assertContains(self.client.get(analysis_url), f'data-analysis-events="{self.url}"')
+        self.assertNotContains(self.client.get(analysis_url, {"user": "respondent"}), "data-analysis-events")
+
+        self.client.force_login(self.respondent)
+        self.assertNotContains(self.client.get(analysis_url), "data-analysis-events")
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class SyntheticDataTests(TestCase):
+    def test_generate(self):
+        admin = synthetic.generate(users=6, surveys=3, questions=8, responses=10, restricted=0.34, seed=1)
+        surveys = Survey.objects.filter(created_by=admin)
+        self.assertEqual(User.objects.filter(username__startswith="synthetic-user-").count(), 6)
+        self.assertEqual(surveys.count(), 3)
+        self.assertEqual(surveys.filter(invitations__isnull=False).distinct().count(), 1)
+        self.assertEqual(
+            set(Question.objects.filter(survey__in=surveys).values_list("field_type", flat=True)),
+            {field_type for field_type, _ in Question.FIELD_TYPES})
+        self.assertEqual(UserAnswer.objects.filter(survey__in=surveys).count(), 30)
+
+        # The rollups kept by the bulk submissions match a rebuild from the answers
+        for survey in surveys:
+            summaries = rollup_summaries(survey)
+            rebuild_rollups(survey)
+            self.assertEqual(summaries, rollup_summaries(survey))
+
+        synthetic.flush()
+        self.assertFalse(Survey.objects.exists())
+
+
+class SerialWSGIServer(WSGIServer):
+    def __init__(self, *args, connections_override=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+class SerialLiveServerThread(LiveServerThread):
+    """
+    Handle requests one at a time in the server thread. The live server
+    shares the test's in-memory database connection, which concurrent
+    requests would use from several threads at once, interleaving their
+    transactions.
+    """
+    server_class = SerialWSGIServer
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"], CACHES=LOCMEM_CACHES)
+class LoadTestHarnessTests(LiveServerTestCase):
+    server_thread_class = SerialLiveServerThread
+
+    def setUp(self):
+        # Flushing the database sends no signals, so earlier tests' survey definitions would linger
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.enterContext(override_settings(CHART_CACHE_DIR=self.media_root))
+        admin = synthetic.generate(users=2, surveys=2, questions=4, responses=3, restricted=0, seed=1)
+        self.surveys = list(Survey.objects.filter(created_by=admin).values_list("slug", flat=True))
+        self.accounts = [(f"{synthetic.PREFIX}-user-{i}", synthetic.PASSWORD) for i in range(2)]
+
+    def test_every_scenario_runs_without_errors(self):
+        for scenario in loadtest.SCENARIOS:
+            with self.subTest(scenario=scenario):
+                report = loadtest.run_load(
+                    self.live_server_url, self.accounts, self.surveys, {scenario: 1}, duration=60, iterations=2)
+                self.assertEqual(report["failed_users"], [])
+                self.assertEqual(report["total"]["errors"], 0, report["views"])
+
+    def test_submissions_are_stored(self):
+        before = UserAnswer.objects.count()
+        report = loadtest.run_load(
+            self.live_server_url, self.accounts, self.surveys, {"submit": 1}, duration=60, iterations=3)
+        self.assertEqual(report["views"]["survey:survey-detail POST"]["requests"], 6)
+        self.assertEqual(UserAnswer.objects.count(), before + 6)
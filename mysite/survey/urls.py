@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, analysis_views
 
 app_name = 'survey'
 
@@ -8,13 +8,21 @@ urlpatterns = [
     path('create/', views.create_survey, name="create_survey"),
     path('edit/<slug:slug>/', views.edit_survey, name="edit-survey"),
     path('delete/<slug:slug>/', views.delete_survey, name="delete-survey"),
+    path('send-emails/<slug:slug>/', views.send_survey_emails, name="send-survey-emails"),
     path('results/', views.results_page, name="results-page"),
+    path('results/more/', views.results_more, name="results-more"),
+    path('queue-status/', views.submission_queue_status, name="submission-queue-status"),
+    path('charts/<str:key>.png', analysis_views.survey_chart, name="survey-chart"),
     path('<slug:slug>/', views.survey_detail, name="survey-detail"),
     path('password-prompt/<slug:slug>/', views.password_prompt, name="password-prompt"),
     path('add-question/<slug:slug>/', views.add_question, name="add-question"),
     path('edit-question/<int:question_id>/', views.edit_question, name="edit-question"),
     path('delete-question/<int:question_id>/', views.delete_question, name="delete-question"),
-    path('<slug:slug>/analysis/', views.survey_analysis, name="survey-analysis"),
+    path('<slug:slug>/analysis/', analysis_views.survey_analysis, name="survey-analysis"),
+    path('<slug:slug>/analysis/data/', analysis_views.survey_analysis_data, name="survey-analysis-data"),
+    path('<slug:slug>/analysis/events/', analysis_views.survey_analysis_events, name="survey-analysis-events"),
+    path('<slug:slug>/export/', views.export_responses, name="survey-export"),
+    path('<slug:slug>/export/matrix/', views.export_response_matrix, name="survey-export-matrix"),
     path('<slug:slug>/delete-analysis/<int:user_id>/', views.delete_analysis, name="delete-analysis"),
     path('delete-response/<int:response_id>/', views.delete_response, name='delete-response'),
 
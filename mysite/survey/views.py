@@ -1,21 +1,30 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import HttpResponseForbidden, HttpResponse
+from django.http import FileResponse, Http404, HttpResponseBadRequest, HttpResponseForbidden, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import transaction
 from django.db.models import Q
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
-from collections import defaultdict
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from asgiref.sync import sync_to_async
 
-import io
-import urllib, base64
+from datetime import datetime, time, timedelta
+from urllib.parse import urlencode
 
-from .models import Survey, Question, UserAnswer, Answer
+from .models import Survey, Question, UserAnswer
+from . import exports
+from .decorators import async_login_required
+from .definitions import aget_definition, aquestion_fields, get_definition
+from .pagination import keyset_page
+from .rollups import rebuild_rollups
+from .submissions import QUEUED, aenqueue_submission, collect_answers, queue_status, save_submission, submission_mode
 
 
+RESULTS_PAGE_SIZE = 50
+
 ######################################################################################
 
 def is_admin_or_authorized(user):
@@ -29,23 +38,13 @@ def survey(request):
         # Admin sees all surveys
         surveys = Survey.objects.select_related('created_by').all()
     else:
-        # Regular users see surveys based on specific rules
-        surveys = Survey.objects.select_related('created_by').filter(
-            Q(published=True) |
-            Q(created_by=request.user) |
-            Q(Q(recipient_emails__icontains=request.user.email) & ~Q(recipient_emails=''))).distinct()
-
-    # Filter out restricted surveys where the user is not invited
-    filtered_surveys = []
-    for survey in surveys:
-        if survey.recipient_emails:
-            invited_emails = [email.strip().lower() for email in survey.recipient_emails.split(',')]
-            if request.user.email in invited_emails or request.user.is_superuser:
-                filtered_surveys.append(survey)
-        else:
-            filtered_surveys.append(survey)
+        # Regular users see the surveys they are invited to, and the published or
+        # own surveys that aren't restricted to invited users
+        surveys = Survey.objects.select_related('created_by').with_invitation_flags(request.user.email).filter(
+            Q(is_invited=True) |
+            Q(Q(published=True) | Q(created_by=request.user), is_restricted=False))
 
-    return render(request, 'survey/survey.html', {'surveys': filtered_surveys})
+    return render(request, 'survey/survey.html', {'surveys': surveys})
 
 ######################################################################################
 
@@ -62,19 +61,19 @@ def create_survey(request):
         published = request.POST.get("published", "off") == "on"
         password = request.POST.get("survey_password", "").strip()
         email_fields = request.POST.getlist("emails")
-        recipient_emails = ",".join([email.strip() for email in email_fields if email.strip()])
 
         if name and description:
-            survey = Survey.objects.create(
-                name=name,
-                description=description,
-                slug=slug or None,
-                is_editable=is_editable,
-                allow_multiple_submissions=allow_multiple_submissions,
-                published=published,
-                created_by=request.user,
-                password=password,
-                recipient_emails=recipient_emails)
+            with transaction.atomic():
+                survey = Survey.objects.create(
+                    name=name,
+                    description=description,
+                    slug=slug or None,
+                    is_editable=is_editable,
+                    allow_multiple_submissions=allow_multiple_submissions,
+                    published=published,
+                    created_by=request.user,
+                    password=password)
+                survey.set_recipient_emails(email_fields)
 
             return redirect("survey:add-question", slug=survey.slug)
 
@@ -82,17 +81,18 @@ def create_survey(request):
 
 ######################################################################################
 
-@login_required
-def survey_detail(request, slug):
-    survey = get_object_or_404(Survey, slug=slug)
-    questions = survey.questions.all()
+@async_login_required
+async def survey_detail(request, slug):
+    definition = await aget_definition(slug)
+    if definition is None:
+        raise Http404("No survey found.")
+    survey = definition.survey
+    questions = definition.questions
 
     # Validate invited users
-    if survey.recipient_emails:
-        invited_emails = [email.strip() for email in survey.recipient_emails.split(',')]
-        if request.user.email not in invited_emails:
-            messages.error(request, "You are not invited to access this survey.")
-            return redirect("survey:survey")
+    if definition.is_restricted and not definition.is_invited(request.user.email):
+        messages.error(request, "You are not invited to access this survey.")
+        return redirect("survey:survey")
 
     # Validate survey password
     if survey.password:
@@ -100,23 +100,20 @@ def survey_detail(request, slug):
         if entered_password != survey.password:
             return redirect("survey:password-prompt", slug=survey.slug)
 
-    # Prepare choices for questions
-    for question in questions:
-        question.choices_list = question.options.split(',') if question.options else []
-
     if request.method == "POST":
-        user_answer = UserAnswer.objects.create(user=request.user, survey=survey)
-        for question in questions:
-            answer_value = request.POST.get(f"question_{question.id}")
-            if answer_value:
-                Answer.objects.create(
-                    question=question,
-                    value=answer_value,
-                    user_answer=user_answer)
-                
+        answers = collect_answers(questions, request.POST)
+        if submission_mode() == QUEUED:
+            await aenqueue_submission(survey, request.user, answers)
+            messages.success(request, "Thank you! Your response has been received and will appear in the analysis shortly.")
+        else:
+            # The inserts and rollup updates share a transaction, which can't span awaits
+            await sync_to_async(save_submission)(survey, request.user, answers)
         return redirect(reverse("survey:survey-analysis", kwargs={"slug": survey.slug}))
 
-    return render(request, 'survey/survey_detail.html', {'survey': survey, 'questions': questions})
+    return render(request, 'survey/survey_detail.html', {
+        'survey': survey,
+        'question_fields': await aquestion_fields(definition),
+    })
 
 ######################################################################################
 
@@ -140,11 +137,12 @@ def edit_survey(request, slug):
         survey.description = request.POST.get("description")
         survey.password = request.POST.get("password", "").strip()
         email_fields = request.POST.getlist("emails")
-        survey.recipient_emails = ",".join([email.strip() for email in email_fields if email.strip()])
-        survey.save()
+        with transaction.atomic():
+            survey.save()
+            survey.set_recipient_emails(email_fields)
         return redirect("survey:add-question", slug=slug)
 
-    recipient_emails = survey.recipient_emails.split(",") if survey.recipient_emails else []
+    recipient_emails = survey.recipient_emails
 
     return render(request, "survey/edit_survey.html", {"survey": survey,"recipient_emails": recipient_emails,})
 
@@ -154,15 +152,22 @@ def edit_survey(request, slug):
 @user_passes_test(lambda u: u.is_superuser)
 def send_survey_emails(request, slug):
     survey = get_object_or_404(Survey, slug=slug)
-    survey.send_survey_emails()
-    messages.success(request, "Survey emails have been sent!")
+    if request.method == "POST":
+        queued = survey.send_survey_emails()
+        if queued:
+            messages.success(request, f"Sending {queued} survey invitation(s) in the background.")
+        else:
+            messages.info(request, "Every recipient has already been sent an invitation.")
     return redirect("survey:survey-detail", slug=slug)
 
 ######################################################################################
 
 @login_required
 def password_prompt(request, slug):
-    survey = get_object_or_404(Survey, slug=slug)
+    definition = get_definition(slug)
+    if definition is None:
+        raise Http404("No survey found.")
+    survey = definition.survey
 
     if request.method == "POST":
         entered_password = request.POST.get("survey_password")
@@ -216,6 +221,8 @@ def edit_question(request, question_id):
     question = get_object_or_404(Question, id=question_id)
 
     if request.method == "POST":
+        previous = Question(field_type=question.field_type, options=question.options,
+                            dimension=question.dimension, area=question.area)
         question.label = request.POST.get("label", question.label)
         question.field_type = int(request.POST.get("field_type", question.field_type))
         options = request.POST.getlist("options[]")
@@ -223,7 +230,16 @@ def edit_question(request, question_id):
         question.dimension = request.POST.get("dimension", question.dimension)
         question.area = request.POST.get("area", question.area)
         question.is_required = request.POST.get("is_required") == "on"
-        question.save()
+
+        # Stored choices depend on the field type and options, scores also on dimension and area
+        changed = [getattr(question, field) != getattr(previous, field)
+                   for field in ("field_type", "options", "dimension", "area")]
+        with transaction.atomic():
+            question.save()
+            if any(changed[:2]):
+                question.remap_answers(previous)
+            if any(changed):
+                rebuild_rollups(question.survey)
 
         return redirect("survey:add-question", slug=question.survey.slug)
     
@@ -236,104 +252,109 @@ def edit_question(request, question_id):
 @user_passes_test(is_admin_or_authorized)
 def delete_question(request, question_id):
     question = get_object_or_404(Question, id=question_id)
-    survey_slug = question.survey.slug
+    survey = question.survey
+    survey_slug = survey.slug
     if request.method == "POST":
-        question.delete()
+        # The rollups never outlive the answers they count
+        with transaction.atomic():
+            question.delete()
+            rebuild_rollups(survey)
         return redirect("survey:add-question", slug=survey_slug)
     return render(request, "survey/delete_question.html", {"question": question})
 
 ######################################################################################
 
 @login_required
-def survey_analysis(request, slug):
-    survey = get_object_or_404(Survey, slug=slug)
-    user_filter = request.GET.get('user')
-
-    if request.user.is_superuser or survey.created_by == request.user:
-        # Admins or survey creators can see all responses
-        if user_filter:
-            user_answers = UserAnswer.objects.filter(survey=survey, user__username=user_filter)
-        else:
-            user_answers = UserAnswer.objects.filter(survey=survey)
+def results_data(request):
+    """
+    Return one keyset page of the responses the user may see, filtered by the
+    optional survey, since and until (YYYY-MM-DD) GET parameters.
+    """
+    if request.user.is_superuser:
+        responses = UserAnswer.objects.select_related('survey', 'user').all()
     else:
-        # Regular users can see only their own responses
-        user_answers = UserAnswer.objects.filter(survey=survey, user=request.user)
-
-    answers = Answer.objects.filter(user_answer__in=user_answers)
-
-    # Initialize data for analysis
-    dimension_data = defaultdict(list)
-    area_data = defaultdict(list)
-
-    # Organize answers by dimensions and areas
-    for answer in answers:
-        # Convert the string answer to a numerical value based on its position in choices
-        choices = answer.question.options.split(",")
-        value_as_int = choices.index(answer.value.strip()) + 1  # Assign 1-based index
-
-        # Add the numerical value to respective dimension and area data
-        if answer.question.dimension:
-            dimension_data[answer.question.dimension].append(value_as_int)
-        if answer.question.area:
-            area_data[answer.question.area].append(value_as_int)
-
-    # Calculate averages for dimensions
-    dimension_summary = {dim: sum(values) / len(values) for dim, values in dimension_data.items()}
-    area_summary = {area: sum(values) / len(values) for area, values in area_data.items()}
-
-    # Generate Matplotlib pie chart for dimensions
-    plt.figure(figsize=(7, 7))
-    plt.pie(dimension_summary.values(), labels=dimension_summary.keys(), autopct='%1.1f%%')
-    plt.title("Analysis by Dimensions")
-
-    # Convert plot to displayable image
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    dimension_chart = base64.b64encode(buf.getvalue()).decode('utf-8')
-    buf.close()
-
-    # Generate bar chart for areas
-    plt.figure(figsize=(8, 8))
-    colors = ['blue', 'orange', 'green', 'red', 'purple', 'brown', 'pink', 'gray', 'olive', 'cyan']
-    plt.bar(area_summary.keys(), area_summary.values(), color=colors[:len(area_summary.keys())])
-    plt.title("Analysis by Areas")
-    plt.ylabel("Average Score")
-    plt.xticks(rotation=75, fontsize=10)
-    plt.tight_layout()
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    area_chart = base64.b64encode(buf.getvalue()).decode('utf-8')
-    buf.close()
-
-    # Get a list of all users who completed the survey (only for admins or creators)
-    users = []
-    if request.user.is_superuser or survey.created_by == request.user:
-        users = UserAnswer.objects.filter(survey=survey).values_list('user__username', flat=True).distinct()
-
-    return render(request, 'survey/analysis.html', {
-        'survey': survey,
-        'dimension_summary': dimension_summary,
-        'area_summary': area_summary,
-        'dimension_chart': dimension_chart,
-        'area_chart': area_chart,
-        'users': users,
-        'selected_user': user_filter,
-    })
+        responses = UserAnswer.objects.select_related('survey', 'user').filter(
+            Q(user=request.user) | Q(survey__created_by=request.user)
+        )
+
+    filters = {key: request.GET.get(key, '') for key in ('survey', 'since', 'until')}
+    if filters['survey']:
+        responses = responses.filter(survey__slug=filters['survey'])
+    since = parse_date(filters['since']) if filters['since'] else None
+    if since:
+        responses = responses.filter(created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+    until = parse_date(filters['until']) if filters['until'] else None
+    if until:
+        responses = responses.filter(created_at__lt=timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min)))
+
+    page, next_cursor = keyset_page(responses, request.GET.get('after'), size=RESULTS_PAGE_SIZE)
+    next_query = None
+    if next_cursor:
+        next_query = urlencode({**{key: value for key, value in filters.items() if value}, 'after': next_cursor})
+    return page, next_query, filters
 
-######################################################################################
 
 @login_required
 def results_page(request):
+    responses, next_query, filters = results_data(request)
     if request.user.is_superuser:
-        responses = UserAnswer.objects.select_related('survey', 'user').all()
+        surveys = Survey.objects.only('name', 'slug').order_by('name')
     else:
-        responses = UserAnswer.objects.select_related('survey', 'user').filter(
-            Q(user=request.user) | Q(survey__created_by=request.user)
-        )
-    return render(request, 'survey/results.html', {'responses': responses})
+        surveys = Survey.objects.filter(
+            Q(created_by=request.user) | Q(useranswer__user=request.user)).only('name', 'slug').order_by('name').distinct()
+    return render(request, 'survey/results.html', {
+        'responses': responses,
+        'next_query': next_query,
+        'filters': filters,
+        'surveys': surveys,
+    })
+
+
+@login_required
+def results_more(request):
+    responses, next_query, _ = results_data(request)
+    html = render_to_string('survey/result_rows.html', {'responses': responses}, request=request)
+    return JsonResponse({'html': html, 'next_query': next_query})
+
+######################################################################################
+
+@login_required
+def export_responses(request, slug):
+    survey = get_object_or_404(Survey, slug=slug)
+    if request.user != survey.created_by and not request.user.is_superuser:
+        return HttpResponseForbidden("You are not allowed to export this survey.")
+
+    format = request.GET.get('format', 'csv')
+    if format not in exports.FORMATS:
+        return HttpResponseBadRequest("Unknown export format.")
+    since = None
+    if request.GET.get('since'):
+        since = exports.parse_since(request.GET['since'])
+        if since is None:
+            return HttpResponseBadRequest("Invalid 'since' timestamp.")
+    after = None
+    if request.GET.get('after'):
+        after = exports.parse_after(request.GET['after'])
+        if after is None:
+            return HttpResponseBadRequest("Invalid 'after' response id.")
+
+    # Rows are generated while the response is sent, a chunk of responses at a time
+    response = StreamingHttpResponse(
+        exports.export_lines(survey, format, since, after), content_type=exports.FORMATS[format])
+    response['Content-Disposition'] = f'attachment; filename="{survey.slug}.{format}"'
+    return response
+
+######################################################################################
+
+@login_required
+def export_response_matrix(request, slug):
+    survey = get_object_or_404(Survey, slug=slug)
+    if request.user != survey.created_by and not request.user.is_superuser:
+        return HttpResponseForbidden("You are not allowed to export this survey.")
+
+    # Built once per survey version, then served from the export cache
+    path = exports.response_matrix_path(survey)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name, content_type='application/octet-stream')
 
 ######################################################################################
 
@@ -344,7 +365,7 @@ def delete_analysis(request, slug, user_id):
     user_answer = get_object_or_404(UserAnswer, survey=survey, user_id=user_id)
     user_answer.delete()
     messages.success(request, "The analysis has been successfully removed.")
-    return redirect(reverse("results-page"))
+    return redirect(reverse("survey:results-page"))
 
 ######################################################################################
 
@@ -359,4 +380,17 @@ def delete_response(request, response_id):
     response.delete()
     return redirect('survey:results-page')
 
-######################################################################################
\ No newline at end of file
+######################################################################################
+
+@login_required
+@user_passes_test(is_admin_or_authorized)
+def submission_queue_status(request):
+    status = queue_status()
+    return JsonResponse({
+        'mode': submission_mode(),
+        'depth': status['depth'],
+        'lag_seconds': status['lag_seconds'],
+        'oldest': status['oldest'],
+    })
+
+######################################################################################